@@ -0,0 +1,273 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import armazem
+from esquema import compactar
+from instrumentacao import etapa
+
+# ==============================
+# Cubo de agregados (UF x ano e município x ano)
+# Total, média, variação anual, média móvel de 3 anos, taxa por 1.000
+# habitantes e posição no ranking, para todas as UFs e todos os municípios
+# em todos os anos, calculados de uma vez com groupby/transform (nada de
+# laço por grupo). Fica no armazém (data/arrow/cubo_uf.arrow e
+# cubo_municipios.arrow, tipos compactos) e é lido já indexado por
+# (sigla, ano) ou (cod, ano), então perguntas como "posição de GO em
+# 2023" ou "top 10 municípios por taxa" não relêem as séries brutas.
+# O cubo é refeito sozinho quando as fontes mudam (mesmo esquema de
+# armazem.atualizado: tamanho + mtime de cada arquivo de origem).
+#
+# População: a das planilhas do FINBRA (uma por ano disponível); a da UF
+# é a soma dos municípios da planilha. Ano sem planilha fica sem taxa, e
+# o ranking da taxa só existe onde todo o grupo (ano, ou UF e ano) tem
+# população.
+# ==============================
+TAB_UF = "cubo_uf"
+TAB_MUN = "cubo_municipios"
+JANELA_MEDIA = 3
+METRICAS = ("valor", "taxa_1000hab")  # as que têm ranking
+
+
+# ===== cálculo (vetorizado) =====
+def _atrasar(a, k):
+    """a deslocado k posições para frente (as k primeiras viram 0)."""
+    saida = np.zeros_like(a)
+    saida[k:] = a[:len(a) - k]
+    return saida
+
+
+def _por_serie(df, chave):
+    """var_pct e média móvel dentro de cada série; df ordenado por (chave, ano)."""
+    g = df.groupby(chave, observed=True, sort=False)["valor"]
+    valor = df["valor"].astype("float64")
+    df["var_pct"] = (valor / g.shift(1) - 1) * 100
+    # média móvel por somas acumuladas: soma(t) - soma(t-3), só com 3 anos
+    # na série e nenhum NaN na janela (como Series.rolling(3).mean())
+    posicao = g.cumcount().to_numpy()
+    soma = valor.fillna(0).groupby(df[chave], observed=True).cumsum().to_numpy()
+    nans = valor.isna().groupby(df[chave], observed=True).cumsum().to_numpy()
+    dentro = posicao >= JANELA_MEDIA  # a linha t-3 é da mesma série
+    soma_janela = soma - np.where(dentro, _atrasar(soma, JANELA_MEDIA), 0)
+    nans_janela = nans - np.where(dentro, _atrasar(nans, JANELA_MEDIA), 0)
+    cheia = (posicao >= JANELA_MEDIA - 1) & (nans_janela == 0)
+    df["media_movel_3a"] = np.where(cheia, soma_janela / JANELA_MEDIA, np.nan)
+    df["total"] = g.transform("sum")
+    df["media"] = g.transform("mean")
+    return df
+
+
+def _rankear(df, grupo, sufixo=""):
+    """Posição (1 = maior) de cada métrica dentro de `grupo`.
+
+    A taxa só é ranqueada nos grupos em que todas as linhas têm população:
+    com cobertura parcial (o FINBRA em data/ só traz GO) a posição sairia
+    contra quem não tem taxa, então fica NA.
+    """
+    incompleto = (df.assign(_sem_pop=df["populacao"].isna())
+                  .groupby(grupo, observed=True)["_sem_pop"].transform("any"))
+    for metrica in METRICAS:
+        nome = "rank" if metrica == "valor" else "rank_taxa"
+        rank = (df.groupby(grupo, observed=True)[metrica]
+                .rank(method="min", ascending=False).astype("Int32"))
+        df[nome + sufixo] = rank.mask(incompleto) if metrica == "taxa_1000hab" else rank
+    return df
+
+
+def _taxa(df):
+    df["taxa_1000hab"] = df["valor"] / df["populacao"] * 1000
+    return df
+
+
+def calcular_uf(df_uf, pop_mun=None):
+    """Cubo das UFs a partir da série (sigla, ano, valor)."""
+    df = (df_uf[["sigla", "ano", "valor"]].sort_values(["sigla", "ano"], kind="stable")
+          .reset_index(drop=True))
+    df = _por_serie(df, "sigla")
+    ano = df.groupby("ano")["valor"]
+    df["total_ano"] = ano.transform("sum")
+    df["media_ano"] = ano.transform("mean")
+    if pop_mun is not None and len(pop_mun):
+        pop = pop_mun.groupby(["uf", "ano"], observed=True)["populacao"].sum().rename("populacao")
+        df = df.join(pop, on=["sigla", "ano"])
+    else:
+        df["populacao"] = np.nan
+    df = _rankear(_taxa(df), "ano")
+    return df.set_index(["sigla", "ano"])
+
+
+def calcular_municipios(df_mun, pop_mun=None, siglas=None):
+    """Cubo dos municípios a partir da série (cod, sigla = nome, ano, valor)."""
+    df = (df_mun[["cod", "sigla", "ano", "valor"]].rename(columns={"sigla": "municipio"})
+          .sort_values(["cod", "ano"], kind="stable").reset_index(drop=True))
+    if siglas is not None:
+        df["uf"] = pd.Categorical((df["cod"] // 100000).map(siglas))
+    df = _por_serie(df, "cod")
+    if pop_mun is not None and len(pop_mun):
+        df = df.join(pop_mun.set_index(["cod", "ano"])["populacao"], on=["cod", "ano"])
+    else:
+        df["populacao"] = np.nan
+    df = _taxa(df)
+    df = _rankear(df, ["uf", "ano"] if "uf" in df else "ano", "_uf")
+    df = _rankear(df, "ano", "_brasil")
+    return df.set_index(["cod", "ano"])
+
+
+# ===== fontes =====
+def _populacao_municipal(anos):
+    """(cod, uf, ano, populacao) de cada planilha do FINBRA que existir."""
+    import apis
+
+    partes = []
+    for ano in sorted(set(int(a) for a in anos)):
+        try:
+            tabelas = [apis.tabela_do_ano(t, ano) for t in (apis.TAB_ICMS, apis.TAB_SEG)]
+        except FileNotFoundError:
+            continue
+        for tabela in tabelas:  # ICMS primeiro, como em apis.juntar_fontes
+            df = apis._ler_finbra(tabela)
+            partes.append(pd.DataFrame({"cod": df["Cod.IBGE"].to_numpy(), "uf": df["UF"].astype(str).to_numpy(),
+                                        "ano": ano, "populacao": df["População"].to_numpy(dtype="float64")}))
+    if not partes:
+        return pd.DataFrame(columns=["cod", "uf", "ano", "populacao"])
+    return pd.concat(partes).dropna(subset=["populacao"]).drop_duplicates(["cod", "ano"])
+
+
+def _arquivos_fonte(nome_fonte, snapshot):
+    """Arquivos de que o cubo depende: o corpo em cache (ou o snapshot) e o FINBRA."""
+    import apis
+    import cache_http
+
+    corpo = cache_http._caminhos(apis.FONTES[nome_fonte][0])[0]
+    arquivos = [corpo if os.path.exists(corpo) else snapshot]
+    arquivos += [os.path.join(armazem.DIR_DADOS, f) for f in sorted(os.listdir(armazem.DIR_DADOS))
+                 if f.startswith((apis.TAB_SEG, apis.TAB_ICMS)) and f.endswith(".xlsx")]
+    return arquivos
+
+
+def _impressoes(arquivos):
+    return {c: [os.stat(c).st_size, os.stat(c).st_mtime_ns] if os.path.exists(c) else None for c in arquivos}
+
+
+def _caminho_fontes(tabela):
+    return os.path.join(armazem.DIR_ARMAZEM, f"{tabela}.fontes.json")
+
+
+def _em_dia(tabela, arquivos):
+    try:
+        with open(_caminho_fontes(tabela), encoding="utf-8") as f:
+            return json.load(f) == _impressoes(arquivos) and os.path.exists(armazem._caminho_arrow(tabela))
+    except (OSError, ValueError):
+        return False
+
+
+def _guardar(df, tabela, arquivos):
+    armazem.salvar(compactar(df.reset_index()), tabela)
+    with open(_caminho_fontes(tabela), "w", encoding="utf-8") as f:
+        json.dump(_impressoes(arquivos), f)
+
+
+def construir_uf():
+    import apis
+
+    df_uf = apis.carregar_df_uf()
+    with etapa("agregados/uf", linhas_in=len(df_uf)) as e:
+        cubo = calcular_uf(df_uf, _populacao_municipal(df_uf["ano"].unique()))
+        e.linhas_out = len(cubo)
+    _guardar(cubo, TAB_UF, _arquivos_fonte("uf", apis.SNAP_UF))
+    return cubo
+
+
+def construir_municipios():
+    import apis
+    from ingestao import ler_serie_municipal
+
+    url, snapshot = apis.FONTES["municipios"]
+    with etapa("fetch/municipios_brasil") as e:
+        df_mun = ler_serie_municipal(url, timeout=60, snapshot=snapshot)  # todos os municípios
+        e.linhas_out = len(df_mun)
+    siglas = {cod: sigla for sigla, cod in apis.UFS.items()}
+    with etapa("agregados/municipios", linhas_in=len(df_mun)) as e:
+        cubo = calcular_municipios(df_mun, _populacao_municipal(df_mun["ano"].unique()), siglas)
+        e.linhas_out = len(cubo)
+    _guardar(cubo, TAB_MUN, _arquivos_fonte("municipios", apis.SNAP_MUN))
+    return cubo
+
+
+def _carregar(tabela, construir, nome_fonte, snapshot, indice):
+    if not _em_dia(tabela, _arquivos_fonte(nome_fonte, snapshot)):
+        construir()
+    return armazem.ler(tabela).set_index(indice).sort_index()
+
+
+@lru_cache(maxsize=None)
+def cubo_uf():
+    """Cubo das UFs indexado por (sigla, ano); refeito se as fontes mudaram."""
+    import apis
+    return _carregar(TAB_UF, construir_uf, "uf", apis.SNAP_UF, ["sigla", "ano"])
+
+
+@lru_cache(maxsize=None)
+def cubo_municipios():
+    """Cubo dos municípios indexado por (cod, ano); refeito se as fontes mudaram."""
+    import apis
+    return _carregar(TAB_MUN, construir_municipios, "municipios", apis.SNAP_MUN, ["cod", "ano"])
+
+
+# ===== consultas =====
+def serie_uf(uf):
+    """Série histórica da UF (indexada por ano) com var_pct, média móvel etc."""
+    return cubo_uf().xs(uf, level="sigla")
+
+
+def posicao(uf, ano, metrica="valor"):
+    """Posição da UF no ano (1 = maior); ex.: posicao("GO", 2023)."""
+    coluna = "rank" if metrica == "valor" else "rank_taxa"
+    r = cubo_uf().at[(uf, ano), coluna]
+    return None if pd.isna(r) else int(r)
+
+
+def ranking_ufs(ano, metrica="valor"):
+    """UFs do ano em ordem decrescente da métrica."""
+    coluna = "rank" if metrica == "valor" else "rank_taxa"
+    return cubo_uf().xs(ano, level="ano").sort_values(coluna).reset_index()
+
+
+def resumo_uf():
+    """Uma linha por UF: total e média ao longo dos anos."""
+    return cubo_uf().groupby(level="sigla", observed=True)[["total", "media"]].first()
+
+
+def resumo_ano(ano):
+    """Total e média entre as UFs no ano."""
+    fatia = cubo_uf().xs(ano, level="ano")
+    return {"total": fatia["total_ano"].iloc[0], "media": fatia["media_ano"].iloc[0]}
+
+
+def top_municipios(n=10, ano=None, metrica="taxa_1000hab", uf=None):
+    """Os n municípios com maior métrica no ano (na UF ou no Brasil), pelo ranking guardado."""
+    cubo = cubo_municipios()
+    ano = int(cubo.index.get_level_values("ano").max()) if ano is None else ano
+    coluna = ("rank" if metrica == "valor" else "rank_taxa") + ("_uf" if uf else "_brasil")
+    fatia = cubo.xs(ano, level="ano")
+    if uf:
+        fatia = fatia[fatia["uf"] == uf]
+    return fatia[fatia[coluna] <= n].sort_values([coluna, "municipio"]).head(n).reset_index()
+
+
+if __name__ == "__main__":
+    import apis
+
+    uf, ano = apis.UF_PADRAO, apis.ANO_PADRAO
+    cubo_uf.cache_clear()
+    ufs = construir_uf()
+    muns = construir_municipios()
+    print(f"Cubo UF: {len(ufs)} linhas; cubo municípios: {len(muns)} linhas")
+    print(f"Posição de {uf} em {ano}: {posicao(uf, ano)}º em homicídios, "
+          f"{posicao(uf, ano, 'taxa_1000hab')} em taxa por 1.000 hab")
+    print(f"\nTop 10 municípios de {uf} por taxa ({ano}):")
+    print(top_municipios(10, ano, uf=uf)[["cod", "municipio", "valor", "populacao", "taxa_1000hab"]]
+          .to_string(index=False))
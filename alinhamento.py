@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Alinhamento de fontes municipais pelo código IBGE
+# Em vez de merges encadeados (cada um copia a tabela inteira e refaz o
+# hash da chave), cada fonte é indexada pelo código uma única vez
+# (get_indexer contra os códigos da base) e as colunas são trazidas por
+# posição, num passo só. Colunas que aparecem em mais de uma fonte (ex.:
+# População) seguem uma ordem de precedência explícita: vale o primeiro
+# valor não nulo. O diagnóstico lista, por fonte, os códigos sem par.
+# ==============================
+Fonte = namedtuple("Fonte", ["nome", "df", "chave", "colunas", "obrigatoria"], defaults=(True,))
+Fonte.__doc__ = """Uma fonte: colunas é {coluna na fonte: coluna na saída}.
+obrigatoria=True funciona como inner join; False, como left join."""
+
+
+def _pegar(serie, pos):
+    """serie nas posições pos; -1 vira NA (só muda o tipo se precisar)."""
+    if (pos >= 0).all():
+        return serie.array.take(pos)
+    return serie.array.take(pos, allow_fill=True)
+
+
+def alinhar(fontes, precedencia=None, diagnostico=False):
+    """Monta a tabela alinhada na ordem da primeira fonte (a base).
+
+    precedencia: {coluna de saída: [nomes das fontes, da que vale mais
+    para a que vale menos]}; sem entrada, vale a ordem de `fontes`. Fontes
+    que não estão na lista vêm depois das listadas.
+    Com diagnostico=True devolve (df, diagnóstico por fonte).
+    """
+    precedencia = precedencia or {}
+    base = fontes[0]
+    chaves_base = base.df[base.chave].to_numpy()
+
+    # 1) um índice por fonte; duplicatas: fica a primeira ocorrência
+    posicoes, duplicados = {}, {}
+    for fonte in fontes:
+        chaves = fonte.df[fonte.chave]
+        repetida = chaves.duplicated().to_numpy()
+        duplicados[fonte.nome] = int(repetida.sum())
+        indice = pd.Index(chaves.to_numpy()[~repetida])
+        pos = indice.get_indexer(chaves_base)
+        # volta para a posição na fonte original (antes de tirar duplicatas)
+        linhas = np.flatnonzero(~repetida)
+        posicoes[fonte.nome] = np.where(pos >= 0, linhas[pos], -1)
+
+    # 2) linhas da base que têm par em todas as fontes obrigatórias
+    manter = np.ones(len(chaves_base), dtype=bool)
+    for fonte in fontes:
+        if fonte.obrigatoria:
+            manter &= posicoes[fonte.nome] >= 0
+    posicoes = {nome: pos[manter] for nome, pos in posicoes.items()}
+
+    # 3) colunas por posição, com precedência nas que se repetem
+    candidatos = {}
+    for fonte in fontes:
+        for origem, destino in fonte.colunas.items():
+            candidatos.setdefault(destino, []).append((fonte.nome, fonte.df[origem]))
+    saida = {}
+    for destino, lista in candidatos.items():
+        ordem = precedencia.get(destino)
+        if ordem:
+            # fonte fora da lista vale menos que todas as listadas (entre
+            # elas, a ordem de `fontes`)
+            lista = sorted(lista, key=lambda item: ordem.index(item[0]) if item[0] in ordem else len(ordem))
+        valores = pd.Series(_pegar(lista[0][1], posicoes[lista[0][0]]))
+        for nome, serie in lista[1:]:
+            valores = valores.fillna(pd.Series(_pegar(serie, posicoes[nome])))
+        saida[destino] = valores
+    df = pd.DataFrame(saida)
+    if not diagnostico:
+        return df
+
+    # 4) diagnóstico: códigos sem par em cada direção
+    finais = chaves_base[manter]
+    linhas = []
+    for fonte in fontes:
+        codigos = fonte.df[fonte.chave].to_numpy()
+        sem_par = np.setdiff1d(codigos, finais).tolist()
+        faltando = np.setdiff1d(finais, codigos).tolist()
+        linhas.append({
+            "fonte": fonte.nome,
+            "obrigatoria": fonte.obrigatoria,
+            "linhas": len(fonte.df),
+            "duplicados": duplicados[fonte.nome],
+            "sem_par_na_saida": len(sem_par),
+            "faltando_na_fonte": len(faltando),
+            "codigos_sem_par": sem_par,
+            "codigos_faltando": faltando,
+        })
+    return df, pd.DataFrame(linhas)
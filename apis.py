@@ -1,182 +1,437 @@
-import requests
+import os
+from functools import lru_cache
+
 import pandas as pd
 
+import armazem
+import sidra
+from alinhamento import Fonte, alinhar
+from esquema import compactar, relatorio
+from cache_http import aquecer, executar_varios, get_json
+from ingestao import ler_serie_municipal
+from instrumentacao import etapa
+
 # ==============================
 # Config
 # ==============================
-BASE = "https://www.ipea.gov.br/atlasviolencia/api/v1"
+# AP2_API_BASE=http://127.0.0.1:8765 troca os três hosts pelo servidor
+# local (servidor_local.py), para medir o fetch sem tocar nas APIs reais
+API_BASE = os.environ.get("AP2_API_BASE", "").rstrip("/")
+HOST_IPEA = f"{API_BASE}/ipea" if API_BASE else "https://www.ipea.gov.br"
+HOST_IBGE = f"{API_BASE}/ibge" if API_BASE else "https://servicodados.ibge.gov.br"
+HOST_SIDRA = f"{API_BASE}/sidra" if API_BASE else "https://apisidra.ibge.gov.br"
+BASE = f"{HOST_IPEA}/atlasviolencia/api/v1"
 SERIE_ID = 328  # Homicídios
-ARQ_SEG = r"data\despesas_seguranca.xlsx"
-ARQ_ICMS = r"data\finbra_icms.xlsx"
+# tabelas do armazém colunar (armazem.py), geradas a partir de data/<nome>.xlsx
+TAB_SEG = "despesas_seguranca"
+TAB_ICMS = "finbra_icms"
+TAB_SAIDA = "dados_completos_final"
+# Todas as URLs são nacionais: baixamos uma vez e cada UF é um filtro local
+URL_UF = f"{BASE}/valores-series/{SERIE_ID}/3"
+URL_COD = f"{HOST_IBGE}/api/v1/localidades/municipios"
+URL_MUN = f"{BASE}/valores-series/{SERIE_ID}/4"
+# PIB municipal: tabela 5938 do SIDRA, variável 37 (mil R$), todos os
+# anos, baixada só para as UFs da execução, em pedaços por UF/faixa de
+# anos (sidra.py)
+TABELA_PIB = 5938
+VARIAVEL_PIB = 37
+ANO_PIB_INICIAL = 2002  # início da série da tabela 5938
+ANO_PIB_FINAL = 2021    # último ano publicado (pedir além disso o SIDRA recusa)
 
-# ==============================
-# 1) Séries por UF (para medidas)
-# ==============================
-df_uf = pd.DataFrame(requests.get(f"{BASE}/valores-series/{SERIE_ID}/3", timeout=60).json())
-df_go = df_uf[df_uf['sigla'] == "GO"].copy()
+# Recorte padrão (o do trabalho): Goiás, 2023
+UF_PADRAO = "GO"
+ANO_PADRAO = 2023
+# As planilhas do FINBRA sem sufixo são de 2023; outros anos/UFs entram como
+# data/<tabela>_<ano>.xlsx (export nacional, filtrado pela coluna UF)
+ANO_FINBRA = 2023
 
-# Datas e tipos
-df_uf["periodo"] = pd.to_datetime(df_uf["periodo"], errors="coerce")
-df_uf["ano"] = df_uf["periodo"].dt.year
-df_uf["valor"] = pd.to_numeric(df_uf["valor"], errors="coerce")
+# Código IBGE de cada UF (os 2 primeiros dígitos do código do município)
+UFS = {
+    "RO": 11, "AC": 12, "AM": 13, "RR": 14, "PA": 15, "AP": 16, "TO": 17,
+    "MA": 21, "PI": 22, "CE": 23, "RN": 24, "PB": 25, "PE": 26, "AL": 27,
+    "SE": 28, "BA": 29, "MG": 31, "ES": 32, "RJ": 33, "SP": 35, "PR": 41,
+    "SC": 42, "RS": 43, "MS": 50, "MT": 51, "GO": 52, "DF": 53,
+}
 
-# Medidas gerais
-df_uf_2023 = df_uf[df_uf["ano"] == 2023].copy()
-df_uf_2023["valor"] = pd.to_numeric(df_uf_2023["valor"], errors="coerce")
 
-total_homicidios_estado = df_uf.groupby('sigla', as_index=False)['valor'].sum()
-media_homicidios_estado = df_uf.groupby('sigla', as_index=False)['valor'].mean().round(2)
-total_homicidios_2023 = df_uf_2023['valor'].sum()
-media_homicidios_2023 = df_uf_2023['valor'].mean().round(2)
+# Saídas de um recorte (tabela final, modelos, figuras): as do padrão
+# mantêm os nomes de sempre, as de outra UF/ano levam _<uf>_<ano>
+def sufixo_saida(uf=UF_PADRAO, ano=ANO_PADRAO):
+    return "" if (uf, ano) == (UF_PADRAO, ANO_PADRAO) else f"_{uf.lower()}_{ano}"
 
-# Medidas de GO
-df_go["valor"] = pd.to_numeric(df_go["valor"], errors="coerce")
-df_go['taxa_var'] = df_go['valor'].pct_change() * 100
-df_go['media_movel_3a'] = df_go['valor'].rolling(3).mean()
+
+def tabela_saida(uf=UF_PADRAO, ano=ANO_PADRAO):
+    """Nome da tabela final do recorte no armazém."""
+    return TAB_SAIDA + sufixo_saida(uf, ano)
+
+
+def pasta_figuras(uf=UF_PADRAO, ano=ANO_PADRAO):
+    sufixo = sufixo_saida(uf, ano)
+    return os.path.join("figs", sufixo[1:]) if sufixo else "figs"
 
 # ==============================
-# 2) Códigos dos municípios de GO
+# Snapshots locais (modo offline, AP2_OFFLINE=1)
+# Reconstroem o JSON de cada API a partir dos CSVs em data/
 # ==============================
-df_cod = pd.DataFrame(requests.get("https://servicodados.ibge.gov.br/api/v1/localidades/estados/GO/municipios", timeout=60).json())
-codigos = [str(c) for c in df_cod["id"].tolist()]  # sempre string
+SNAP_UF = os.path.join("data", "homicidios_uf.csv")
+SNAP_MUN = os.path.join("data", "homicidios_mun_go_aolongodosanos.csv")
+SNAP_FINAL = os.path.join("data", "dados_completos.csv")
+
+
+def _snapshot_uf():
+    return pd.read_csv(SNAP_UF, dtype=str).to_dict("records")
+
+
+def _snapshot_mun():
+    df = pd.read_csv(SNAP_MUN, dtype=str)
+    return df[["cod", "sigla", "valor", "periodo"]].to_dict("records")
+
+
+def _snapshot_cod():
+    df = pd.read_csv(SNAP_MUN, dtype=str).drop_duplicates("cod")
+    return [{"id": int(c), "nome": n} for c, n in zip(df["cod"], df["sigla"])]
+
+
+@lru_cache(maxsize=None)
+def _snapshot_final():
+    return pd.read_csv(SNAP_FINAL)
+
+
+def _snapshot_pib(pedaco=None):
+    # mesmo formato do SIDRA: 1ª linha é o cabeçalho, PIB em mil R$;
+    # com pedaco, só a UF e os anos dele (como a consulta por pedaço)
+    df = _snapshot_final()
+    if pedaco is not None:
+        df = df[(df["Codigo IBGE"] // 100000 == pedaco.uf) & df["Ano_PIB"].between(pedaco.inicio, pedaco.fim)]
+    cabecalho = {"D1C": "Município (Código)", "D1N": "Município", "D3N": "Ano", "V": "Valor"}
+    linhas = [{"D1C": str(c), "D1N": m, "D3N": str(a), "V": str(p / 1000)}
+              for c, m, a, p in zip(df["Codigo IBGE"], df["Municipio"], df["Ano_PIB"], df["PIB"])]
+    return [cabecalho] + linhas
 
 # ==============================
-# 3) Homicídios por município (pega 2023)
+# Busca das fontes
+# As quatro APIs não dependem umas das outras: buscar_fontes() dispara
+# todas em paralelo. As respostas pequenas ficam em _respostas; a série
+# municipal (o Brasil inteiro) só é baixada para o cache em disco e depois
+# lida em streaming, filtrando a UF durante a leitura (ver ingestao.py).
+# O PIB não é uma URL só: são os pedaços de sidra.py (urls_pib()), só
+# das UFs pedidas.
 # ==============================
-df_mun = pd.DataFrame(requests.get(f"{BASE}/valores-series/{SERIE_ID}/4", timeout=60).json())
-df_mun_go = df_mun[df_mun["cod"].isin(codigos)].copy()
+FONTES = {
+    "uf": (URL_UF, _snapshot_uf),
+    "codigos": (URL_COD, _snapshot_cod),
+    "municipios": (URL_MUN, _snapshot_mun),
+}
+FONTES_STREAM = {"municipios"}
+_respostas = {}
+
 
-df_mun_go["periodo"] = pd.to_datetime(df_mun_go["periodo"], errors="coerce")
-df_mun_go["ano"] = df_mun_go["periodo"].dt.year
-df_mun_go_2023 = df_mun_go[df_mun_go["ano"] == 2023].copy()
+def url_pib(pedaco):
+    return sidra.url(HOST_SIDRA, TABELA_PIB, VARIAVEL_PIB, pedaco)
 
-df_mun_go_2023.rename(columns={'valor': 'Qtd_Homicidios', 'sigla': 'Municipio'}, inplace=True)
-df_mun_go_2023["Qtd_Homicidios"] = pd.to_numeric(df_mun_go_2023["Qtd_Homicidios"], errors="coerce")
-df_mun_go_2023["cod"] = df_mun_go_2023["cod"].astype(str).str.zfill(7)
 
-# Top 10 homicídios 2023
-top10 = df_mun_go_2023.sort_values('Qtd_Homicidios', ascending=False).head(10)
+def pedacos_pib(ufs=(UF_PADRAO,), ano_final=ANO_PIB_FINAL):
+    """Pedaços do PIB das UFs (siglas), de ANO_PIB_INICIAL até o último ano da tabela."""
+    return sidra.planejar([UFS[uf] for uf in ufs], ANO_PIB_INICIAL, min(ano_final, ANO_PIB_FINAL))
+
+
+def urls_pib(ufs=(UF_PADRAO,)):
+    return [url_pib(p) for p in pedacos_pib(ufs)]
+
+
+def buscar_fontes(nomes=None, max_workers=4, ufs=(UF_PADRAO,)):
+    """Busca as fontes em paralelo e devolve a latência de cada uma (s).
+
+    ufs: siglas para as quais o PIB é baixado (as outras fontes são nacionais).
+    """
+    nomes = list(FONTES) + ["pib"] if nomes is None else nomes
+    tarefas = {}
+    for nome in nomes:
+        if nome == "pib":
+            tarefas[nome] = lambda: [carregar_pib_uf(uf) for uf in ufs]
+            continue
+        url, snapshot = FONTES[nome]
+        if nome in FONTES_STREAM:
+            tarefas[nome] = lambda url=url, snapshot=snapshot: aquecer(url, timeout=60, snapshot=snapshot)
+        elif nome not in _respostas:
+            tarefas[nome] = lambda nome=nome: _json(nome)
+    _, latencias = executar_varios(tarefas, max_workers=max_workers)
+    return latencias
+
+
+def _json(nome):
+    if nome not in _respostas:
+        url, snapshot = FONTES[nome]
+        with etapa(f"fetch/{nome}"):
+            _respostas[nome] = get_json(url, timeout=60, snapshot=snapshot)
+    return _respostas[nome]
+
 
 # ==============================
-# 4) Despesa com segurança (planilha)
+# Pipeline preguiçoso
+# Cada tabela é calculada só no primeiro acesso e fica memorizada no
+# processo (lru_cache), uma vez por (UF, ano). `from apis import df_go` continua funcionando via
+# __getattr__ do módulo, mas só paga pelo que for pedido: df_go não baixa
+# municípios nem PIB. Os frames devolvidos são compartilhados, então quem
+# for alterar deve fazer .copy() antes.
 # ==============================
-df_seg = pd.read_excel(ARQ_SEG)
-df_seg["Cod.IBGE"] = df_seg["Cod.IBGE"].astype(str).str.zfill(7)
 
 # ==============================
-# 5) Merge base: homicídios + segurança
+# 1) Séries por UF (para medidas)
 # ==============================
-df_final = (
-    df_mun_go_2023
-      .merge(df_seg, left_on="cod", right_on="Cod.IBGE", how="inner")
-      .loc[:, ["cod", "População", "Valor", "UF", "Municipio", "Qtd_Homicidios", "ano"]]
-      .rename(columns={"cod": "Codigo IBGE", "ano": "Ano"})
-      .copy()
-)
+@lru_cache(maxsize=None)
+def carregar_df_uf():
+    df_uf = pd.DataFrame(_json("uf"))
 
-# Taxa por 1000 hab (a População será substituída pelo ICMS mais abaixo,
-# então recalcularemos depois também, por segurança)
-df_final['taxa/1000hab'] = df_final['Qtd_Homicidios'] / df_final['População'] * 1000
+    # Datas e tipos
+    df_uf["periodo"] = pd.to_datetime(df_uf["periodo"], errors="coerce")
+    df_uf["ano"] = df_uf["periodo"].dt.year
+    df_uf["valor"] = pd.to_numeric(df_uf["valor"], errors="coerce")
+    return compactar(df_uf, "df_uf")
 
-# ==============================
-# 6) ICMS (trazer valor_icms e POPULAÇÃO do df_icms)
-# ==============================
-df_icms = pd.read_excel(ARQ_ICMS)
-df_icms["Cod.IBGE"] = df_icms["Cod.IBGE"].astype(str).str.zfill(7)
 
-# Use só as colunas necessárias; renomeia Valor -> valor_icms
-df_icms_use = df_icms.loc[:, ["Cod.IBGE", "População", "Valor"]].rename(columns={"Valor": "valor_icms"})
+@lru_cache(maxsize=None)
+def carregar_df_go(uf=UF_PADRAO):
+    # Medidas da UF (série histórica com variação e média móvel), do cubo
+    import agregados
+    df_go = carregar_df_uf().loc[lambda d: d["sigla"] == uf].copy()
+    serie = agregados.serie_uf(uf).reindex(df_go["ano"])
+    df_go['taxa_var'] = serie["var_pct"].to_numpy()
+    df_go['media_movel_3a'] = serie["media_movel_3a"].to_numpy()
+    return df_go
+
+
+@lru_cache(maxsize=None)
+def carregar_df_uf_2023(ano=ANO_PADRAO):
+    df_uf = carregar_df_uf()
+    return df_uf[df_uf["ano"] == ano].copy()
+
+
+# Medidas gerais (lidas do cubo de agregados.py)
+def total_homicidios_estado():
+    import agregados
+    return agregados.resumo_uf()["total"].rename("valor").reset_index()
+
+
+def media_homicidios_estado():
+    import agregados
+    return agregados.resumo_uf()["media"].round(2).rename("valor").reset_index()
+
 
-# Merge e substituição de população
-df_final = (
-    df_final
-      .merge(df_icms_use, left_on="Codigo IBGE", right_on="Cod.IBGE", how="left")
-      .drop(columns=["Cod.IBGE"])
-      .rename(columns={"População_x": "População_df_final", "População_y": "População_icms"})
-      .copy()
-)
+def total_homicidios_2023(ano=ANO_PADRAO):
+    import agregados
+    return agregados.resumo_ano(ano)["total"]
 
-# Se existir população do ICMS, substitui
-df_final["População"] = df_final["População_icms"].fillna(df_final["População_df_final"])
-df_final.drop(columns=["População_df_final", "População_icms"], inplace=True)
 
-# Recalcula taxa por 1000 hab com a população final
-df_final['taxa/1000hab'] = df_final['Qtd_Homicidios'] / df_final['População'] * 1000
+def media_homicidios_2023(ano=ANO_PADRAO):
+    import agregados
+    return round(agregados.resumo_ano(ano)["media"], 2)
+
+
+# ==============================
+# 2) Códigos dos municípios da UF
+# ==============================
+@lru_cache(maxsize=None)
+def carregar_codigos(uf=UF_PADRAO):
+    df_cod = pd.DataFrame(_json("codigos"))
+    df_cod = df_cod[df_cod["id"].astype(int) // 100000 == UFS[uf]]
+    return [int(c) for c in df_cod["id"].tolist()]  # código IBGE inteiro
+
 
 # ==============================
-# 7) PIB municipal (último ano disponível) e per capita
+# 3) Homicídios por município (pega o ano pedido)
 # ==============================
-URL_PIB = "https://apisidra.ibge.gov.br/values/t/5938/n6/all/n3/52/v/37/p/last?formato=json"
-df_raw = pd.DataFrame(requests.get(URL_PIB, timeout=60).json()[1:])
+@lru_cache(maxsize=None)
+def carregar_df_mun_go(uf=UF_PADRAO):
+    # lê em streaming e já descarta os municípios fora da UF
+    url, snapshot = FONTES["municipios"]
+    codigos = carregar_codigos(uf)
+    with etapa("fetch/municipios") as e:
+        df_mun_go = ler_serie_municipal(url, codigos=codigos, timeout=60, snapshot=snapshot)
+        e.linhas_out = len(df_mun_go)
+    return compactar(df_mun_go, "df_mun_go")  # cod já vem int32 da ingestão
 
-df_pib = (
-    df_raw.rename(columns={"D1C": "codigo_municipio", "D1N": "municipio", "D3N": "ano", "V": "valor_pib"})
-          .assign(codigo_municipio=lambda d: d["codigo_municipio"].astype(str).str.zfill(7),
-                  ano=lambda d: d["ano"].astype(int),
-                  valor_pib=lambda d: pd.to_numeric(d["valor_pib"], errors="coerce") * 1000)  # mil R$ -> R$
-          .loc[:, ["codigo_municipio", "valor_pib", "ano"]]
-          .rename(columns={"ano": "Ano_PIB"})
-          .copy()
-)
 
-# Um registro por município (já é "last" na URL, mas garantimos)
-df_pib_latest = (
-    df_pib.sort_values(["codigo_municipio", "Ano_PIB"])
-          .drop_duplicates("codigo_municipio", keep="last")
-)
+@lru_cache(maxsize=None)
+def carregar_df_mun_go_2023(uf=UF_PADRAO, ano=ANO_PADRAO):
+    df_mun_go = carregar_df_mun_go(uf)
+    df_mun_go_2023 = df_mun_go[df_mun_go["ano"] == ano].copy()
 
-# Merge PIB
-df_final = (
-    df_final.merge(df_pib_latest, left_on="Codigo IBGE", right_on="codigo_municipio", how="left")
-            .drop(columns=["codigo_municipio"])
-            .copy()
-)
+    df_mun_go_2023.rename(columns={'valor': 'Qtd_Homicidios', 'sigla': 'Municipio'}, inplace=True)
+    df_mun_go_2023["Qtd_Homicidios"] = pd.to_numeric(df_mun_go_2023["Qtd_Homicidios"], errors="coerce")
+    return df_mun_go_2023
+
+
+# Top 10 homicídios no ano (ranking do cubo)
+def carregar_top10(uf=UF_PADRAO, ano=ANO_PADRAO):
+    import agregados
+    top = agregados.top_municipios(10, ano, metrica="valor", uf=uf)
+    return top.rename(columns={"municipio": "Municipio", "valor": "Qtd_Homicidios"})
 
-# PIB per capita
-df_final["PIB_per_capita"] = (df_final["valor_pib"] / df_final["População"]).round(2)
 
 # ==============================
-# 8) Limpeza e ordem final de colunas
+# 4) Despesa com segurança e ICMS (planilhas, via armazém colunar)
 # ==============================
-df_final.rename(columns={"Valor": "Gasto_Seguranca", "valor_pib": "PIB"}, inplace=True)
-df_final = df_final[
-    ["Codigo IBGE", "Municipio", "População", "Gasto_Seguranca", "valor_icms",
-     "Qtd_Homicidios", "taxa/1000hab", "PIB", "PIB_per_capita", "Ano", "Ano_PIB"]
-].copy()
+def tabela_do_ano(tabela, ano):
+    if armazem.existe(f"{tabela}_{ano}"):
+        return f"{tabela}_{ano}"
+    if ano == ANO_FINBRA:
+        return tabela
+    raise FileNotFoundError(f"Sem planilha {tabela} para {ano} (esperado data/{tabela}_{ano}.xlsx)")
+
+
+@lru_cache(maxsize=None)
+def _ler_finbra(tabela):
+    with etapa(f"planilha/{tabela}") as e:
+        df = armazem.ler(tabela)
+        e.linhas_out = len(df)
+    return compactar(df, tabela)  # Cod.IBGE -> int32, textos -> category
+
+
+@lru_cache(maxsize=None)
+def carregar_df_seg(uf=UF_PADRAO, ano=ANO_PADRAO):
+    df_seg = _ler_finbra(tabela_do_ano(TAB_SEG, ano))
+    return df_seg[df_seg["UF"] == uf].copy()
+
+
+@lru_cache(maxsize=None)
+def carregar_df_icms(uf=UF_PADRAO, ano=ANO_PADRAO):
+    df_icms = _ler_finbra(tabela_do_ano(TAB_ICMS, ano))
+    return df_icms[df_icms["UF"] == uf].copy()
+
 
 # ==============================
-# 9) (Opcional) salvar resultados
+# 5) PIB municipal (último ano disponível até o ano pedido)
 # ==============================
-# df_final.to_excel("dados_completos.xlsx", index=False)
+@lru_cache(maxsize=None)
+def carregar_pib_uf(uf=UF_PADRAO):
+    # todos os municípios e anos da UF (um pedaço, ou um por faixa de anos)
+    with etapa("fetch/pib") as e:
+        df = sidra.baixar(pedacos_pib((uf,)), url_pib, _snapshot_pib)
+        e.linhas_out = len(df)
+
+    df_pib = pd.DataFrame({"codigo_municipio": df["cod"],
+                           "valor_pib": df["valor"] * 1000,  # mil R$ -> R$
+                           "Ano_PIB": df["ano"]})
+    return compactar(df_pib, "df_pib")  # já vem ordenado por (código, ano)
+
+
+@lru_cache(maxsize=None)
+def carregar_df_pib(uf=UF_PADRAO, ano=ANO_PADRAO):
+    df_pib = carregar_pib_uf(uf)
+    # se houver mais de um ano, fica o mais recente que não passa de `ano`
+    if (df_pib["Ano_PIB"] <= ano).any():
+        df_pib = df_pib[df_pib["Ano_PIB"] <= ano]
+
+    # Um registro por município: o último ano que sobrou
+    return df_pib.drop_duplicates("codigo_municipio", keep="last")
+
 
 # ==============================
-# 10) Objetos finais (os mesmos que você lista no fim)
+# 6) Tabela final: homicídios + segurança + ICMS + PIB
 # ==============================
-# Séries/medidas e dataframes pedidos
-_ = (
-    df_go,                 # série GO com taxa_var e média móvel
-    codigos,               # lista de códigos
-    df_mun_go_2023,        # homicídios municipais 2023
-    df_uf_2023,            # homicídios UF 2023
-    total_homicidios_estado,
-    media_homicidios_estado,
-    total_homicidios_2023,
-    media_homicidios_2023,
-    df_go['taxa_var'],
-    df_go['media_movel_3a'],
-    top10,
-    df_final               # -> TABELA FINAL LIMPA
-)
+COLUNAS_FINAIS = ["Codigo IBGE", "Municipio", "População", "Gasto_Seguranca", "valor_icms",
+                  "Qtd_Homicidios", "taxa/1000hab", "PIB", "PIB_per_capita", "Ano", "Ano_PIB"]
+
+
+class SemDadosUF(LookupError):
+    """A tabela final de (UF, ano) saiu vazia: alguma fonte não tem a UF."""
+
+
+@lru_cache(maxsize=None)
+def carregar_df_final(uf=UF_PADRAO, ano=ANO_PADRAO):
+    df_mun_ano = carregar_df_mun_go_2023(uf, ano)
+    df_seg, df_icms = carregar_df_seg(uf, ano), carregar_df_icms(uf, ano)
+    df = juntar_fontes(df_mun_ano, df_seg, df_icms, carregar_df_pib(uf, ano))
+    if df.empty:
+        # ex.: as planilhas do FINBRA em data/ só trazem GO
+        fontes = {"série municipal": df_mun_ano, tabela_do_ano(TAB_SEG, ano): df_seg,
+                  tabela_do_ano(TAB_ICMS, ano): df_icms}
+        vazias = [nome for nome, f in fontes.items() if f.empty]
+        motivo = f"sem linhas de {uf} em {', '.join(vazias)}" if vazias else "nenhum código IBGE em comum"
+        raise SemDadosUF(f"Tabela final de {uf} {ano} vazia: {motivo}")
+    return df
+
+
+def diagnosticar_fontes(uf=UF_PADRAO, ano=ANO_PADRAO):
+    """Códigos sem par em cada fonte da tabela final."""
+    return juntar_fontes(carregar_df_mun_go_2023(uf, ano), carregar_df_seg(uf, ano),
+                         carregar_df_icms(uf, ano), carregar_df_pib(uf, ano), com_diagnostico=True)[1]
+
+
+def juntar_fontes(df_mun_ano, df_seg, df_icms, df_pib, com_diagnostico=False):
+    """Junta homicídios, segurança, ICMS e PIB pelo código IBGE (sem E/S).
+
+    Cada fonte é indexada pelo código uma vez e a tabela sai num passo só
+    (alinhamento.alinhar). Homicídios e segurança são obrigatórios (como o
+    inner join de antes); ICMS e PIB completam o que tiverem. População:
+    vale a do ICMS e, sem ela, a da planilha de segurança.
+    Com com_diagnostico=True devolve (df_final, diagnóstico por fonte).
+    """
+    fontes = [
+        Fonte("homicidios", df_mun_ano, "cod",
+              {"cod": "Codigo IBGE", "Municipio": "Municipio", "Qtd_Homicidios": "Qtd_Homicidios", "ano": "Ano"}),
+        Fonte("seguranca", df_seg, "Cod.IBGE", {"População": "População", "Valor": "Gasto_Seguranca"}),
+        Fonte("icms", df_icms, "Cod.IBGE", {"População": "População", "Valor": "valor_icms"}, obrigatoria=False),
+        Fonte("pib", df_pib, "codigo_municipio", {"valor_pib": "PIB", "Ano_PIB": "Ano_PIB"}, obrigatoria=False),
+    ]
+    with etapa("merge/alinhar", linhas_in=len(df_mun_ano)) as e:
+        df_final = alinhar(fontes, precedencia={"População": ["icms", "seguranca"]}, diagnostico=com_diagnostico)
+        if com_diagnostico:
+            df_final, diagnostico = df_final
+        e.linhas_out = len(df_final)
+
+    # Taxa por 1000 hab com a população final
+    df_final["taxa/1000hab"] = df_final["Qtd_Homicidios"] / df_final["População"] * 1000
+    # PIB per capita
+    df_final["PIB_per_capita"] = (df_final["PIB"] / df_final["População"]).round(2)
+
+    df_final = df_final[COLUNAS_FINAIS]
+    return (df_final, diagnostico) if com_diagnostico else df_final
 
-print("df_final pronto!")
-print(df_final.head())
 
 # ==============================
-# 11) Salvar o resultado final em Excel
+# 7) Objetos finais (os mesmos nomes de antes, agora sob demanda)
 # ==============================
+_PREGUICOSOS = {
+    "df_uf": carregar_df_uf,
+    "df_go": carregar_df_go,                  # série GO com taxa_var e média móvel
+    "codigos": carregar_codigos,              # lista de códigos
+    "df_mun_go_2023": carregar_df_mun_go_2023,  # homicídios municipais 2023
+    "df_uf_2023": carregar_df_uf_2023,        # homicídios UF 2023
+    "total_homicidios_estado": total_homicidios_estado,
+    "media_homicidios_estado": media_homicidios_estado,
+    "total_homicidios_2023": total_homicidios_2023,
+    "media_homicidios_2023": media_homicidios_2023,
+    "top10": carregar_top10,
+    "df_final": carregar_df_final,            # -> TABELA FINAL LIMPA
+}
+
+
+def __getattr__(nome):
+    if nome in _PREGUICOSOS:
+        return _PREGUICOSOS[nome]()
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    latencias = buscar_fontes()
+    for nome, segundos in latencias.items():
+        print(f"{nome:<12} {segundos:6.2f}s")
+    print(f"{'total':<12} {max(latencias.values()):6.2f}s (paralelo)")
+
+    df_final = carregar_df_final()
+    print("df_final pronto!")
+    print(df_final.head())
+
+    print("\nCódigos sem par por fonte:")
+    print(diagnosticar_fontes().drop(columns=["codigos_sem_par", "codigos_faltando"]).to_string(index=False))
 
-# Caminho onde o arquivo será salvo (você pode mudar o nome ou a pasta)
-caminho_saida = r"data\dados_completos_final.xlsx"
+    print("\nMemória por frame (tipos compactos):")
+    print(relatorio().to_string(index=False, float_format="{:.3f}".format))
 
-# Salva em Excel (sem o índice)
-df_final.to_excel(caminho_saida, index=False)
\ No newline at end of file
+    # Salva no armazém colunar; o Excel só com --excel
+    with etapa("saida/dados_completos_final", linhas_in=len(df_final)):
+        armazem.salvar(df_final, TAB_SAIDA, excel="--excel" in sys.argv)
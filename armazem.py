@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from comum import gravando
+
+# ==============================
+# Armazém colunar (Arrow IPC / Feather)
+# As planilhas em data/ continuam sendo a fonte, mas só são abertas pelo
+# openpyxl quando mudam: a primeira leitura converte para
+# data/arrow/<nome>.arrow e as seguintes leem direto (memory map).
+# O Excel vira só um formato de exportação opcional.
+# ==============================
+DIR_DADOS = "data"
+DIR_ARMAZEM = os.path.join(DIR_DADOS, "arrow")
+
+
+def _caminho_arrow(nome):
+    return os.path.join(DIR_ARMAZEM, f"{nome}.arrow")
+
+
+def _caminho_manifesto(nome):
+    return os.path.join(DIR_ARMAZEM, f"{nome}.fonte.json")
+
+
+def _caminho_xlsx(nome):
+    return os.path.join(DIR_DADOS, f"{nome}.xlsx")
+
+
+def _impressao(caminho):
+    """Identifica a versão de um arquivo (tamanho, mtime e sha256)."""
+    if not os.path.exists(caminho):
+        return None
+    st = os.stat(caminho)
+    with open(caminho, "rb") as f:
+        sha = hashlib.sha256(f.read()).hexdigest()
+    return {"tamanho": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+
+
+def _mesma_fonte(caminho, anterior):
+    if anterior is None or not os.path.exists(caminho):
+        return anterior is None and not os.path.exists(caminho)
+    st = os.stat(caminho)
+    if st.st_size == anterior["tamanho"] and st.st_mtime_ns == anterior["mtime_ns"]:
+        return True
+    # mtime muda num checkout do git; o conteúdo é o que decide
+    return _impressao(caminho)["sha256"] == anterior["sha256"]
+
+
+def _ler_manifesto(nome):
+    try:
+        with open(_caminho_manifesto(nome), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar(df, nome):
+    with gravando(_caminho_arrow(nome)) as tmp:
+        feather.write_feather(df.reset_index(drop=True), tmp, compression="uncompressed")
+    with open(_caminho_manifesto(nome), "w", encoding="utf-8") as f:
+        json.dump({"xlsx": _impressao(_caminho_xlsx(nome))}, f)
+
+
+def atualizado(nome):
+    """True se o .arrow existe e a planilha de origem não mudou desde então."""
+    manifesto = _ler_manifesto(nome)
+    return (manifesto is not None and os.path.exists(_caminho_arrow(nome))
+            and _mesma_fonte(_caminho_xlsx(nome), manifesto["xlsx"]))
+
+
+def existe(nome):
+    """True se a tabela está no armazém ou há uma planilha de origem para ela."""
+    return os.path.exists(_caminho_arrow(nome)) or os.path.exists(_caminho_xlsx(nome))
+
+
+def ler(nome, colunas=None):
+    """
+    Lê a tabela `nome` do armazém. Se a planilha data/<nome>.xlsx for nova
+    ou tiver mudado, converte antes (só nesse caso o Excel é aberto).
+    """
+    if not atualizado(nome) and os.path.exists(_caminho_xlsx(nome)):
+        _gravar(pd.read_excel(_caminho_xlsx(nome)), nome)
+    if not os.path.exists(_caminho_arrow(nome)):
+        raise FileNotFoundError(f"Tabela {nome!r} não está no armazém nem em {_caminho_xlsx(nome)}")
+    tabela = feather.read_table(_caminho_arrow(nome), columns=colunas, memory_map=True)
+    return tabela.to_pandas()
+
+
+def salvar(df, nome, excel=False):
+    """Grava `df` no armazém; com excel=True também exporta data/<nome>.xlsx."""
+    if excel:
+        df.to_excel(_caminho_xlsx(nome), index=False)
+    _gravar(df, nome)
+
+
+# ==============================
+# Tabelas particionadas (data/arrow/<nome>/uf=GO/ano=2023.arrow)
+# ==============================
+def _caminho_particao(nome, uf, ano):
+    return os.path.join(DIR_ARMAZEM, nome, f"uf={uf}", f"ano={ano}.arrow")
+
+
+def salvar_particao(df, nome, uf, ano):
+    caminho = _caminho_particao(nome, uf, ano)
+    with gravando(caminho) as tmp:
+        feather.write_feather(df.reset_index(drop=True), tmp, compression="uncompressed")
+    return caminho
+
+
+def apagar_particao(nome, uf, ano):
+    """Remove a partição (uf, ano), se existir."""
+    try:
+        os.remove(_caminho_particao(nome, uf, ano))
+    except FileNotFoundError:
+        pass
+
+
+def listar_particoes(nome):
+    """Lista os pares (uf, ano) já gravados para a tabela `nome`."""
+    raiz = os.path.join(DIR_ARMAZEM, nome)
+    if not os.path.isdir(raiz):
+        return []
+    pares = []
+    for pasta in sorted(os.listdir(raiz)):
+        if not pasta.startswith("uf="):
+            continue
+        for arq in sorted(os.listdir(os.path.join(raiz, pasta))):
+            if arq.startswith("ano=") and arq.endswith(".arrow"):
+                pares.append((pasta[3:], int(arq[4:-6])))
+    return pares
+
+
+def ler_particoes(nome, ufs=None, anos=None):
+    """Junta as partições de `nome`, opcionalmente só algumas UFs/anos."""
+    partes = []
+    for uf, ano in listar_particoes(nome):
+        if (ufs is None or uf in ufs) and (anos is None or ano in anos):
+            tabela = feather.read_table(_caminho_particao(nome, uf, ano), memory_map=True)
+            partes.append(tabela.to_pandas().assign(UF=uf))
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
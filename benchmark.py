@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Benchmark por etapa com dados sintéticos (sintetico.py)
+# Mede tempo (melhor de N repetições) e pico de memória (tracemalloc, numa
+# execução separada para não distorcer o tempo) de cada etapa: leitura do
+# JSON, junções por código IBGE, métricas derivadas, cada gráfico e cada
+# estimador. Compara com benchmarks/baseline.json e sai com código 1 se
+# alguma etapa ficar mais lenta que a tolerância. Com --importacao mede o
+# tempo de importar cada módulo do projeto (startup dos scripts).
+# Tempo absoluto varia muito de uma execução para outra (outros processos,
+# frequência da CPU), então a comparação não é segundo contra segundo:
+# - uma carga de referência fixa é medida junto e guardada no baseline;
+#   se a máquina está mais lenta agora, o baseline é escalado pela razão
+#   entre a referência de agora e a dele
+# - diferenças abaixo de PISO segundos não contam, por maiores que sejam
+#   em proporção (etapas de milissegundos)
+# - etapa que passa da tolerância é medida de novo (CONFIRMACOES vezes)
+#   e só é regressão se continuar lenta
+# ==============================
+ARQ_BASELINE = os.path.join("benchmarks", "baseline.json")
+TOLERANCIA = 0.25  # 25% mais lento que o baseline (já escalado) = regressão
+PISO = 0.05  # s
+CONFIRMACOES = 5
+CHAVE_REFERENCIA = "_referencia"
+# --importacao: tempo de `import <módulo>` num processo novo (python -X
+# importtime), guardado na chave "importacao" do mesmo baseline
+MODULOS = ["apis", "graficos", "variavel_instrumental", "estimacao", "inferencia", "curva_especificacao",
+           "agregados", "painel", "pipeline", "main"]
+CHAVE_IMPORTACAO = "importacao"
+
+
+def melhor_tempo(funcao, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos)
+
+
+def medir(funcao, repeticoes=3):
+    segundos = melhor_tempo(funcao, repeticoes)
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"segundos": segundos, "pico_mb": pico / 2**20}
+
+
+def carga_referencia():
+    """Trabalho fixo (numpy, pandas e Python puro) que mede a velocidade da máquina agora."""
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((500, 500))
+    df = pd.DataFrame({"k": rng.integers(0, 5000, 1_000_000), "v": rng.standard_normal(1_000_000)})
+    a @ a
+    df.groupby("k")["v"].mean()
+    sum(i * i for i in range(1_000_000))
+
+
+def tempo_importacao(modulo, repeticoes=3):
+    """Melhor tempo (s) de importar `modulo` do zero e os 5 pacotes que mais pesaram."""
+    melhor, pesados = None, []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                               capture_output=True, text=True, check=True).stderr
+        # linhas "import time: self [us] | cumulative | nome", na ordem em que terminam
+        linhas = []
+        for linha in saida.splitlines():
+            if linha.startswith("import time:") and "|" in linha and "cumulative" not in linha:
+                _, cumulativo, nome = linha[len("import time:"):].split("|")
+                linhas.append((int(cumulativo) / 1e6, nome.rstrip()))
+        total = next(t for t, nome in reversed(linhas) if nome.strip() == modulo)
+        if melhor is None or total < melhor:
+            # imports diretos do módulo: recuo de 3 espaços (o módulo tem 1, cada nível soma 2)
+            diretos = [(t, nome.strip()) for t, nome in linhas if nome.startswith("   ") and not nome.startswith("    ")]
+            melhor, pesados = total, sorted(diretos, reverse=True)[:5]
+    return {"segundos": melhor, "mais_pesados": [f"{nome} {t:.2f}s" for t, nome in pesados]}
+
+
+def etapas(escala=1.0, anos=35, filtro=None):
+    """Monta a lista (nome, função sem argumentos) de tudo o que é medido."""
+    import agregados
+    import apis
+    import cache_ajustes
+    import graficos
+    import inferencia
+    import painel
+    import ingestao
+    import sintetico
+    import variavel_instrumental as vi
+
+    f = sintetico.fontes(escala, anos)
+    corpo = sintetico.json_serie(f["df_mun"])
+    pedacos = [corpo[i:i + (1 << 16)] for i in range(0, len(corpo), 1 << 16)]
+    df_mun = f["df_mun"].assign(periodo=lambda d: pd.to_datetime(d["periodo"]))
+    siglas = {cod: sigla for sigla, cod in apis.UFS.items()}
+
+    lista = [
+        ("ingestao/json_go", lambda: ingestao.ler_serie_filtrada(pedacos, ufs=[apis.UFS["GO"]])),
+        ("ingestao/json_completo", lambda: ingestao.ler_serie_filtrada(pedacos)),
+        ("apis/juntar_fontes", lambda: apis.juntar_fontes(f["df_mun_ano"], f["df_seg"], f["df_icms"], f["df_pib"])),
+        ("agregados/cubo_municipios", lambda: agregados.calcular_municipios(df_mun, siglas=siglas)),
+    ]
+
+    # gráficos: mesmos frames do relatório, em escala nacional
+    df_uf = sintetico.serie_uf(anos).assign(periodo=lambda d: pd.to_datetime(d["periodo"]))
+    df_uf["ano"] = df_uf["periodo"].dt.year
+    lista.append(("agregados/cubo_uf", lambda: agregados.calcular_uf(df_uf)))
+    serie_go = agregados.calcular_uf(df_uf).xs("GO", level="sigla")
+    df_go = df_uf[df_uf["sigla"] == "GO"].assign(taxa_var=serie_go["var_pct"].to_numpy(),
+                                                 media_movel_3a=serie_go["media_movel_3a"].to_numpy())
+    df_final = apis.juntar_fontes(f["df_mun_ano"], f["df_seg"], f["df_icms"], f["df_pib"])
+    dados = graficos.montar_dados("GO", sintetico.ANO_FINAL, df_go,
+                                  df_uf[df_uf["ano"] == sintetico.ANO_FINAL], f["df_mun_ano"], df_final)
+    pasta = tempfile.mkdtemp(prefix="ap2_bench_")
+    os.makedirs(os.path.join(pasta, "_paginas"))
+    for nome, funcao, frames, pagina_pdf in graficos.GRAFICOS:
+        recorte = {k: dados[k] for k in frames + graficos._PARAMETROS}
+        lista.append((f"grafico/{nome}",
+                      lambda n=nome, fn=funcao, r=recorte, p=pagina_pdf: graficos.renderizar(n, fn, r, pasta, p)))
+
+    # estimadores de variavel_instrumental.py
+    df_modelo = sintetico.dados_modelo(int(sintetico.N_MUNICIPIOS * escala))
+    df_log = vi.adicionar_logs(df_modelo)
+    # lote_do_cache mede a leitura: cache num diretório temporário, já preenchido
+    cache_ajustes.DIR_CACHE = tempfile.mkdtemp(prefix="ap2_bench_ajustes_")
+    cache_ajustes.ajustar(df_log, vi.ESPECIFICACOES)
+    lista += [
+        ("modelo/ols", lambda: vi.ajustar_ols(df_modelo)),
+        ("modelo/primeiro_estagio", lambda: vi.ajustar_primeiro_estagio(df_modelo)),
+        ("modelo/iv", lambda: vi.ajustar_iv(df_modelo)),
+        ("modelo/iv_log", lambda: vi.ajustar_iv_log(df_log)),
+        ("modelo/iv_quad", lambda: vi.ajustar_iv_quad(df_log)),
+        ("modelo/iv_quad_sem_pib", lambda: vi.ajustar_iv_quad(df_log, controles=("ln_pop",))),
+        ("modelo/lote_especificacoes", lambda: vi.ajustar_todos(df_log)),
+        ("modelo/lote_do_cache", lambda: cache_ajustes.ajustar(df_log, vi.ESPECIFICACOES)),
+        ("inferencia/iv_1000_replicacoes",
+         lambda: inferencia.inferir(df_modelo, vi.ESPECIFICACOES[2], replicacoes=1000)),
+    ]
+
+    # painel município x ano com efeitos fixos (todos os anos da série)
+    df_painel = sintetico.painel(escala, anos)
+    lista.append(("painel/iv_efeitos_fixos",
+                  lambda: painel.ajustar_painel(df_painel, "Qtd_Homicidios", ["Gasto_Seguranca"], ["valor_icms"],
+                                                ["População", "PIB_per_capita"])))
+    if filtro:
+        lista = [(n, fn) for n, fn in lista if filtro in n]
+    return lista
+
+
+def fator_maquina(referencia, baseline):
+    """Quanto a máquina está mais lenta que quando o baseline foi salvo (>= 1).
+
+    Só afrouxa: a referência também oscila, e uma referência rápida por
+    acaso apertaria o baseline de todas as etapas ao mesmo tempo.
+    """
+    base = baseline.get(CHAVE_REFERENCIA)
+    return max(1.0, referencia / base["segundos"]) if base else 1.0
+
+
+def comparar(resultados, baseline, tolerancia=TOLERANCIA, fator=1.0, piso=PISO):
+    """Etapas mais lentas que o baseline escalado * (1 + tolerancia) e por mais de piso segundos.
+
+    Devolve (nome, esperado, medido), com esperado = baseline * fator.
+    """
+    regressoes = []
+    for nome, r in resultados.items():
+        base = baseline.get(nome)
+        if not base or nome == CHAVE_REFERENCIA:
+            continue
+        esperado = base["segundos"] * fator
+        if r["segundos"] > esperado * (1 + tolerancia) and r["segundos"] - esperado > piso:
+            regressoes.append((nome, esperado, r["segundos"]))
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das etapas com dados sintéticos.")
+    parser.add_argument("--escala", type=float, default=1.0, help="1 = 5.570 municípios")
+    parser.add_argument("--anos", type=int, default=35)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--filtro", default=None, help="só etapas cujo nome contém o texto")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--salvar-baseline", action="store_true")
+    parser.add_argument("--saida", default=None, help="grava os resultados em JSON")
+    parser.add_argument("--importacao", action="store_true",
+                        help="mede o tempo de importação dos módulos em vez das etapas")
+    args = parser.parse_args()
+
+    # referência antes e depois das medições: fica a menor das duas
+    referencia = melhor_tempo(carga_referencia, args.repeticoes)
+    resultados, remedir = {}, {}
+    if args.importacao:
+        chave = CHAVE_IMPORTACAO
+        for modulo in MODULOS:
+            if args.filtro and args.filtro not in modulo:
+                continue
+            resultados[modulo] = r = tempo_importacao(modulo, args.repeticoes)
+            remedir[modulo] = lambda m=modulo: tempo_importacao(m, CONFIRMACOES)["segundos"]
+            print(f"import {modulo:<34} {r['segundos']:9.4f}s   {', '.join(r['mais_pesados'])}")
+    else:
+        chave = f"escala={args.escala:g},anos={args.anos}"
+        for nome, funcao in etapas(args.escala, args.anos, args.filtro):
+            resultados[nome] = medir(funcao, args.repeticoes)
+            remedir[nome] = lambda fn=funcao: melhor_tempo(fn, CONFIRMACOES)
+            r = resultados[nome]
+            print(f"{nome:<42} {r['segundos']:9.4f}s {r['pico_mb']:9.1f} MB")
+    referencia = min(referencia, melhor_tempo(carga_referencia, args.repeticoes))
+    print(f"carga de referência: {referencia:.4f}s")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({chave: {**resultados, CHAVE_REFERENCIA: {"segundos": referencia}}}, f, indent=2)
+
+    todos = {}
+    if os.path.exists(ARQ_BASELINE):
+        with open(ARQ_BASELINE, encoding="utf-8") as f:
+            todos = json.load(f)
+
+    if args.salvar_baseline:
+        todos.setdefault(chave, {}).update(resultados)
+        todos[chave][CHAVE_REFERENCIA] = {"segundos": referencia}
+        os.makedirs(os.path.dirname(ARQ_BASELINE), exist_ok=True)
+        with open(ARQ_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(todos, f, indent=2, sort_keys=True)
+        print(f"baseline salvo em {ARQ_BASELINE} ({chave})")
+    elif chave in todos:
+        fator = fator_maquina(referencia, todos[chave])
+        print(f"máquina {fator:.2f}x o tempo de quando o baseline foi salvo"
+              if CHAVE_REFERENCIA in todos[chave] else "baseline sem carga de referência: comparando em segundos")
+        # quem passou da tolerância é medido de novo; vale o melhor tempo
+        for nome, _, _ in comparar(resultados, todos[chave], args.tolerancia, fator):
+            resultados[nome]["segundos"] = min(resultados[nome]["segundos"], remedir[nome]())
+        regressoes = comparar(resultados, todos[chave], args.tolerancia, fator)
+        for nome, esperado, agora in regressoes:
+            print(f"REGRESSÃO {nome}: esperado {esperado:.4f}s (baseline escalado) -> {agora:.4f}s")
+        if regressoes:
+            sys.exit(1)
+        print(f"sem regressões em relação ao baseline ({chave})")
+    else:
+        print(f"sem baseline para {chave}; rode com --salvar-baseline")
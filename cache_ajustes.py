@@ -0,0 +1,136 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+import estimacao
+from comum import dir_cache, gravando, hash_codigo
+from estimacao import estimar
+from instrumentacao import etapa
+
+# ==============================
+# Cache de ajustes (estimacao.estimar)
+# Cada especificação ajustada vira .cache/ajustes/<chave>.npz com o que os
+# relatórios e gráficos de diagnóstico usam: params, covariância, erros-
+# padrão, ajustados, resíduos (com o índice do df), n, R² e o F do
+# primeiro estágio. Só arrays numpy (sem pickle), gravados de forma
+# atômica. A chave é o hash das colunas que a especificação usa (valores
+# e índice), da especificação, do tipo de covariância e do código de
+# estimacao.py: regenerar uma tabela ou um gráfico lê do disco, e só o
+# que mudou é reajustado (as que faltam vão juntas para estimar()).
+# ==============================
+DIR_CACHE = dir_cache("ajustes")
+VERSAO_CACHE = 1
+
+
+def _hash_coluna(df, coluna, hashes):
+    # cada coluna (e o índice) é hasheada uma vez por chamada, não uma vez
+    # por especificação que a usa
+    if coluna not in hashes:
+        serie = df.index.to_series() if coluna is None else df[coluna]
+        h = hashlib.sha256(str(serie.dtype).encode())
+        h.update(pd.util.hash_pandas_object(serie, index=False).values.tobytes())
+        hashes[coluna] = h.hexdigest()
+    return hashes[coluna]
+
+
+def chave(df, esp, cov="robusto", cluster=None, hashes=None):
+    """Hash de (colunas usadas e índice, especificação, covariância, código do estimador)."""
+    hashes = {} if hashes is None else hashes
+    colunas = list(dict.fromkeys(estimacao._colunas(esp) + ([cluster] if cluster else [])))
+    h = hashlib.sha256(f"{VERSAO_CACHE}|{hash_codigo(estimacao)}|{tuple(esp)!r}|{cov}|{cluster}".encode())
+    for coluna in [None] + colunas:
+        h.update(f"{coluna}={_hash_coluna(df, coluna, hashes)}".encode())
+    return h.hexdigest()
+
+
+def _caminho(k):
+    return os.path.join(DIR_CACHE, f"{k}.npz")
+
+
+def _indice(index):
+    valores = np.asarray(index)
+    return valores.astype(str) if valores.dtype == object else valores
+
+
+def _gravar(k, r):
+    f_primeiro = r["f_primeiro_estagio"]
+    with gravando(_caminho(k), sufixo=".npz") as tmp:
+        np.savez(
+            tmp,
+            nomes=np.array(r["params"].index, dtype=str),
+            params=r["params"].to_numpy(),
+            cov=r["cov"].to_numpy(),
+            erros_padrao=r["erros_padrao"].to_numpy(),
+            indice=_indice(r["residuos"].index),
+            residuos=r["residuos"].to_numpy(),
+            ajustados=r["ajustados"].to_numpy(),
+            metodo=np.array(r["metodo"]),
+            tipo_cov=np.array(r["tipo_cov"]),
+            n=np.array(r["n"]),
+            gl_resid=np.array(r["gl_resid"]),
+            r2=np.array(r["r2"]),
+            f_nomes=np.array(list(f_primeiro), dtype=str),
+            f_valores=np.array(list(f_primeiro.values()), dtype=float),
+        )
+
+
+def _ler(k, esp):
+    """O mesmo dict de estimar() para a especificação, ou None se não há cache."""
+    try:
+        with np.load(_caminho(k), allow_pickle=False) as z:
+            nomes = z["nomes"].tolist()
+            indice = pd.Index(z["indice"])
+            return {
+                "especificacao": esp,
+                "metodo": str(z["metodo"]),
+                "tipo_cov": str(z["tipo_cov"]),
+                "params": pd.Series(z["params"], index=nomes),
+                "cov": pd.DataFrame(z["cov"], index=nomes, columns=nomes),
+                "erros_padrao": pd.Series(z["erros_padrao"], index=nomes),
+                "residuos": pd.Series(z["residuos"], index=indice),
+                "ajustados": pd.Series(z["ajustados"], index=indice),
+                "n": int(z["n"]),
+                "gl_resid": int(z["gl_resid"]),
+                "r2": float(z["r2"]),
+                "f_primeiro_estagio": dict(zip(z["f_nomes"].tolist(), z["f_valores"].tolist())),
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def faltando(df, especificacoes, cov="robusto", cluster=None):
+    """Nomes das especificações que ajustar() ainda teria de ajustar."""
+    hashes = {}
+    return [esp.nome for esp in especificacoes
+            if not os.path.exists(_caminho(chave(df, esp, esp.cov or cov, cluster, hashes)))]
+
+
+def ajustar(df, especificacoes, cov="robusto", cluster=None, forcar=False):
+    """estimar() com cache em disco: mesmos argumentos, mesmo {nome: resultado}."""
+    hashes = {}
+    chaves = {esp.nome: chave(df, esp, esp.cov or cov, cluster, hashes) for esp in especificacoes}
+    resultados = {}
+    if not forcar:
+        for esp in especificacoes:
+            r = _ler(chaves[esp.nome], esp)
+            if r is not None:
+                resultados[esp.nome] = r
+    novas = [esp for esp in especificacoes if esp.nome not in resultados]
+    if novas:
+        with etapa("modelo/ajustes_novos", linhas_in=len(df)) as e:
+            ajustes = estimar(df, novas, cov=cov, cluster=cluster)
+            e.linhas_out = len(ajustes)
+        for nome, r in ajustes.items():
+            _gravar(chaves[nome], r)
+        resultados.update(ajustes)
+    return {esp.nome: resultados[esp.nome] for esp in especificacoes}
+
+
+def limpar():
+    """Apaga todos os ajustes guardados."""
+    if not os.path.isdir(DIR_CACHE):
+        return
+    for nome in os.listdir(DIR_CACHE):
+        os.remove(os.path.join(DIR_CACHE, nome))
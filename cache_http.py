@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from comum import dir_cache, gravando
+
+# ==============================
+# Config
+# ==============================
+# Os dados das APIs (IPEA, IBGE, SIDRA) mudam no máximo uma vez por ano,
+# então guardamos as respostas em disco e só voltamos à rede quando o
+# TTL expira. Tudo pode ser ajustado por variável de ambiente ou por
+# configurar(). AP2_CACHE_DIR é a pasta de todos os caches do projeto
+# (ajustes, especificações, estado do pipeline); as respostas HTTP ficam
+# na subpasta http/.
+CACHE_DIR = dir_cache("http")
+TTL = float(os.environ.get("AP2_CACHE_TTL", 30 * 24 * 3600))  # 30 dias
+OFFLINE = os.environ.get("AP2_OFFLINE", "0").lower() in ("1", "true", "sim")
+TENTATIVAS = int(os.environ.get("AP2_HTTP_TENTATIVAS", 3))
+
+
+class SemDadosOffline(RuntimeError):
+    """Modo offline ligado e não há cache nem snapshot para a URL."""
+
+
+def configurar(cache_dir=None, ttl=None, offline=None):
+    """Altera a configuração do cache em tempo de execução."""
+    global CACHE_DIR, TTL, OFFLINE
+    if cache_dir is not None:
+        CACHE_DIR = cache_dir
+    if ttl is not None:
+        TTL = float(ttl)
+    if offline is not None:
+        OFFLINE = bool(offline)
+
+
+# ==============================
+# Sessão compartilhada (keep-alive + retry com backoff)
+# ==============================
+_sessao = None
+_trava_sessao = threading.Lock()
+
+
+def sessao():
+    """Sessão HTTP única do processo, reaproveitando conexões entre chamadas."""
+    global _sessao
+    with _trava_sessao:
+        if _sessao is None:
+            retry = Retry(
+                total=TENTATIVAS,
+                backoff_factor=0.5,  # 0.5s, 1s, 2s, ...
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+                respect_retry_after_header=True,
+            )
+            adaptador = HTTPAdapter(max_retries=retry, pool_connections=8, pool_maxsize=8)
+            _sessao = requests.Session()
+            _sessao.mount("https://", adaptador)
+            _sessao.mount("http://", adaptador)
+        return _sessao
+
+
+# ==============================
+# Arquivos do cache (chave = sha256 da URL)
+# ==============================
+def _caminhos(url):
+    chave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return (os.path.join(CACHE_DIR, f"{chave}.json"),
+            os.path.join(CACHE_DIR, f"{chave}.meta.json"))
+
+
+def _ler_meta(caminho_meta):
+    try:
+        with open(caminho_meta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar(caminho, conteudo):
+    with gravando(caminho) as tmp, open(tmp, "wb") as f:
+        f.write(conteudo)
+
+
+def _meta(url, resp):
+    return {
+        "url": url,
+        "salvo_em": time.time(),
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def _salvar(url, corpo, resp):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho_corpo, caminho_meta = _caminhos(url)
+    _gravar(caminho_corpo, corpo)
+    _gravar(caminho_meta, json.dumps(_meta(url, resp)).encode("utf-8"))
+
+
+def _ler_corpo(url):
+    caminho_corpo, _ = _caminhos(url)
+    with open(caminho_corpo, "rb") as f:
+        return json.loads(f.read())
+
+
+# ==============================
+# API pública
+# ==============================
+def em_cache(url, ttl=None):
+    """True se a resposta de `url` está no cache e dentro do TTL (não vai à rede)."""
+    ttl = TTL if ttl is None else ttl
+    caminho_corpo, caminho_meta = _caminhos(url)
+    meta = _ler_meta(caminho_meta)
+    return meta is not None and os.path.exists(caminho_corpo) and time.time() - meta["salvo_em"] < ttl
+
+
+def _resolver(url, timeout, ttl, offline, snapshot, stream=False):
+    """
+    De onde vem o corpo de `url`: ("cache", caminho), ("snapshot", snapshot)
+    ou ("rede", resposta 200 ainda não gravada). Concentra a política comum
+    a get_json e iterar_bytes:
+
+    - cache dentro do TTL: não toca na rede;
+    - cache vencido: GET condicional (ETag / Last-Modified); 304 renova o cache;
+    - falha de rede com cache vencido: usa o cache mesmo assim; sem cache,
+      a exceção sobe;
+    - offline: só cache (mesmo vencido) ou `snapshot()`, uma função que monta
+      o mesmo JSON a partir dos arquivos em data/ (nunca usada online).
+    """
+    ttl = TTL if ttl is None else ttl
+    offline = OFFLINE if offline is None else offline
+
+    caminho_corpo, caminho_meta = _caminhos(url)
+    meta = _ler_meta(caminho_meta)
+    tem_cache = meta is not None and os.path.exists(caminho_corpo)
+
+    if tem_cache and time.time() - meta["salvo_em"] < ttl:
+        return "cache", caminho_corpo
+
+    if offline:
+        if tem_cache:
+            return "cache", caminho_corpo
+        if snapshot is not None:
+            return "snapshot", snapshot
+        raise SemDadosOffline(f"Sem cache nem snapshot para {url}")
+
+    headers = {}
+    if tem_cache and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if tem_cache and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        resp = sessao().get(url, timeout=timeout, headers=headers, stream=stream)
+        if resp.status_code == 304 and tem_cache:
+            resp.close()
+            meta["salvo_em"] = time.time()
+            _gravar(caminho_meta, json.dumps(meta).encode("utf-8"))
+            return "cache", caminho_corpo
+        resp.raise_for_status()
+    except requests.RequestException:
+        # rate limit / fora do ar: melhor dado antigo do que nenhum. O
+        # snapshot não entra aqui: ele só tem GO e trocaria a resposta
+        # nacional sem aviso (é só para o modo offline)
+        if tem_cache:
+            return "cache", caminho_corpo
+        raise
+    return "rede", resp
+
+
+def get_json(url, timeout=60, ttl=None, offline=None, snapshot=None):
+    """Devolve o JSON de `url`, passando pelo cache em disco (ver _resolver)."""
+    origem, valor = _resolver(url, timeout, ttl, offline, snapshot)
+    if origem == "cache":
+        return _ler_corpo(url)
+    if origem == "snapshot":
+        return valor()
+    dados = valor.json()
+    _salvar(url, valor.content, valor)
+    return dados
+
+
+def iterar_bytes(url, timeout=60, ttl=None, offline=None, snapshot=None, tamanho=1 << 16):
+    """
+    Mesmo comportamento de get_json, mas devolve o corpo em pedaços de bytes,
+    sem montar o JSON inteiro na memória. Respostas vindas da rede são
+    gravadas no cache enquanto são lidas.
+    """
+    origem, valor = _resolver(url, timeout, ttl, offline, snapshot, stream=True)
+    if origem == "cache":
+        with open(valor, "rb") as f:
+            while pedaco := f.read(tamanho):
+                yield pedaco
+        return
+    if origem == "snapshot":
+        yield json.dumps(valor()).encode("utf-8")
+        return
+
+    # copia para o cache enquanto entrega os pedaços
+    resp = valor
+    caminho_corpo, caminho_meta = _caminhos(url)
+    # se a cópia falhar (ou o consumidor desistir), o temporário some e o erro sobe
+    with gravando(caminho_corpo) as tmp, resp, open(tmp, "wb") as f:
+        for pedaco in resp.iter_content(chunk_size=tamanho):
+            f.write(pedaco)
+            yield pedaco
+    _gravar(caminho_meta, json.dumps(_meta(url, resp)).encode("utf-8"))
+
+
+def aquecer(url, **kwargs):
+    """Garante a resposta no cache em disco sem interpretar o JSON."""
+    for _ in iterar_bytes(url, **kwargs):
+        pass
+
+
+def executar_varios(tarefas, max_workers=4):
+    """
+    Roda várias buscas ao mesmo tempo (threads + sessão compartilhada).
+
+    `tarefas` é um dict nome -> função sem argumentos. Devolve dois dicts:
+    nome -> resultado e nome -> latência em segundos.
+    """
+    def _um(item):
+        nome, tarefa = item
+        t0 = time.perf_counter()
+        resultado = tarefa()
+        return nome, resultado, time.perf_counter() - t0
+
+    resultados, latencias = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for nome, resultado, segundos in pool.map(_um, tarefas.items()):
+            resultados[nome] = resultado
+            latencias[nome] = segundos
+    return resultados, latencias
+
+
+def get_json_varios(pedidos, max_workers=4, **kwargs):
+    """Atalho de executar_varios para pedidos nome -> (url, snapshot)."""
+    tarefas = {
+        nome: (lambda url=url, snapshot=snapshot: get_json(url, snapshot=snapshot, **kwargs))
+        for nome, (url, snapshot) in pedidos.items()
+    }
+    return executar_varios(tarefas, max_workers=max_workers)
+
+
+def limpar():
+    """Apaga todas as respostas guardadas."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for nome in os.listdir(CACHE_DIR):
+        caminho = os.path.join(CACHE_DIR, nome)
+        if os.path.isfile(caminho):
+            os.remove(caminho)
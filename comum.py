@@ -0,0 +1,54 @@
+import contextlib
+import hashlib
+import inspect
+import os
+import threading
+from functools import lru_cache
+
+import instrumentacao
+
+# ==============================
+# Peças comuns dos caches e pools do projeto
+# - dir_cache: pastas dentro de AP2_CACHE_DIR (padrão .cache), a mesma
+#   raiz para HTTP, ajustes, especificações e o estado do pipeline
+# - hash_codigo: hash do código de um módulo, para invalidar caches
+# - gravando: escrita atômica (temporário + os.replace), para nunca
+#   deixar um arquivo pela metade
+# - iniciar_worker: inicializador dos pools de processos
+# ==============================
+RAIZ_CACHE = os.environ.get("AP2_CACHE_DIR", ".cache")
+
+
+def dir_cache(*partes):
+    """Caminho dentro da pasta de caches (AP2_CACHE_DIR)."""
+    return os.path.join(RAIZ_CACHE, *partes)
+
+
+@lru_cache(maxsize=None)
+def hash_codigo(modulo):
+    """sha256 do código-fonte do módulo (calculado uma vez por processo)."""
+    return hashlib.sha256(inspect.getsource(modulo).encode()).hexdigest()
+
+
+@contextlib.contextmanager
+def gravando(caminho, sufixo=""):
+    """Entrega um caminho temporário; se o bloco terminar bem, ele vira `caminho`.
+
+    Com erro o temporário é apagado (se chegou a existir) e o erro original
+    sobe. sufixo vai no fim do temporário (np.savez exige ".npz").
+    """
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp{sufixo}"
+    try:
+        yield tmp
+        os.replace(tmp, caminho)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def iniciar_worker(estado_instrumentacao):
+    """Inicializador dos pools: mesma instrumentação do pai, sem os registros dele."""
+    instrumentacao.configurar(**estado_instrumentacao)
+    instrumentacao.extrair()  # descarta o que veio do pai no fork
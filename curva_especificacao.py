@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import comum
+import estimacao
+import instrumentacao
+from comum import dir_cache, gravando, hash_codigo
+from estimacao import Especificacao, estimar
+from instrumentacao import etapa
+
+# ==============================
+# Curva de especificação
+# Cruza transformação x instrumentos x controles x amostra, ajusta todas as
+# combinações com estimacao.estimar (um bloco por amostra e transformação,
+# cada bloco num processo do pool) e guarda o resumo de cada uma em
+# .cache/especificacoes/<chave>.json. A chave é o hash dos dados, da
+# especificação e do código de estimacao.py: rodar de novo só ajusta o que
+# é novo. Saídas: resultado_especificacoes.xlsx (uma linha por
+# especificação, como resultado_regressoes_soja.xlsx) e o gráfico da curva
+# em figs/curva_especificacao_<transformacao>.png.
+# ==============================
+DIR_CACHE = dir_cache("especificacoes")
+ARQ_SAIDA = "resultado_especificacoes.xlsx"
+VERSAO_CACHE = 1
+
+# dependente e endógena de cada transformação
+TRANSFORMACOES = {
+    "nivel": ("Qtd_Homicidios", "Gasto_Seguranca"),
+    "log": ("ln_homicidios", "ln_gasto_seg"),
+}
+INSTRUMENTOS = {
+    "icms": ("valor_icms",),
+    "ln_icms": ("ln_valor_icms",),
+    "icms+quad": ("valor_icms", "valor_icms_quadrado"),
+    "ln_icms+quad": ("ln_valor_icms", "ln_valor_icms_quadrado"),
+}
+CONTROLES = {
+    "nenhum": (),
+    "pop": ("População",),
+    "pibpc": ("PIB_per_capita",),
+    "pop+pibpc": ("População", "PIB_per_capita"),
+    "ln_pop": ("ln_pop",),
+    "ln_pibpc": ("ln_pibpc",),
+    "ln_pop+ln_pibpc": ("ln_pop", "ln_pibpc"),
+}
+# filtros de amostra (DataFrame.query); None = todos os municípios
+AMOSTRAS = {
+    "todos": None,
+    "pop_ate_100mil": "`População` <= 100000",
+    "pop_acima_10mil": "`População` > 10000",
+    "com_homicidio": "Qtd_Homicidios > 0",
+}
+DIMENSOES = ["transformacao", "instrumento", "controles", "amostra"]
+
+
+def preparar(df):
+    """Logs de variavel_instrumental + o quadrado do ICMS em nível."""
+    from variavel_instrumental import adicionar_logs
+    df = adicionar_logs(df)
+    df["valor_icms_quadrado"] = df["valor_icms"] ** 2
+    return df
+
+
+def grade(transformacoes=None, instrumentos=None, controles=None, amostras=None):
+    """Todas as combinações, como dicts com as quatro escolhas."""
+    escolhas = [transformacoes or list(TRANSFORMACOES), instrumentos or list(INSTRUMENTOS),
+                controles or list(CONTROLES), amostras or list(AMOSTRAS)]
+    return [dict(zip(DIMENSOES, c)) for c in itertools.product(*escolhas)]
+
+
+def especificacao(item):
+    y, endog = TRANSFORMACOES[item["transformacao"]]
+    nome = "|".join(item[d] for d in DIMENSOES)
+    return Especificacao(nome, y, CONTROLES[item["controles"]], (endog,),
+                         INSTRUMENTOS[item["instrumento"]])
+
+
+def hash_dados(df):
+    h = hashlib.sha256(f"{list(df.columns)}:{list(map(str, df.dtypes))}".encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def chave(hash_df, item):
+    """Hash de (dados, especificação, filtro de amostra, código do estimador)."""
+    esp = especificacao(item)
+    texto = f"{VERSAO_CACHE}|{hash_codigo(estimacao)}|{hash_df}|{tuple(esp)!r}|{AMOSTRAS[item['amostra']]!r}"
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _ler_cache(k):
+    try:
+        with open(os.path.join(DIR_CACHE, f"{k}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_cache(k, linha):
+    with gravando(os.path.join(DIR_CACHE, f"{k}.json")) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(linha, f)
+
+
+def _linha(item, r):
+    """Resumo de um ajuste no formato da planilha."""
+    from scipy import stats
+
+    endog = r["especificacao"].endog[0]
+    beta, ep = r["params"][endog], r["erros_padrao"][endog]
+    z = beta / ep
+    return {
+        **item,
+        "Alpha": float(r["params"].get(estimacao.CONSTANTE, np.nan)),
+        "Beta": float(beta),
+        "erro_padrao": float(ep),
+        "IC_inf": float(beta - 1.96 * ep),
+        "IC_sup": float(beta + 1.96 * ep),
+        "p_value": float(2 * stats.norm.sf(abs(z))),  # erros robustos: normal, como linearmodels
+        "z": float(z),
+        "R2": float(r["r2"]),
+        "F_primeiro_estagio": float(r["f_primeiro_estagio"][endog]),
+        "n_obs": int(r["n"]),
+    }
+
+
+def ajustar_bloco(df, itens):
+    """Ajusta em lote especificações da mesma amostra."""
+    amostra = AMOSTRAS[itens[0]["amostra"]]
+    sub = df if amostra is None else df.query(amostra)
+    with etapa(f"especificacoes/{itens[0]['amostra']}", linhas_in=len(sub)) as e:
+        resultados = estimar(sub, [especificacao(i) for i in itens])
+        e.linhas_out = len(itens)
+    return [_linha(i, resultados["|".join(i[d] for d in DIMENSOES)]) for i in itens]
+
+
+_DF_WORKER = None
+
+
+def _iniciar_worker(df, estado_instrumentacao):
+    global _DF_WORKER
+    _DF_WORKER = df
+    comum.iniciar_worker(estado_instrumentacao)
+
+
+def _ajustar_no_worker(itens):
+    return ajustar_bloco(_DF_WORKER, itens), instrumentacao.extrair()
+
+
+def rodar(df, itens=None, paralelo=True, max_workers=None, forcar=False):
+    """Ajusta a grade (com cache) e devolve (tabela, quantos foram ajustados)."""
+    df = preparar(df)
+    itens = grade() if itens is None else itens
+    hash_df = hash_dados(df)
+
+    chaves = [chave(hash_df, item) for item in itens]
+    linhas, pendentes = {}, {}
+    for k, item in zip(chaves, itens):
+        linha = None if forcar else _ler_cache(k)
+        if linha is not None:
+            linhas[k] = linha
+        else:
+            # um bloco por (amostra, transformação): mesma amostra, ajuste em lote
+            pendentes.setdefault((item["amostra"], item["transformacao"]), []).append((k, item))
+
+    blocos = list(pendentes.values())
+    if paralelo and len(blocos) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_iniciar_worker,
+                                 initargs=(df, instrumentacao.estado())) as pool:
+            futuros = [pool.submit(_ajustar_no_worker, [i for _, i in b]) for b in blocos]
+            saidas = []
+            for futuro in futuros:
+                resultado, registros = futuro.result()
+                instrumentacao.adicionar(registros)
+                saidas.append(resultado)
+    else:
+        saidas = [ajustar_bloco(df, [i for _, i in b]) for b in blocos]
+
+    for bloco, resultado in zip(blocos, saidas):
+        for (k, _), linha in zip(bloco, resultado):
+            _gravar_cache(k, linha)
+            linhas[k] = linha
+
+    tabela = pd.DataFrame([linhas[k] for k in chaves])
+    return tabela, sum(len(b) for b in blocos)
+
+
+def grafico(tabela, transformacao):
+    """Curva: Beta ordenado com IC 95% em cima, escolhas de cada ponto embaixo."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    t = (tabela[tabela["transformacao"] == transformacao]
+         .sort_values("Beta").reset_index(drop=True))
+    x = np.arange(len(t))
+    dims = [d for d in DIMENSOES if d != "transformacao"]
+    ordem = {"instrumento": INSTRUMENTOS, "controles": CONTROLES, "amostra": AMOSTRAS}
+    opcoes = [(d, o) for d in dims for o in ordem[d] if (t[d] == o).any()]
+
+    fig, (ax, ax_esc) = plt.subplots(2, 1, figsize=(max(8, len(t) * 0.08), 3 + 0.25 * len(opcoes)),
+                                     sharex=True, gridspec_kw={"height_ratios": [2, 1 + 0.1 * len(opcoes)]})
+    cores = np.where(t["p_value"] < 0.05, "tab:blue", "tab:gray")
+    ax.vlines(x, t["IC_inf"], t["IC_sup"], colors=cores, alpha=0.4, linewidth=1)
+    ax.scatter(x, t["Beta"], c=cores, s=10, zorder=3)
+    ax.axhline(0, color="red", linestyle="--", linewidth=1)
+    # instrumentos fracos dão ICs enormes; corta o eixo nos percentis 5-95
+    inf, sup = np.nanpercentile(t["IC_inf"], 5), np.nanpercentile(t["IC_sup"], 95)
+    folga = 0.1 * (sup - inf)
+    ax.set_ylim(min(inf, t["Beta"].min(), 0) - folga, max(sup, 0) + folga)
+    ax.set_ylabel(f"Coef. de {TRANSFORMACOES[transformacao][1]}")
+    ax.set_title(f"Curva de especificação ({transformacao}) – azul: p < 0,05")
+
+    for j, (d, o) in enumerate(opcoes):
+        usados = x[(t[d] == o).to_numpy()]
+        ax_esc.scatter(usados, np.full(len(usados), j), marker="|", s=40, color="black")
+    ax_esc.set_yticks(range(len(opcoes)))
+    ax_esc.set_yticklabels([f"{d}: {o}" for d, o in opcoes], fontsize=7)
+    ax_esc.invert_yaxis()
+    ax_esc.set_xlabel("Especificações (ordenadas pelo coeficiente)")
+    fig.tight_layout()
+    return fig
+
+
+def salvar(tabela, destino=ARQ_SAIDA, pasta_figs="figs"):
+    import matplotlib.pyplot as plt
+
+    tabela.to_excel(destino, index=False)
+    os.makedirs(pasta_figs, exist_ok=True)
+    figuras = []
+    for transformacao in tabela["transformacao"].unique():
+        fig = grafico(tabela, transformacao)
+        figuras.append(os.path.join(pasta_figs, f"curva_especificacao_{transformacao}.png"))
+        fig.savefig(figuras[-1], dpi=220, bbox_inches="tight")
+        plt.close(fig)
+    return figuras
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Curva de especificação do modelo IV.")
+    parser.add_argument("--sequencial", action="store_true", help="sem pool de processos")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--forcar", action="store_true", help="ignora o cache e reajusta tudo")
+    parser.add_argument("--saida", default=ARQ_SAIDA)
+    args = parser.parse_args()
+
+    from variavel_instrumental import carregar_dados
+    tabela, ajustadas = rodar(carregar_dados(), paralelo=not args.sequencial,
+                              max_workers=args.workers, forcar=args.forcar)
+    figuras = salvar(tabela, args.saida)
+    print(f"{ajustadas}/{len(tabela)} especificações ajustadas (resto do cache)")
+    print(f"✅ Tabela em {args.saida}; curvas em {', '.join(figuras)}")
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Esquema compacto dos frames
+# Códigos IBGE viram int32 (em vez de string com zfill(7)), textos que se
+# repetem (nome do município, UF, conta do FINBRA) viram category e as
+# colunas numéricas descem para o menor tipo que guarda os mesmos
+# valores. É aplicado na ingestão (apis.py), então as junções e os
+# groupbys já rodam em chaves inteiras. Cada frame compactado com nome
+# entra no relatório de memória (relatorio()).
+# ==============================
+CHAVES_IBGE = ("cod", "Cod.IBGE", "codigo_municipio", "Codigo IBGE")
+CATEGORICAS = ("sigla", "Municipio", "municipio", "UF", "Instituição", "Coluna", "Conta",
+               "Identificador da Conta")
+# só vira category se os valores distintos forem até essa fração das linhas
+FRACAO_CATEGORIA = 0.5
+
+_medidas = []
+
+
+def codigo_ibge(serie):
+    """'5200050', 5200050 ou 5200050.0 -> int32."""
+    if not pd.api.types.is_numeric_dtype(serie):
+        serie = pd.to_numeric(serie.astype(str).str.strip(), errors="raise")
+    return serie.astype("int32")
+
+
+def _reduzir_float(serie):
+    # float32 só quando a ida e volta não muda nenhum valor (dinheiro com
+    # centavos em bilhões não cabe, contagens cabem)
+    reduzida = serie.astype("float32")
+    if np.array_equal(reduzida.to_numpy(dtype="float64"), serie.to_numpy(), equal_nan=True):
+        return reduzida
+    return serie
+
+
+def _textual(serie):
+    # no pandas 3 texto tem o dtype str, não mais object
+    return pd.api.types.is_string_dtype(serie) or serie.dtype == object
+
+
+def compactar(df, nome=None, chaves=CHAVES_IBGE, categoricas=CATEGORICAS):
+    """Devolve uma cópia com tipos compactos; com nome, registra a economia."""
+    antes = df.memory_usage(deep=True).sum()
+    df = df.copy()
+    for col in df.columns:
+        serie = df[col]
+        if col in chaves:
+            df[col] = codigo_ibge(serie)
+        elif col in categoricas or (_textual(serie) and serie.nunique() <= FRACAO_CATEGORIA * len(serie)):
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                df[col] = serie.astype("category")
+        elif pd.api.types.is_bool_dtype(serie) or not pd.api.types.is_numeric_dtype(serie):
+            continue
+        elif pd.api.types.is_integer_dtype(serie):
+            df[col] = pd.to_numeric(serie, downcast="integer")
+        elif pd.api.types.is_float_dtype(serie):
+            df[col] = _reduzir_float(serie)
+    if nome is not None:
+        depois = df.memory_usage(deep=True).sum()
+        _medidas.append({"frame": nome, "linhas": len(df), "antes_mb": antes / 2**20,
+                         "depois_mb": depois / 2**20, "economia_mb": (antes - depois) / 2**20})
+    return df
+
+
+def relatorio():
+    """Memória de cada frame compactado (MB) e economia em relação ao original."""
+    df = pd.DataFrame(_medidas, columns=["frame", "linhas", "antes_mb", "depois_mb", "economia_mb"])
+    df["economia_pct"] = (100 * df["economia_mb"] / df["antes_mb"]).round(1)
+    return df
@@ -0,0 +1,224 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Estimação em lote (MQO e 2SLS)
+# Recebe uma lista de especificações sobre o mesmo df, monta a matriz com
+# todas as variáveis usadas uma única vez, calcula os produtos cruzados
+# (M'M) uma vez por amostra e resolve cada sistema a partir deles. O que
+# depende de n (resíduos e "meat" dos erros robustos) é feito de uma vez
+# para todas as especificações. Resultados batem com statsmodels OLS
+# (cov="classico") e linearmodels IV2SLS(...).fit(cov_type="robust")
+# (cov="robusto", HC0) ou cov_type="clustered" (cov="cluster", sem ajuste
+# de graus de liberdade, como o padrão do linearmodels).
+# ==============================
+CONSTANTE = "const"
+
+Especificacao = namedtuple(
+    "Especificacao",
+    ["nome", "y", "exog", "endog", "instrumentos", "constante", "cov"],
+    defaults=((), (), (), True, None),
+)
+Especificacao.__doc__ = """Uma regressão: sem endógenas é MQO; com endógenas, 2SLS.
+cov=None usa o tipo de covariância passado a estimar()."""
+
+
+def _colunas(esp):
+    return [esp.y, *esp.exog, *esp.endog, *esp.instrumentos]
+
+
+def _nomes_exog(esp):
+    return ([CONSTANTE] if esp.constante else []) + list(esp.exog)
+
+
+def _matriz(df, variaveis):
+    """Matriz n x p padronizada (desvio-padrão 1) + escala de cada coluna."""
+    M = df[variaveis].to_numpy(dtype=float)
+    escala = M.std(axis=0)
+    escala[escala == 0] = 1.0  # constante
+    return M / escala, escala
+
+
+def _somas_por_cluster(scores, ordem, inicios):
+    """Soma as linhas de scores (n x k) dentro de cada cluster."""
+    return np.add.reduceat(scores[ordem], inicios, axis=0)
+
+
+def _resolver_grupo(df, especificacoes, cov_padrao, cluster=None):
+    """Resolve especificações que compartilham a mesma amostra."""
+    variaveis = list(dict.fromkeys(v for esp in especificacoes for v in _colunas(esp)))
+    if cluster is not None:
+        # ordena uma vez; cada cluster vira um trecho contíguo
+        codigos = pd.factorize(df[cluster])[0]
+        ordem = np.argsort(codigos, kind="stable")
+        inicios = np.flatnonzero(np.r_[True, np.diff(codigos[ordem]) != 0])
+    df = df.assign(**{CONSTANTE: 1.0})
+    variaveis = [CONSTANTE] + variaveis
+    M, escala = _matriz(df, variaveis)
+    pos = {v: i for i, v in enumerate(variaveis)}
+    n, p = M.shape
+    G = M.T @ M  # produtos cruzados: uma vez para o grupo todo
+
+    # 1) coeficientes: só álgebra k x k em cima de G
+    sistemas = []
+    combinacoes = []  # colunas de C: resíduo = M @ c
+    for esp in especificacoes:
+        ix = [pos[v] for v in _nomes_exog(esp) + list(esp.endog)]
+        iw = [pos[v] for v in _nomes_exog(esp) + list(esp.instrumentos)]
+        iy = pos[esp.y]
+        if esp.endog:
+            # primeiro estágio de todas as endógenas: A = (W'W)^-1 W'X
+            A = np.linalg.solve(G[np.ix_(iw, iw)], G[np.ix_(iw, ix)])
+            XhX = G[np.ix_(ix, iw)] @ A
+            beta = np.linalg.solve(XhX, A.T @ G[iw, iy])
+        else:
+            A = None
+            XhX = G[np.ix_(ix, ix)]
+            beta = np.linalg.solve(XhX, G[ix, iy])
+
+        c = np.zeros(p)
+        c[iy] = 1.0
+        c[ix] -= beta
+        combinacoes.append(c)
+
+        # regressor projetado = M @ h (no MQO, o próprio X)
+        h = np.zeros((p, len(ix)))
+        if A is None:
+            h[ix, np.arange(len(ix))] = 1.0
+        else:
+            h[iw, :] = A
+
+        # resíduos do primeiro estágio de cada endógena (para o F)
+        primeiro = []
+        for j, v in enumerate(esp.endog):
+            u = np.zeros(p)
+            u[pos[v]] = 1.0
+            u[iw] -= A[:, len(_nomes_exog(esp)) + j]
+            combinacoes.append(u)
+            primeiro.append(len(combinacoes) - 1)
+        sistemas.append((esp, ix, iw, iy, A, XhX, beta, h, len(combinacoes) - 1 - len(primeiro), primeiro))
+
+    # 2) tudo o que depende de n, de uma vez: resíduos e M' diag(e²) M
+    E = M @ np.column_stack(combinacoes)
+    if all((esp.cov or cov_padrao) in ("classico", "cluster") for esp in especificacoes):
+        S = None
+    else:
+        S = np.einsum("ni,nk,nj->kij", M, E ** 2, M, optimize=True)
+
+    resultados = {}
+    for esp, ix, iw, iy, A, XhX, beta, h, k_res, primeiro in sistemas:
+        cov = esp.cov or cov_padrao
+        k = len(ix)
+        e = E[:, k_res]
+        pao = np.linalg.inv(XhX)
+        if cov == "classico":
+            s2 = e @ e / (n - k)
+            V = s2 * pao
+        elif cov == "cluster":
+            g = _somas_por_cluster((M @ h) * e[:, None], ordem, inicios)
+            V = pao @ (g.T @ g) @ pao
+        else:
+            V = pao @ (h.T @ S[k_res] @ h) @ pao
+            if cov == "hc1":
+                V *= n / (n - k)
+
+        # volta para a escala original: beta_j * escala_y / escala_j
+        fator = escala[iy] / escala[ix]
+        nomes = _nomes_exog(esp) + list(esp.endog)
+        params = pd.Series(beta * fator, index=nomes)
+        cov_ = pd.DataFrame(V * np.outer(fator, fator), index=nomes, columns=nomes)
+
+        y = M[:, iy]
+        tss = ((y - y.mean()) ** 2).sum() if esp.constante else (y ** 2).sum()
+        f_primeiro = {}
+        if A is not None:
+            # Wald dos instrumentos excluídos na regressão de primeiro estágio,
+            # como linearmodels (first_stage.diagnostics["f.stat"])
+            k_exog = len(_nomes_exog(esp))
+            iz = slice(k_exog, len(iw))
+            Gww_inv = np.linalg.inv(G[np.ix_(iw, iw)])
+            for j, (v, k_u) in enumerate(zip(esp.endog, primeiro)):
+                a = A[iz, k_exog + j]
+                u = E[:, k_u]
+                if cov == "classico":
+                    Vw = (u @ u / (n - len(iw))) * Gww_inv
+                elif cov == "cluster":
+                    g = _somas_por_cluster(M[:, iw] * u[:, None], ordem, inicios)
+                    Vw = Gww_inv @ (g.T @ g) @ Gww_inv
+                else:
+                    Vw = Gww_inv @ S[k_u][np.ix_(iw, iw)] @ Gww_inv
+                    if cov == "hc1":
+                        Vw *= n / (n - len(iw))
+                wald = float(a @ np.linalg.solve(Vw[iz, iz], a))
+                f_primeiro[v] = wald / len(a) if cov == "classico" else wald
+
+        resultados[esp.nome] = {
+            "especificacao": esp,
+            "metodo": "2SLS" if esp.endog else "MQO",
+            "tipo_cov": cov,
+            "params": params,
+            "cov": cov_,
+            "erros_padrao": pd.Series(np.sqrt(np.diag(cov_.to_numpy())), index=nomes),
+            "residuos": pd.Series(e * escala[iy], index=df.index),
+            "ajustados": pd.Series((y - e) * escala[iy], index=df.index),
+            "n": n,
+            "gl_resid": n - k,
+            "r2": 1 - (e @ e) / tss,
+            "f_primeiro_estagio": f_primeiro,
+        }
+    return resultados
+
+
+def estimar(df, especificacoes, cov="robusto", cluster=None):
+    """Ajusta todas as especificações e devolve {nome: resultado}.
+
+    cov: "robusto" (HC0, igual ao linearmodels "robust"), "hc1",
+    "classico" (homocedástico com n - k, igual ao statsmodels OLS) ou
+    "cluster" (agrupado pela coluna `cluster` do df).
+    Cada especificação usa as linhas sem NaN nas suas colunas; as que
+    caem na mesma amostra são resolvidas juntas.
+    """
+    for tipo in {cov, *(esp.cov for esp in especificacoes if esp.cov)}:
+        if tipo not in ("robusto", "hc1", "classico", "cluster"):
+            raise ValueError(f"cov desconhecida: {tipo}")
+        if tipo == "cluster" and cluster is None:
+            raise ValueError("cov='cluster' precisa da coluna em cluster=")
+    grupos = {}
+    for esp in especificacoes:
+        mascara = df[_colunas(esp)].notna().all(axis=1).to_numpy()
+        grupos.setdefault(mascara.tobytes(), (mascara, []))[1].append(esp)
+
+    resultados = {}
+    for mascara, lista in grupos.values():
+        resultados.update(_resolver_grupo(df[mascara], lista, cov, cluster))
+    return {esp.nome: resultados[esp.nome] for esp in especificacoes}
+
+
+def tabela(resultados):
+    """Tabela arrumada: uma linha por (especificação, variável)."""
+    from scipy import stats  # só aqui: scipy.stats leva ~1 s para importar
+
+    linhas = []
+    for nome, r in resultados.items():
+        t = r["params"] / r["erros_padrao"]
+        # statsmodels usa t de Student no MQO clássico; linearmodels, normal
+        if r["tipo_cov"] == "classico":
+            p = 2 * stats.t.sf(np.abs(t), r["gl_resid"])
+        else:
+            p = 2 * stats.norm.sf(np.abs(t))
+        for i, variavel in enumerate(r["params"].index):
+            linhas.append({
+                "especificacao": nome,
+                "metodo": r["metodo"],
+                "variavel": variavel,
+                "coef": r["params"].iloc[i],
+                "erro_padrao": r["erros_padrao"].iloc[i],
+                "estatistica_t": t.iloc[i],
+                "p_valor": p[i],
+                "n": r["n"],
+                "r2": r["r2"],
+                "f_primeiro_estagio": r["f_primeiro_estagio"].get(variavel, np.nan),
+            })
+    return pd.DataFrame(linhas)
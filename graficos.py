@@ -1,221 +1,450 @@
+import argparse
+import hashlib
+import inspect
+import json
 import os
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from apis import df_go, df_final, df_uf_2023, df_mun_go_2023
+import pandas as pd
+
+import apis
+import instrumentacao
+from comum import gravando, iniciar_worker
+from instrumentacao import etapa
+
+# ==============================
+# Config
+# ==============================
+# Cada gráfico é uma função independente que recebe só os frames de que
+# precisa e devolve a figura. gerar() manda cada um para um processo do
+# pool, que salva o PNG e uma página PDF própria; no fim as páginas são
+# juntadas no PDF do relatório, sempre na ordem de GRAFICOS.
+# Cada gráfico tem uma chave (hash dos frames de entrada, dos parâmetros e
+# do código da função) guardada em figs/_manifesto.json: se a chave não
+# mudou e os arquivos existem, o gráfico não é redesenhado.
+DPI = 220
+VERSAO_CACHE = 1
+NOMES_UF = {"GO": "Goiás"}
+# Acima de LIMITE_PONTOS linhas, g05 e g07 desenham bins (np.histogram /
+# np.histogram2d) em vez de um marcador por município: o tempo de render e
+# o tamanho do arquivo ficam constantes com o n. AP2_LIMITE_PONTOS muda o limite.
+LIMITE_PONTOS = int(os.environ.get("AP2_LIMITE_PONTOS", 5000))
+BINS_HIST = 60           # barras do histograma agregado
+BINS_2D = 80             # células por eixo na dispersão agregada
+FAIXAS_TENDENCIA = 20    # faixas (quantis de x) da média móvel por faixa
+SOMBREAR_DENSIDADE = True  # cor = nº de pontos na célula (log); False = só ocupação
+
+# matplotlib (e seaborn, em g09/g10) só carrega quando algum gráfico é
+# desenhado: com tudo em cache, gerar() nem importa o pyplot.
+plt = None
+
+
+def _pyplot():
+    global plt
+    if plt is None:
+        import matplotlib
+        matplotlib.use("Agg")  # só salvamos arquivos; também é o backend dos workers
+        import matplotlib.pyplot
+        plt = matplotlib.pyplot
+    return plt
 
-# pasta de saída
-os.makedirs("figs", exist_ok=True)
-pdf = PdfPages("figs/graficos_seguranca_go.pdf")
 
 # ===== 0) Preparos rápidos =====
-# df_go: série histórica de GO
-df_go = df_go.copy()
-df_go["periodo"] = pd.to_datetime(df_go["periodo"], errors="coerce")
-df_go = df_go.sort_values("periodo")
-df_go["valor"] = pd.to_numeric(df_go["valor"], errors="coerce")
-if "media_movel_3a" not in df_go.columns:
-    df_go["media_movel_3a"] = df_go["valor"].rolling(3).mean()
-if "taxa_var" not in df_go.columns:
-    df_go["taxa_var"] = df_go["valor"].pct_change()*100
-
-# df_uf_2023: homicídios por UF (2023)
-df_uf_2023 = df_uf_2023.copy()
-df_uf_2023["valor"] = pd.to_numeric(df_uf_2023["valor"], errors="coerce")
-df_uf_2023_ord = df_uf_2023.sort_values("valor", ascending=False).reset_index(drop=True)
-
-# df_mun_go_2023: homicídios por município de GO (2023)
-df_mun_go_2023 = df_mun_go_2023.copy()
-# na sua tabela o nome é Qtd_Homicidios
-df_mun_go_2023["Qtd_Homicidios"] = pd.to_numeric(df_mun_go_2023["Qtd_Homicidios"], errors="coerce").fillna(0)
-
-# df_final: dataset enriquecido
-df_final = df_final.copy()
-df_final["Gasto_pc"] = df_final["Gasto_Seguranca"] / df_final["População"]
-df_final["Taxa_1000hab"] = pd.to_numeric(df_final["taxa/1000hab"], errors="coerce")
-df_final["Qtd_Homicidios"] = pd.to_numeric(df_final["Qtd_Homicidios"], errors="coerce")
-df_final["PIB_per_capita"] = pd.to_numeric(df_final["PIB_per_capita"], errors="coerce")
-df_final["Gasto_pc"] = pd.to_numeric(df_final["Gasto_pc"], errors="coerce")
-
-# ==============================================
-# 1) Série temporal GO + média móvel
-# ==============================================
-fig = plt.figure(figsize=(10,4.2))
-x = df_go["periodo"].dt.year
-plt.plot(x, df_go["valor"], label="Homicídios (GO)")
-plt.plot(x, df_go["media_movel_3a"], label="Média móvel (3 anos)")
-plt.title("Homicídios em Goiás (série histórica)")
-plt.xlabel("Ano")
-plt.ylabel("Quantidade")
-plt.grid(True, alpha=0.3)
-plt.legend()
-fig.tight_layout()
-fig.savefig("figs/01_serie_historica_go.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
-
-# ==============================================
-# 2) Variação % ano a ano (GO)
-# ==============================================
-fig = plt.figure(figsize=(10,4.2))
-plt.bar(x, df_go["taxa_var"])
-plt.axhline(0, linewidth=1)
-plt.title("Variação percentual anual de homicídios – GO")
-plt.xlabel("Ano")
-plt.ylabel("% vs. ano anterior")
-plt.grid(True, axis="y", alpha=0.3)
-fig.tight_layout()
-fig.savefig("figs/02_variacao_yoy_go.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
-
-# ==============================================
-# 3) Estados em 2023 (ordenado) e destaque para GO
-# ==============================================
-pos_go = df_uf_2023_ord.index[df_uf_2023_ord["sigla"].eq("GO")][0] + 1
-titulo = f"Homicídios por UF em 2023 (ordem decrescente) — GO na posição {pos_go}"
-fig = plt.figure(figsize=(10,5))
-plt.bar(df_uf_2023_ord["sigla"], df_uf_2023_ord["valor"])
-plt.title(titulo)
-plt.xlabel("UF")
-plt.ylabel("Homicídios (2023)")
-plt.grid(True, axis="y", alpha=0.3)
-fig.tight_layout()
-fig.savefig("figs/03_ufs_2023.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
-
-# ==============================================
-# 4) Top 10 municípios de GO (2023) por número absoluto
-# ==============================================
-top10_abs = df_mun_go_2023.sort_values("Qtd_Homicidios", ascending=False).head(10)
-fig = plt.figure(figsize=(10,5))
-plt.barh(top10_abs["Municipio"], top10_abs["Qtd_Homicidios"])
-plt.gca().invert_yaxis()
-plt.title("Top 10 municípios de GO por homicídios absolutos — 2023")
-plt.xlabel("Homicídios (2023)")
-plt.ylabel("Município")
-plt.grid(True, axis="x", alpha=0.3)
-fig.tight_layout()
-fig.savefig("figs/04_top10_abs.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
-
-# ==============================================
-# 5) Distribuição (histograma) homicídios municípios GO (2023)
-# ==============================================
-fig = plt.figure(figsize=(10,4.2))
-vals = df_mun_go_2023["Qtd_Homicidios"].dropna()
-bins = max(8, int(np.sqrt(len(vals))))
-plt.hist(vals, bins=bins)
-plt.title("Distribuição de homicídios por município – GO (2023)")
-plt.xlabel("Homicídios no ano")
-plt.ylabel("Número de municípios")
-plt.grid(True, alpha=0.3)
-fig.tight_layout()
-fig.savefig("figs/05_hist_municipios_2023.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
+def preparar(uf=apis.UF_PADRAO, ano=apis.ANO_PADRAO):
+    return montar_dados(uf, ano, apis.carregar_df_go(uf), apis.carregar_df_uf_2023(ano),
+                        apis.carregar_df_mun_go_2023(uf, ano), apis.carregar_df_final(uf, ano))
+
+
+def montar_dados(uf, ano, df_go, df_uf_2023, df_mun_go_2023, df_final):
+    """Ajusta tipos e colunas derivadas dos frames usados pelos gráficos."""
+    # df_go: série histórica da UF (taxa_var e media_movel_3a vêm do cubo de agregados.py)
+    df_go = df_go.copy()
+    df_go["periodo"] = pd.to_datetime(df_go["periodo"], errors="coerce")
+    df_go = df_go.sort_values("periodo")
+    df_go["valor"] = pd.to_numeric(df_go["valor"], errors="coerce")
+
+    # df_uf_2023: homicídios por UF no ano
+    df_uf_2023 = df_uf_2023.copy()
+    df_uf_2023["valor"] = pd.to_numeric(df_uf_2023["valor"], errors="coerce")
+    df_uf_2023_ord = df_uf_2023.sort_values("valor", ascending=False).reset_index(drop=True)
+
+    # df_mun_go_2023: homicídios por município da UF no ano
+    df_mun_go_2023 = df_mun_go_2023.copy()
+    # na sua tabela o nome é Qtd_Homicidios
+    df_mun_go_2023["Qtd_Homicidios"] = pd.to_numeric(df_mun_go_2023["Qtd_Homicidios"], errors="coerce").fillna(0)
+
+    # df_final: dataset enriquecido
+    df_final = df_final.copy()
+    df_final["Gasto_pc"] = pd.to_numeric(df_final["Gasto_Seguranca"] / df_final["População"], errors="coerce")
+    df_final["Taxa_1000hab"] = pd.to_numeric(df_final["taxa/1000hab"], errors="coerce")
+    df_final["Qtd_Homicidios"] = pd.to_numeric(df_final["Qtd_Homicidios"], errors="coerce")
+    df_final["PIB_per_capita"] = pd.to_numeric(df_final["PIB_per_capita"], errors="coerce")
+
+    vars_modelo = ["Qtd_Homicidios", "Gasto_Seguranca", "valor_icms", "População", "PIB_per_capita"]
+
+    return {
+        "uf": uf,
+        "nome_uf": NOMES_UF.get(uf, uf),
+        "ano": ano,
+        "df_go": df_go,
+        "df_uf_2023_ord": df_uf_2023_ord,
+        "df_mun_go_2023": df_mun_go_2023,
+        "df_final": df_final,
+        "df_modelo": df_final[vars_modelo].copy(),
+        # opções de g05/g07: vão no recorte para entrarem na chave do cache
+        "limite_pontos": LIMITE_PONTOS,
+        "bins_hist": BINS_HIST,
+        "bins_2d": BINS_2D,
+        "faixas_tendencia": FAIXAS_TENDENCIA,
+        "sombrear_densidade": SOMBREAR_DENSIDADE,
+    }
+
+
+# ==============================================
+# 1) Série temporal + média móvel
+# ==============================================
+def g01_serie_historica(d):
+    df_go = d["df_go"]
+    fig = plt.figure(figsize=(10,4.2))
+    x = df_go["periodo"].dt.year
+    plt.plot(x, df_go["valor"], label=f"Homicídios ({d['uf']})")
+    plt.plot(x, df_go["media_movel_3a"], label="Média móvel (3 anos)")
+    plt.title(f"Homicídios em {d['nome_uf']} (série histórica)")
+    plt.xlabel("Ano")
+    plt.ylabel("Quantidade")
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+    return fig
+
+
+# ==============================================
+# 2) Variação % ano a ano
+# ==============================================
+def g02_variacao_yoy(d):
+    df_go = d["df_go"]
+    fig = plt.figure(figsize=(10,4.2))
+    plt.bar(df_go["periodo"].dt.year, df_go["taxa_var"])
+    plt.axhline(0, linewidth=1)
+    plt.title(f"Variação percentual anual de homicídios – {d['uf']}")
+    plt.xlabel("Ano")
+    plt.ylabel("% vs. ano anterior")
+    plt.grid(True, axis="y", alpha=0.3)
+    return fig
+
+
+# ==============================================
+# 3) Estados no ano (ordenado) e destaque para a UF
+# ==============================================
+def g03_ufs(d):
+    df_uf_2023_ord = d["df_uf_2023_ord"]
+    pos_go = df_uf_2023_ord.index[df_uf_2023_ord["sigla"].eq(d["uf"])][0] + 1
+    titulo = f"Homicídios por UF em {d['ano']} (ordem decrescente) — {d['uf']} na posição {pos_go}"
+    fig = plt.figure(figsize=(10,5))
+    plt.bar(df_uf_2023_ord["sigla"], df_uf_2023_ord["valor"])
+    plt.title(titulo)
+    plt.xlabel("UF")
+    plt.ylabel(f"Homicídios ({d['ano']})")
+    plt.grid(True, axis="y", alpha=0.3)
+    return fig
+
+
+# ==============================================
+# 4) Top 10 municípios por número absoluto
+# ==============================================
+def g04_top10_abs(d):
+    top10_abs = d["df_mun_go_2023"].sort_values("Qtd_Homicidios", ascending=False).head(10)
+    fig = plt.figure(figsize=(10,5))
+    plt.barh(top10_abs["Municipio"].astype(str), top10_abs["Qtd_Homicidios"])
+    plt.gca().invert_yaxis()
+    plt.title(f"Top 10 municípios de {d['uf']} por homicídios absolutos — {d['ano']}")
+    plt.xlabel(f"Homicídios ({d['ano']})")
+    plt.ylabel("Município")
+    plt.grid(True, axis="x", alpha=0.3)
+    return fig
+
+
+# ==============================================
+# 5) Distribuição (histograma) homicídios por município
+# ==============================================
+def g05_hist_municipios(d):
+    fig = plt.figure(figsize=(10,4.2))
+    vals = d["df_mun_go_2023"]["Qtd_Homicidios"].dropna()
+    if len(vals) > d["limite_pontos"]:
+        # contagens prontas e um único artista (stairs), em vez de sqrt(n) retângulos
+        contagens, bordas = np.histogram(vals.to_numpy(dtype=float), bins=d["bins_hist"])
+        plt.stairs(contagens, bordas, fill=True)
+    else:
+        bins = max(8, int(np.sqrt(len(vals))))
+        plt.hist(vals, bins=bins)
+    plt.title(f"Distribuição de homicídios por município – {d['uf']} ({d['ano']})")
+    plt.xlabel("Homicídios no ano")
+    plt.ylabel("Número de municípios")
+    plt.grid(True, alpha=0.3)
+    return fig
+
 
 # ==============================================
 # 6) Maiores taxas por 1.000 hab (Top 10)
 # ==============================================
-top10_taxa = df_final.sort_values("Taxa_1000hab", ascending=False).head(10)
-labels = top10_taxa["Municipio"].str.replace(" - GO","", regex=False)
-fig = plt.figure(figsize=(10,5))
-plt.barh(labels, top10_taxa["Taxa_1000hab"])
-plt.gca().invert_yaxis()
-plt.title("Top 10 maiores taxas de homicídios (por 1.000 hab) — 2023")
-plt.xlabel("Taxa por 1.000 habitantes")
-plt.ylabel("Município")
-plt.grid(True, axis="x", alpha=0.3)
-fig.tight_layout()
-fig.savefig("figs/06_top10_taxa.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
+def g06_top10_taxa(d):
+    top10_taxa = d["df_final"].sort_values("Taxa_1000hab", ascending=False).head(10)
+    labels = top10_taxa["Municipio"].astype(str).str.replace(f" - {d['uf']}", "", regex=False)
+    fig = plt.figure(figsize=(10,5))
+    plt.barh(labels, top10_taxa["Taxa_1000hab"])
+    plt.gca().invert_yaxis()
+    plt.title(f"Top 10 maiores taxas de homicídios (por 1.000 hab) — {d['ano']}")
+    plt.xlabel("Taxa por 1.000 habitantes")
+    plt.ylabel("Município")
+    plt.grid(True, axis="x", alpha=0.3)
+    return fig
 
 
 # ==============================================
 # 7) Dispersão: gasto em segurança per capita x taxa de homicídios
 # ==============================================
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
+def _medias_por_faixa(x, y, faixas=FAIXAS_TENDENCIA):
+    """Média de x e de y em faixas de x com o mesmo número de pontos."""
+    bordas = np.unique(np.quantile(x, np.linspace(0, 1, faixas + 1)))
+    faixa = np.clip(np.searchsorted(bordas, x, side="right") - 1, 0, len(bordas) - 2)
+    n = np.bincount(faixa, minlength=len(bordas) - 1)
+    ok = n > 0
+    return (np.bincount(faixa, x, len(n))[ok] / n[ok], np.bincount(faixa, y, len(n))[ok] / n[ok])
+
 
-# garantir tipos
-df_final["Gasto_pc"] = pd.to_numeric(df_final["Gasto_Seguranca"] / df_final["População"], errors="coerce")
-df_final["Taxa_1000hab"] = pd.to_numeric(df_final["taxa/1000hab"], errors="coerce")
-
-# gráfico de dispersão
-fig = plt.figure(figsize=(8,6))
-plt.scatter(df_final["Gasto_pc"], df_final["Taxa_1000hab"], alpha=0.7)
-plt.title("Relação entre gasto em segurança per capita e taxa de homicídios (por 1 000 hab)")
-plt.xlabel("Gasto em segurança per capita (R$)")
-plt.ylabel("Taxa de homicídios (por 1 000 hab)")
-plt.grid(True, alpha=0.3)
-
-# linha de tendência
-x = df_final["Gasto_pc"].dropna()
-y = df_final["Taxa_1000hab"].dropna()
-if len(x) > 1:
-    coef = np.polyfit(x, y, 1)
-    poly1d_fn = np.poly1d(coef)
-    plt.plot(x, poly1d_fn(x), color="red", linewidth=2, label="Tendência linear")
+def _dispersao_agregada(x, y, bins=BINS_2D, faixas=FAIXAS_TENDENCIA, sombrear=SOMBREAR_DENSIDADE):
+    """Histograma 2D (recortado nos percentis 0,5-99,5) + médias por faixa de x."""
+    from matplotlib.colors import LogNorm
+
+    limites = [np.percentile(v, [0.5, 99.5]) for v in (x, y)]
+    H, bx, by = np.histogram2d(x, y, bins=bins, range=limites)
+    H = np.ma.masked_equal(H, 0)
+    if sombrear:
+        malha = plt.pcolormesh(bx, by, H.T, cmap="Blues", norm=LogNorm(vmin=1, vmax=max(H.max(), 1)))
+        plt.colorbar(malha, label="Municípios na célula")
+    else:
+        plt.pcolormesh(bx, by, (H > 0).T, cmap="Blues", vmin=0, vmax=1.5)
+    mx, my = _medias_por_faixa(x, y, faixas)
+    plt.plot(mx, my, color="red", linewidth=2, marker="o", markersize=3,
+             label=f"Média por faixa de gasto ({len(mx)} faixas)")
     plt.legend()
 
-fig.tight_layout()
-fig.savefig("figs/07_scatter_gastopc_taxa.png", dpi=220, bbox_inches="tight")
-plt.close(fig)
+
+def g07_scatter_gastopc_taxa(d):
+    df_final = d["df_final"]
+    fig = plt.figure(figsize=(8,6))
+    pares = df_final[["Gasto_pc", "Taxa_1000hab"]].dropna()
+    if len(pares) > d["limite_pontos"]:
+        _dispersao_agregada(pares["Gasto_pc"].to_numpy(dtype=float), pares["Taxa_1000hab"].to_numpy(dtype=float),
+                            d["bins_2d"], d["faixas_tendencia"], d["sombrear_densidade"])
+        plt.title("Relação entre gasto em segurança per capita e taxa de homicídios (por 1 000 hab)")
+        plt.xlabel("Gasto em segurança per capita (R$)")
+        plt.ylabel("Taxa de homicídios (por 1 000 hab)")
+        plt.grid(True, alpha=0.3)
+        return fig
+
+    plt.scatter(df_final["Gasto_pc"], df_final["Taxa_1000hab"], alpha=0.7)
+    plt.title("Relação entre gasto em segurança per capita e taxa de homicídios (por 1 000 hab)")
+    plt.xlabel("Gasto em segurança per capita (R$)")
+    plt.ylabel("Taxa de homicídios (por 1 000 hab)")
+    plt.grid(True, alpha=0.3)
+
+    # linha de tendência (nos pares sem NaN em nenhuma das duas colunas)
+    x, y = pares["Gasto_pc"], pares["Taxa_1000hab"]
+    if len(x) > 1:
+        coef = np.polyfit(x, y, 1)
+        poly1d_fn = np.poly1d(coef)
+        plt.plot(x, poly1d_fn(x), color="red", linewidth=2, label="Tendência linear")
+        plt.legend()
+    return fig
+
 
 # ==============================================
 # 8) Top 10 municípios com maior gasto per capita em segurança
 # ==============================================
-top10_gasto = df_final.sort_values("Gasto_pc", ascending=False).head(10)
-labels = top10_gasto["Municipio"].str.replace(" - GO", "", regex=False)
-
-fig = plt.figure(figsize=(10,5))
-plt.barh(labels, top10_gasto["Gasto_pc"], color="steelblue")
-plt.gca().invert_yaxis()
-plt.title("Top 10 municípios de Goiás por gasto em segurança per capita (2023)")
-plt.xlabel("Gasto em segurança per capita (R$)")
-plt.ylabel("Município")
-plt.grid(True, axis="x", alpha=0.3)
-
-fig.tight_layout()
-fig.savefig("figs/08_top10_gasto_pc.png", dpi=220, bbox_inches="tight")
-plt.close(fig)
+def g08_top10_gasto_pc(d):
+    top10_gasto = d["df_final"].sort_values("Gasto_pc", ascending=False).head(10)
+    labels = top10_gasto["Municipio"].astype(str).str.replace(f" - {d['uf']}", "", regex=False)
 
+    fig = plt.figure(figsize=(10,5))
+    plt.barh(labels, top10_gasto["Gasto_pc"], color="steelblue")
+    plt.gca().invert_yaxis()
+    plt.title(f"Top 10 municípios de {d['nome_uf']} por gasto em segurança per capita ({d['ano']})")
+    plt.xlabel("Gasto em segurança per capita (R$)")
+    plt.ylabel("Município")
+    plt.grid(True, axis="x", alpha=0.3)
+    return fig
 
 
 # ==============================================
-# 7) Boxplot, correlação e histogramas (com df_final)
+# 9-11) Boxplot, correlação e histogramas (variáveis do modelo)
 # ==============================================
-import seaborn as sns
+def g09_boxplot(d):
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.boxplot(data=d["df_modelo"], orient="h", ax=ax)
+    ax.set_title("Boxplot das variáveis do modelo de regressão")
+    ax.set_xlabel("Valor")
+    return fig
+
+
+def g10_matriz_correlacao(d):
+    import seaborn as sns
+
+    corr = d["df_modelo"].corr(numeric_only=True)
+    fig, ax = plt.subplots(figsize=(8, 6))
+    sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5, ax=ax)
+    ax.set_title("Matriz de correlação das variáveis do modelo")
+    return fig
+
+
+def g11_histogramas(d):
+    # DataFrame.hist cria a própria figura; é ela que precisa ser salva
+    axes = d["df_modelo"].hist(bins=20, edgecolor="black", figsize=(12, 8))
+    fig = np.ravel(axes)[0].figure
+    fig.suptitle("Distribuição das variáveis utilizadas no modelo", y=1.02)
+    return fig
+
+
+# (arquivo, função, frames e opções usados, entra no PDF?)
+GRAFICOS = [
+    ("01_serie_historica_go", g01_serie_historica, ["df_go"], True),
+    ("02_variacao_yoy_go", g02_variacao_yoy, ["df_go"], True),
+    ("03_ufs_2023", g03_ufs, ["df_uf_2023_ord"], True),
+    ("04_top10_abs", g04_top10_abs, ["df_mun_go_2023"], True),
+    ("05_hist_municipios_2023", g05_hist_municipios, ["df_mun_go_2023", "limite_pontos", "bins_hist"], True),
+    ("06_top10_taxa", g06_top10_taxa, ["df_final"], True),
+    ("07_scatter_gastopc_taxa", g07_scatter_gastopc_taxa,
+     ["df_final", "limite_pontos", "bins_2d", "faixas_tendencia", "sombrear_densidade"], False),
+    ("08_top10_gasto_pc", g08_top10_gasto_pc, ["df_final"], False),
+    ("09_boxplot", g09_boxplot, ["df_modelo"], True),
+    ("10_matriz_correlacao", g10_matriz_correlacao, ["df_modelo"], True),
+    ("11_histogramas_individuais", g11_histogramas, ["df_modelo"], True),
+]
+_PARAMETROS = ["uf", "nome_uf", "ano"]
+# funções auxiliares que um gráfico chama: o código delas também entra na chave
+_AUXILIARES = {"07_scatter_gastopc_taxa": [_dispersao_agregada, _medias_por_faixa]}
+
+
+def renderizar(nome, funcao, dados, pasta, pagina_pdf):
+    """Desenha um gráfico e salva o PNG (e a página PDF, se for o caso)."""
+    _pyplot()
+    with etapa(f"grafico/{nome}"):
+        fig = funcao(dados)
+        fig.tight_layout()
+        png = os.path.join(pasta, f"{nome}.png")
+        fig.savefig(png, dpi=DPI, bbox_inches="tight")
+        pdf = None
+        if pagina_pdf:
+            pdf = os.path.join(pasta, "_paginas", f"{nome}.pdf")
+            fig.savefig(pdf, format="pdf")
+        plt.close(fig)
+    return png, pdf
+
+
+def _renderizar_no_worker(*tarefa):
+    saida = renderizar(*tarefa)
+    return saida, instrumentacao.extrair()
+
+
+def chave_grafico(nome, funcao, recorte):
+    """Hash do conteúdo que determina o gráfico."""
+    h = hashlib.sha256(f"{VERSAO_CACHE}|{nome}|{DPI}".encode())
+    for f in [funcao] + _AUXILIARES.get(nome, []):
+        h.update(inspect.getsource(f).encode())
+    for k in sorted(recorte):
+        v = recorte[k]
+        if isinstance(v, pd.DataFrame):
+            h.update(f"{k}:{list(v.columns)}:{list(map(str, v.dtypes))}".encode())
+            h.update(pd.util.hash_pandas_object(v, index=True).values.tobytes())
+        else:
+            h.update(f"{k}={v!r}".encode())
+    return h.hexdigest()
+
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, "_manifesto.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _gravar_manifesto(pasta, manifesto):
+    with gravando(os.path.join(pasta, "_manifesto.json")) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=2, sort_keys=True)
+
+
+def _em_cache(item, chave):
+    return (item is not None and item["chave"] == chave and os.path.exists(item["png"])
+            and (item["pdf"] is None or os.path.exists(item["pdf"])))
+
+
+def montar_pdf(paginas, destino):
+    """Junta as páginas PDF na ordem dada."""
+    from pypdf import PdfWriter
+
+    escritor = PdfWriter()
+    for pagina in paginas:
+        escritor.append(pagina)
+    with open(destino, "wb") as f:
+        escritor.write(f)
+    escritor.close()
+
+
+def gerar(uf=apis.UF_PADRAO, ano=apis.ANO_PADRAO, paralelo=True, max_workers=None, forcar=False,
+          limite_pontos=None):
+    dados = preparar(uf, ano)
+    if limite_pontos is not None:
+        dados["limite_pontos"] = limite_pontos
+    pasta = apis.pasta_figuras(uf, ano)
+    os.makedirs(os.path.join(pasta, "_paginas"), exist_ok=True)
+    manifesto = {} if forcar else _ler_manifesto(pasta)
+
+    saidas, chaves, tarefas = {}, {}, []
+    for nome, funcao, frames, pagina_pdf in GRAFICOS:
+        recorte = {k: dados[k] for k in frames + _PARAMETROS}  # só o que o gráfico usa
+        chaves[nome] = chave_grafico(nome, funcao, recorte)
+        item = manifesto.get(nome)
+        if _em_cache(item, chaves[nome]):
+            saidas[nome] = (item["png"], item["pdf"])  # nada mudou: reaproveita
+        else:
+            tarefas.append((nome, funcao, recorte, pasta, pagina_pdf))
+
+    if paralelo and len(tarefas) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=iniciar_worker,
+                                 initargs=(instrumentacao.estado(),)) as pool:
+            futuros = {t[0]: pool.submit(_renderizar_no_worker, *t) for t in tarefas}
+            for nome, futuro in futuros.items():
+                saidas[nome], registros = futuro.result()
+                instrumentacao.adicionar(registros)
+    else:
+        saidas.update({t[0]: renderizar(*t) for t in tarefas})
 
-vars_modelo = ["Qtd_Homicidios", "Gasto_Seguranca", "valor_icms", "População", "PIB_per_capita"]
-df_modelo = df_final[vars_modelo].copy()
+    for nome, (png, pdf) in saidas.items():
+        manifesto[nome] = {"chave": chaves[nome], "png": png, "pdf": pdf}
+    _gravar_manifesto(pasta, manifesto)
 
-# boxplot
-fig, ax = plt.subplots(figsize=(10, 6))
-sns.boxplot(data=df_modelo, orient="h", ax=ax)
-ax.set_title("Boxplot das variáveis do modelo de regressão")
-ax.set_xlabel("Valor")
-fig.tight_layout()
-fig.savefig("figs/09_boxplot.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
+    # o PDF do relatório sai sempre das páginas (novas ou do cache), na ordem de GRAFICOS
+    ordem = [saidas[nome] for nome, *_ in GRAFICOS]
+    destino = os.path.join(pasta, f"graficos_seguranca_{uf.lower()}.pdf")
+    montar_pdf([pdf for _, pdf in ordem if pdf is not None], destino)
+    return [png for png, _ in ordem], destino, [t[0] for t in tarefas]
 
-# matriz de correlação
-corr = df_modelo.corr(numeric_only=True)
-fig, ax = plt.subplots(figsize=(8, 6))
-sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", linewidths=0.5, ax=ax)
-ax.set_title("Matriz de correlação das variáveis do modelo")
-fig.tight_layout()
-fig.savefig("figs/10_matriz_correlacao.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
 
-# histogramas
-fig = plt.figure(figsize=(12, 8))
-df_modelo.hist(bins=20, edgecolor="black", figsize=(12, 8))
-plt.suptitle("Distribuição das variáveis utilizadas no modelo", y=1.02)
-plt.tight_layout()
-fig.savefig("figs/11_histogramas_individuais.png", dpi=220, bbox_inches="tight")
-pdf.savefig(fig); plt.close(fig)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera os gráficos do relatório.")
+    parser.add_argument("--uf", default=apis.UF_PADRAO)
+    parser.add_argument("--ano", type=int, default=apis.ANO_PADRAO)
+    parser.add_argument("--sequencial", action="store_true", help="sem pool de processos")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--forcar", action="store_true", help="ignora o cache e redesenha tudo")
+    parser.add_argument("--limite-pontos", type=int, default=None,
+                        help=f"acima disso g05/g07 agregam em bins (padrão {LIMITE_PONTOS})")
+    args = parser.parse_args()
 
-# fecha PDF no final de tudo
-pdf.close()
-print("✅ Gráficos salvos em: figs/")
+    _, _, refeitos = gerar(args.uf.upper(), args.ano, paralelo=not args.sequencial,
+                           max_workers=args.workers, forcar=args.forcar, limite_pontos=args.limite_pontos)
+    print(f"{len(refeitos)}/{len(GRAFICOS)} gráficos redesenhados")
+    print(f"✅ Gráficos salvos em: {apis.pasta_figuras(args.uf.upper(), args.ano)}/")
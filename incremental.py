@@ -0,0 +1,90 @@
+import argparse
+import os
+import shutil
+
+import pandas as pd
+
+import apis
+from comum import gravando
+from ingestao import ler_serie_municipal
+
+# ==============================
+# Atualização incremental das séries históricas em data/
+# Em vez de reconstruir os CSVs do zero, vemos o último ano guardado de
+# cada território, lemos da API só o que vier depois (filtrado durante a
+# leitura) e acrescentamos no fim do arquivo. O acréscimo vai para uma
+# cópia temporária que só substitui o CSV quando está completa: uma falha
+# no meio não deixa o arquivo pela metade nem faz a próxima execução
+# pular anos. As colunas derivadas (var_pct, média móvel) não ficam aqui:
+# vêm do cubo de agregados.py, que é refeito quando o CSV muda.
+# ==============================
+SERIES = {
+    "uf": {
+        "csv": os.path.join("data", "homicidios_uf.csv"),
+        "url": apis.URL_UF,
+        "colunas": ["cod", "sigla", "valor", "periodo"],
+        "ufs": None,
+    },
+    "mun_go": {
+        "csv": os.path.join("data", "homicidios_mun_go_aolongodosanos.csv"),
+        "url": apis.URL_MUN,
+        "colunas": ["cod", "sigla", "valor", "periodo", "ano"],
+        "ufs": [apis.UFS["GO"]],
+    },
+}
+
+
+def ler_historico(serie):
+    df = pd.read_csv(SERIES[serie]["csv"], dtype={"cod": "int32"})
+    df["periodo"] = pd.to_datetime(df["periodo"], errors="coerce")
+    df["ano"] = df["periodo"].dt.year
+    return df
+
+
+def ultimo_ano(df_hist):
+    """Último ano guardado de cada território (cod -> ano)."""
+    return df_hist.groupby("cod")["ano"].max().to_dict()
+
+
+def _para_csv(df, colunas):
+    df = df.copy()
+    # contagens voltam como inteiro, igual ao resto do arquivo
+    if df["valor"].notna().all() and (df["valor"] % 1 == 0).all():
+        df["valor"] = df["valor"].astype("int64")
+    df["periodo"] = df["periodo"].dt.strftime("%Y-%m-%d")
+    return df[colunas]
+
+
+def _acrescentar(caminho, df):
+    """Acrescenta df (sem cabeçalho) ao CSV numa cópia e troca o arquivo de uma vez."""
+    with gravando(caminho) as tmp:
+        shutil.copyfile(caminho, tmp)
+        df.to_csv(tmp, mode="a", header=False, index=False)
+
+
+def atualizar(serie):
+    """Acrescenta os anos novos da série ao CSV. Devolve as linhas novas."""
+    cfg = SERIES[serie]
+    df_hist = ler_historico(serie)
+
+    # ttl=0: sempre revalida com a API (um 304 sai quase de graça)
+    df_novo = ler_serie_municipal(cfg["url"], ufs=cfg["ufs"], apos=ultimo_ano(df_hist), ttl=0, timeout=60)
+    if df_novo.empty:
+        return df_novo
+
+    df_novo["cod"] = df_novo["cod"].astype("int32")
+    df_novo["sigla"] = df_novo["sigla"].astype(str)
+    df_novo["ano"] = df_novo["ano"].astype(int)
+    _acrescentar(cfg["csv"], _para_csv(df_novo.sort_values(["periodo", "cod"]), cfg["colunas"]))
+    return df_novo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Atualiza as séries históricas só com os anos novos.")
+    parser.add_argument("series", nargs="*", default=list(SERIES), choices=list(SERIES))
+    args = parser.parse_args()
+
+    for serie in args.series:
+        novos = atualizar(serie)
+        anos = sorted(novos["ano"].unique()) if not novos.empty else []
+        print(f"{serie}: {len(novos)} registros novos {anos}")
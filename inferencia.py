@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from estimacao import CONSTANTE, _nomes_exog
+
+# ==============================
+# Inferência por reamostragem para a especificação IV
+# Em vez de chamar IV2SLS.fit milhares de vezes, cada bloco de réplicas
+# vira arrays (réplicas x n) de índices, pesos ou permutações, e os 2SLS
+# do bloco são resolvidos juntos com produtos cruzados em lote
+# (einsum + np.linalg.solve empilhado). O tamanho do bloco limita a
+# memória (~ bloco x n x 8 bytes); os blocos podem ir para um pool de
+# processos, cada um com sua semente (SeedSequence.spawn), então o
+# resultado não depende do número de processos.
+# ==============================
+REPLICACOES = 10000
+TAMANHO_BLOCO = 500
+
+
+def mde(erro_padrao, alpha=0.05, poder=None):
+    """Menor efeito detectável a partir do erro-padrão do coeficiente.
+
+    poder=None reproduz a conta antiga (z_{1-alpha/2} * EP); com poder
+    (ex.: 0.8) soma z_poder, a definição usual de MDE.
+    """
+    from scipy import stats
+
+    z = stats.norm.ppf(1 - alpha / 2)
+    if poder is not None:
+        z += stats.norm.ppf(poder)
+    return z * erro_padrao
+
+
+def matrizes(df, esp):
+    """y, X (exógenas + endógenas) e W (exógenas + instrumentos), padronizados."""
+    colunas = [esp.y, *esp.exog, *esp.endog, *esp.instrumentos]
+    df = df[colunas].dropna().assign(**{CONSTANTE: 1.0})
+    exog = _nomes_exog(esp)
+    escala = df.std(ddof=0).replace(0, 1.0)
+    df = df / escala
+    y = df[esp.y].to_numpy()
+    X = df[exog + list(esp.endog or ())].to_numpy()
+    W = df[exog + list(esp.instrumentos or esp.endog or ())].to_numpy()
+    # fator que leva cada coeficiente de volta à escala original
+    fator = (escala[esp.y] / escala[exog + list(esp.endog)]).to_numpy()
+    return y, X, W, fator
+
+
+def _resolver(WtW, WtX, Wty):
+    """2SLS empilhado: (B, kw, kw), (B, kw, k), (B, kw) -> (B, k)."""
+    A = np.linalg.solve(WtW, WtX)
+    XhX = np.swapaxes(WtX, 1, 2) @ A
+    return np.linalg.solve(XhX, (np.swapaxes(A, 1, 2) @ Wty[..., None]))[..., 0]
+
+
+def coeficientes(y, X, W):
+    return _resolver((W.T @ W)[None], (W.T @ X)[None], (W.T @ y)[None])[0]
+
+
+# ===== blocos de réplicas =====
+def _bloco_pares(y, X, W, rng, b):
+    n = len(y)
+    idx = rng.integers(0, n, size=(b, n))
+    # contagem de cada linha em cada réplica: W' diag(c) W sem copiar os dados
+    c = np.bincount((idx + n * np.arange(b)[:, None]).ravel(), minlength=b * n).reshape(b, n).astype(float)
+    WtW = np.einsum("bn,ni,nj->bij", c, W, W, optimize=True)
+    WtX = np.einsum("bn,ni,nj->bij", c, W, X, optimize=True)
+    Wty = (c * y) @ W
+    return _resolver(WtW, WtX, Wty)
+
+
+def _bloco_selvagem(y, X, W, rng, b):
+    # X e W fixos: beta* = beta + L (e * v), com L = (Xh'Xh)^-1 Xh'
+    beta = coeficientes(y, X, W)
+    e = y - X @ beta
+    Xh = W @ np.linalg.solve(W.T @ W, W.T @ X)
+    L = np.linalg.solve(Xh.T @ Xh, Xh.T)
+    v = rng.choice(np.array([-1.0, 1.0]), size=(b, len(y)))  # Rademacher
+    return beta + (v * e) @ L.T
+
+
+def _estatistica_ar(WtW, Wty):
+    # y' P_W y: soma de quadrados explicada por exógenas + instrumentos.
+    # Como P_E (só exógenas) não muda, comparar y' P_W y entre permutações
+    # equivale a comparar o F da forma reduzida (teste tipo Anderson-Rubin
+    # de beta = 0, válido mesmo com instrumento fraco).
+    return np.einsum("bi,bi->b", Wty, np.linalg.solve(WtW, Wty[..., None])[..., 0])
+
+
+def _bloco_permutacao(y, W, k_exog, rng, b):
+    # permuta os instrumentos excluídos (colunas de W depois das exógenas)
+    n = len(y)
+    perm = rng.permuted(np.tile(np.arange(n), (b, 1)), axis=1)
+    Z = W[:, k_exog:][perm]                      # (b, n, q)
+    E = W[:, :k_exog]
+    q = Z.shape[2]
+    ZtE = np.einsum("bnq,ni->bqi", Z, E)
+    WtW = np.block([[np.broadcast_to(E.T @ E, (b, k_exog, k_exog)), np.swapaxes(ZtE, 1, 2)],
+                    [ZtE, np.broadcast_to(W[:, k_exog:].T @ W[:, k_exog:], (b, q, q))]])
+    Wty = np.concatenate([np.broadcast_to(E.T @ y, (b, k_exog)),
+                          np.einsum("bnq,n->bq", Z, y)], axis=1)
+    return _estatistica_ar(WtW, Wty)
+
+
+_BLOCOS = {"pares": _bloco_pares, "selvagem": _bloco_selvagem, "permutacao": _bloco_permutacao}
+
+
+def _rodar_bloco(tipo, args, semente, b):
+    return _BLOCOS[tipo](*args, np.random.default_rng(semente), b)
+
+
+def replicar(tipo, args, replicacoes=REPLICACOES, seed=0, tamanho_bloco=TAMANHO_BLOCO, max_workers=1):
+    """Réplicas (coeficientes ou estatística), geradas em blocos de tamanho_bloco."""
+    tamanhos = [min(tamanho_bloco, replicacoes - i) for i in range(0, replicacoes, tamanho_bloco)]
+    sementes = np.random.SeedSequence(seed).spawn(len(tamanhos))
+    if max_workers and max_workers > 1 and len(tamanhos) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            blocos = list(pool.map(_rodar_bloco, [tipo] * len(tamanhos), [args] * len(tamanhos),
+                                   sementes, tamanhos))
+    else:
+        blocos = [_rodar_bloco(tipo, args, s, b) for s, b in zip(sementes, tamanhos)]
+    return np.concatenate(blocos)
+
+
+def inferir(df, esp, variavel=None, replicacoes=REPLICACOES, alpha=0.05, seed=0,
+            tamanho_bloco=TAMANHO_BLOCO, max_workers=1, erro_padrao=None, poder=0.8):
+    """MDE, ICs por bootstrap (pares e selvagem) e p-valor de permutação
+    (dos instrumentos, estatística da forma reduzida).
+
+    esp é uma estimacao.Especificacao; variavel é o coeficiente de
+    interesse (padrão: a primeira endógena). erro_padrao (ex.: o robusto
+    do ajuste) entra no MDE; sem ele, usa o EP do bootstrap de pares.
+    """
+    y, X, W, fator = matrizes(df, esp)
+    nomes = _nomes_exog(esp) + list(esp.endog)
+    j = nomes.index(variavel or (esp.endog or esp.exog)[0])
+    beta = coeficientes(y, X, W)[j] * fator[j]
+    kw = dict(replicacoes=replicacoes, seed=seed, tamanho_bloco=tamanho_bloco, max_workers=max_workers)
+
+    saida = {"variavel": nomes[j], "coef": beta, "n": len(y), "replicacoes": replicacoes}
+    for tipo in ("pares", "selvagem"):
+        b = replicar(tipo, (y, X, W), **kw)[:, j] * fator[j]
+        saida[f"ep_{tipo}"] = b.std(ddof=1)
+        saida[f"ic_{tipo}"] = tuple(np.quantile(b, [alpha / 2, 1 - alpha / 2]))
+
+    if esp.endog:
+        # H0: beta = 0 -> y não depende dos instrumentos; permutá-los dá a
+        # distribuição nula da estatística da forma reduzida
+        observada = _estatistica_ar((W.T @ W)[None], (W.T @ y)[None])[0]
+        nula = replicar("permutacao", (y, W, len(_nomes_exog(esp))), **kw)
+        saida["p_permutacao"] = (1 + np.sum(nula >= observada)) / (1 + len(nula))
+
+    ep = erro_padrao if erro_padrao is not None else saida["ep_pares"]
+    saida["mde"] = mde(ep, alpha)
+    saida[f"mde_poder_{poder:g}"] = mde(ep, alpha, poder)
+    return saida
@@ -0,0 +1,98 @@
+import codecs
+import json
+import math
+from array import array
+
+import pandas as pd
+
+from cache_http import iterar_bytes
+
+# ==============================
+# Leitura incremental das séries do Atlas da Violência
+# A série municipal (/valores-series/328/4) traz todos os municípios do
+# Brasil em todos os anos. Em vez de montar a lista inteira de dicts e só
+# depois filtrar GO, lemos o corpo em pedaços, decodificamos um registro
+# por vez e guardamos só o que interessa, já em colunas tipadas.
+# ==============================
+_PULAR = " \t\r\n,["
+
+
+def iterar_registros(pedacos):
+    """Gera os objetos de um array JSON a partir de pedaços de bytes."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos = "", 0
+
+    for pedaco in pedacos:
+        buf = buf[pos:] + utf8.decode(pedaco)
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in _PULAR:
+                pos += 1
+            if pos >= len(buf) or buf[pos] == "]":
+                break
+            try:
+                obj, fim = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # registro incompleto: espera o próximo pedaço
+            yield obj
+            pos = fim
+
+    resto = (buf[pos:] + utf8.decode(b"", final=True)).strip(_PULAR + "]")
+    if resto:
+        raise ValueError(f"JSON truncado ou inválido perto de: {resto[:80]!r}")
+
+
+def _numero(v):
+    if v is None or v == "":
+        return math.nan
+    return float(v)
+
+
+def ler_serie_filtrada(pedacos, ufs=None, codigos=None, anos=None, apos=None):
+    """
+    Monta um DataFrame (cod, sigla, valor, periodo, ano) só com os registros
+    que passam no filtro. `ufs` são códigos IBGE de UF (ex.: 52 = GO),
+    `codigos` são códigos de município e `anos` uma coleção de anos; None
+    não filtra. `apos` (cod -> ano) mantém só o que for mais novo que o
+    último ano já guardado de cada território. A memória usada cresce com
+    as linhas mantidas, não com o tamanho da resposta.
+    """
+    ufs = None if ufs is None else {int(u) for u in ufs}
+    codigos = None if codigos is None else {int(c) for c in codigos}
+    anos = None if anos is None else {int(a) for a in anos}
+
+    col_cod, col_valor, col_ano = array("i"), array("d"), array("h")
+    col_sigla, col_periodo = [], []
+
+    for reg in iterar_registros(pedacos):
+        cod = int(reg["cod"])
+        if codigos is not None and cod not in codigos:
+            continue
+        if ufs is not None and cod // 100000 not in ufs:
+            continue
+        periodo = reg["periodo"]
+        ano = int(periodo[:4])
+        if anos is not None and ano not in anos:
+            continue
+        if apos is not None and ano <= apos.get(cod, -1):
+            continue
+        col_cod.append(cod)
+        col_valor.append(_numero(reg["valor"]))
+        col_ano.append(ano)
+        col_sigla.append(reg["sigla"])
+        col_periodo.append(periodo)
+
+    return pd.DataFrame({
+        "cod": pd.Series(col_cod, dtype="int32"),
+        "sigla": pd.Categorical(col_sigla),
+        "valor": pd.Series(col_valor, dtype="float64"),
+        "periodo": pd.to_datetime(pd.Series(col_periodo, dtype="object"), errors="coerce"),
+        "ano": pd.Series(col_ano, dtype="int16"),
+    })
+
+
+def ler_serie_municipal(url, ufs=None, codigos=None, anos=None, apos=None, snapshot=None, **kwargs):
+    """Baixa (ou lê do cache) a série de `url` filtrando durante a leitura."""
+    return ler_serie_filtrada(iterar_bytes(url, snapshot=snapshot, **kwargs),
+                              ufs=ufs, codigos=codigos, anos=anos, apos=apos)
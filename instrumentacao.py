@@ -0,0 +1,180 @@
+import atexit
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# ==============================
+# Instrumentação por etapa
+# Envolva cada etapa com `with etapa("nome", linhas_in=...) as e:` e, se
+# quiser, preencha `e.linhas_out`. Desligada (padrão) devolve sempre o
+# mesmo objeto vazio, sem medir nada. Ligada (AP2_INSTRUMENTAR=1 ou
+# configurar(ativo=True)) registra tempo de parede, tempo de CPU, linhas
+# e pico de memória (tracemalloc) e grava um relatório JSON/CSV no fim do
+# processo. AP2_PERFIL=<etapa> grava um cProfile só daquela etapa.
+# ==============================
+ATIVO = os.environ.get("AP2_INSTRUMENTAR", "0").lower() in ("1", "true", "sim")
+RELATORIO = os.environ.get("AP2_RELATORIO")  # .json ou .csv
+PERFIL = os.environ.get("AP2_PERFIL")
+DIR_RELATORIOS = "relatorios"
+
+_registros = []
+_pilha = []
+
+
+class _Nulo:
+    """Etapa desligada: aceita linhas_out e não faz mais nada."""
+    linhas_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, nome, valor):
+        pass
+
+
+_NULO = _Nulo()
+
+
+class _Etapa:
+    def __init__(self, nome, linhas_in):
+        self.nome = nome
+        self.linhas_in = linhas_in
+        self.linhas_out = None
+        self._perfil = None
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # guarda o pico da etapa de fora antes de zerar para esta
+        if _pilha:
+            _pilha[-1]._pico = max(_pilha[-1]._pico, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._pico = 0
+        _pilha.append(self)
+        if PERFIL == self.nome:
+            self._perfil = cProfile.Profile()
+            self._perfil.enable()
+        self._cpu0 = time.process_time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, *exc):
+        parede = time.perf_counter() - self._t0
+        cpu = time.process_time() - self._cpu0
+        if self._perfil is not None:
+            self._perfil.disable()
+            os.makedirs(DIR_RELATORIOS, exist_ok=True)
+            self._perfil.dump_stats(os.path.join(DIR_RELATORIOS, f"perfil_{self.nome.replace('/', '_')}.prof"))
+        pico = max(self._pico, tracemalloc.get_traced_memory()[1])
+        _pilha.pop()
+        if _pilha:
+            _pilha[-1]._pico = max(_pilha[-1]._pico, pico)
+        tracemalloc.reset_peak()
+
+        _registros.append({
+            "etapa": self.nome,
+            "pid": os.getpid(),
+            "segundos": round(parede, 6),
+            "cpu_segundos": round(cpu, 6),
+            "linhas_in": self.linhas_in,
+            "linhas_out": self.linhas_out,
+            "pico_mb": round(pico / 2**20, 3),
+            "erro": None if tipo is None else tipo.__name__,
+        })
+        return False
+
+
+def etapa(nome, linhas_in=None):
+    if not ATIVO:
+        return _NULO
+    return _Etapa(nome, linhas_in)
+
+
+def instrumentado(nome):
+    """Decorador: mede a função como uma etapa; DataFrames contam como linhas_out."""
+    def decorador(funcao):
+        def envolvida(*args, **kwargs):
+            if not ATIVO:
+                return funcao(*args, **kwargs)
+            with etapa(nome) as e:
+                resultado = funcao(*args, **kwargs)
+                if hasattr(resultado, "shape"):
+                    e.linhas_out = resultado.shape[0]
+                return resultado
+        envolvida.__name__ = funcao.__name__
+        envolvida.__doc__ = funcao.__doc__
+        envolvida.__wrapped__ = funcao
+        return envolvida
+    return decorador
+
+
+def configurar(ativo=None, relatorio=None, perfil=None):
+    global ATIVO, RELATORIO, PERFIL
+    if ativo is not None:
+        ATIVO = bool(ativo)
+    if relatorio is not None:
+        RELATORIO = relatorio
+    if perfil is not None:
+        PERFIL = perfil
+    if ATIVO:
+        atexit.register(_gravar_no_fim)
+
+
+def estado():
+    """Configuração atual, para repassar a processos filhos."""
+    return {"ativo": ATIVO, "relatorio": RELATORIO, "perfil": PERFIL}
+
+
+def registros():
+    return list(_registros)
+
+
+def extrair():
+    """Devolve e limpa os registros (usado pelos workers)."""
+    saida = list(_registros)
+    _registros.clear()
+    return saida
+
+
+def adicionar(novos):
+    _registros.extend(novos)
+
+
+def gravar_relatorio(caminho=None):
+    if caminho is None:
+        script = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        caminho = os.path.join(DIR_RELATORIOS, f"{script}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    if caminho.endswith(".csv"):
+        with open(caminho, "w", newline="", encoding="utf-8") as f:
+            campos = ["etapa", "pid", "segundos", "cpu_segundos", "linhas_in", "linhas_out", "pico_mb", "erro"]
+            escritor = csv.DictWriter(f, fieldnames=campos)
+            escritor.writeheader()
+            escritor.writerows(_registros)
+    else:
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({"argv": sys.argv, "etapas": _registros}, f, indent=2, ensure_ascii=False)
+    return caminho
+
+
+_gravado = False
+
+
+def _gravar_no_fim():
+    global _gravado
+    # workers do ProcessPoolExecutor saem sem atexit; quem grava é o pai
+    if _gravado or not _registros:
+        return
+    _gravado = True
+    print(f"relatório de etapas: {gravar_relatorio(RELATORIO)}")
+
+
+if ATIVO:
+    atexit.register(_gravar_no_fim)
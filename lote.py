@@ -0,0 +1,85 @@
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import apis
+import armazem
+import cache_http
+
+# ==============================
+# Modo lote: a tabela final para várias UFs e anos
+# O processo principal baixa as fontes nacionais uma única vez (cache em
+# disco) e converte as planilhas; cada worker monta todas as partições de
+# uma UF lendo só do cache, sem tocar na rede, e grava em
+# data/arrow/dados_completos/uf=<UF>/ano=<ano>.arrow
+# ==============================
+TAB_PARTICOES = "dados_completos"
+
+
+def _iniciar_worker(cache_dir):
+    # o pai já aqueceu o cache: nos workers tudo vem do disco
+    cache_http.configurar(cache_dir=cache_dir, offline=True)
+
+
+def construir_uf(uf, anos):
+    """Monta e grava as partições (uf, ano). Devolve (uf, ano, linhas, erro)."""
+    resultado = []
+    for ano in anos:
+        try:
+            df = apis.carregar_df_final(uf, ano)
+        except (FileNotFoundError, apis.SemDadosUF) as e:
+            # nada é gravado; sai também uma partição antiga que tenha ficado
+            armazem.apagar_particao(TAB_PARTICOES, uf, ano)
+            resultado.append((uf, ano, None, str(e)))
+            continue
+        armazem.salvar_particao(df, TAB_PARTICOES, uf, ano)
+        resultado.append((uf, ano, len(df), None))
+    return resultado
+
+
+def preparar_nacional(ufs, anos):
+    """Downloads (séries nacionais, PIB das ufs) e conversão das planilhas, uma vez só."""
+    latencias = apis.buscar_fontes(ufs=ufs)
+    for ano in anos:
+        for tabela in (apis.TAB_SEG, apis.TAB_ICMS):
+            try:
+                armazem.ler(apis.tabela_do_ano(tabela, ano), colunas=[])
+            except FileNotFoundError:
+                pass  # o worker registra a partição como pulada
+    return latencias
+
+
+def construir_lote(ufs, anos, max_workers=None):
+    preparar_nacional(ufs, anos)
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_iniciar_worker,
+                             initargs=(cache_http.CACHE_DIR,)) as pool:
+        futuros = [pool.submit(construir_uf, uf, tuple(anos)) for uf in ufs]
+        for futuro in as_completed(futuros):
+            resultados.extend(futuro.result())
+    return sorted(resultados)
+
+
+def _anos(texto):
+    # "2019-2023" ou "2021,2023"
+    if "-" in texto:
+        ini, fim = texto.split("-")
+        return list(range(int(ini), int(fim) + 1))
+    return [int(a) for a in texto.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monta a tabela final por UF e ano em paralelo.")
+    parser.add_argument("--ufs", default="all", help="ex.: GO,SP ou all (padrão)")
+    parser.add_argument("--anos", default=str(apis.ANO_PADRAO), help="ex.: 2019-2023 ou 2021,2023")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    ufs = list(apis.UFS) if args.ufs == "all" else args.ufs.upper().split(",")
+    t0 = time.perf_counter()
+    resultados = construir_lote(ufs, _anos(args.anos), max_workers=args.workers)
+
+    for uf, ano, linhas, erro in resultados:
+        print(f"{uf} {ano}: {linhas} linhas" if erro is None else f"{uf} {ano}: pulado ({erro})")
+    feitos = sum(erro is None for *_, erro in resultados)
+    print(f"{feitos}/{len(resultados)} partições em {time.perf_counter() - t0:.1f}s")
@@ -1,5 +1,50 @@
-def main():
-    print("Hello from ap2!")
+import argparse
+import os
+
+import apis
+import pipeline
+
+# ==============================
+# Ponto de entrada do projeto
+#   python main.py fetch      -> baixa/atualiza as fontes (cache HTTP)
+#   python main.py build      -> monta dados_completos_final (outra UF/ano:
+#                                dados_completos_final_<uf>_<ano>)
+#   python main.py estimate   -> modelos, inferência e curva de especificação
+#   python main.py plot       -> gráficos e PDF do relatório
+#   python main.py all        -> tudo
+# Só roda o que está vencido (ver pipeline.py); --status mostra o que
+# rodaria sem rodar nada e --forcar refaz etapas mesmo em dia.
+# ==============================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline do projeto (só refaz o que mudou).")
+    parser.add_argument("comando", choices=list(pipeline.ALVOS))
+    parser.add_argument("--uf", default=apis.UF_PADRAO)
+    parser.add_argument("--ano", type=int, default=apis.ANO_PADRAO)
+    parser.add_argument("--excel", action="store_true", help="build também exporta data/dados_completos_final.xlsx")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="processos para etapas independentes (1 = sequencial)")
+    parser.add_argument("--forcar", nargs="*", metavar="ETAPA", choices=list(pipeline.ETAPAS),
+                        help="refaz estas etapas (sem nome: todas as do comando)")
+    parser.add_argument("--status", action="store_true", help="só mostra o que rodaria")
+    args = parser.parse_args(argv)
+
+    alvos = pipeline.ALVOS[args.comando]
+    if args.forcar is None:
+        forcar = ()
+    else:
+        forcar = args.forcar or pipeline.fechamento(alvos)
+    params = {"uf": args.uf.upper(), "ano": args.ano, "excel": args.excel}
+    try:
+        situacao = pipeline.rodar(alvos, params, jobs=max(1, args.jobs), forcar=set(forcar),
+                                  so_mostrar=args.status)
+    except (apis.SemDadosUF, FileNotFoundError) as e:
+        # recorte sem dados: para antes de estimar/plotar uma tabela vazia
+        parser.exit(1, f"❌ {params['uf']} {params['ano']}: {e}\n")
+    rodadas = sum(s.startswith("rodou") for s in situacao.values())
+    if not args.status:
+        print(f"✅ {rodadas}/{len(situacao)} etapas rodadas, o resto estava em dia")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import apis
+import armazem
+import lote
+from estimacao import Especificacao, estimar, tabela
+from instrumentacao import etapa
+
+# ==============================
+# Painel município x ano com efeitos fixos
+# O painel sai das mesmas partições de lote.py (a tabela final de cada
+# UF e ano, montada com apis.juntar_fontes); o que faltar é montado na
+# hora. Os efeitos fixos de município e de ano são absorvidos por
+# projeções alternadas: subtrai a média do município, depois a do ano, e
+# repete até parar de mudar. As médias saem de uma matriz esparsa de
+# indicadores (n x grupos), então nada de matriz de dummies densa. O 2SLS
+# roda nos dados centrados (estimacao.estimar, sem constante) com erros
+# agrupados por município.
+# ==============================
+EFEITOS = ("Codigo IBGE", "Ano")
+TOLERANCIA = 1e-10
+MAX_ITER = 1000
+
+
+def montar_painel(ufs=(apis.UF_PADRAO,), anos=(apis.ANO_PADRAO,)):
+    """Tabela final empilhada por (UF, ano) + lista do que ficou de fora."""
+    feitos = set(armazem.listar_particoes(lote.TAB_PARTICOES))
+    pulados = []
+    for uf in ufs:
+        faltando = tuple(a for a in anos if (uf, a) not in feitos)
+        if faltando:
+            pulados += [(u, a, erro) for u, a, _, erro in lote.construir_uf(uf, faltando) if erro]
+    with etapa("painel/montar") as e:
+        painel = armazem.ler_particoes(lote.TAB_PARTICOES, ufs=set(ufs), anos=set(anos))
+        e.linhas_out = len(painel)
+    return painel, pulados
+
+
+def _indicadores(codigos):
+    n = len(codigos)
+    return sparse.csr_matrix((np.ones(n), (np.arange(n), codigos)), shape=(n, codigos.max() + 1))
+
+
+def centrar(M, grupos, tol=TOLERANCIA, max_iter=MAX_ITER):
+    """Tira as médias de cada grupo (projeções alternadas) de todas as colunas.
+
+    grupos: lista de arrays de códigos inteiros (0..G-1), um por efeito
+    fixo. Devolve (M centrada, número de iterações).
+    """
+    M = np.array(M, dtype=float)
+    escala = M.std(axis=0)
+    escala[escala == 0] = 1.0
+    projecoes = []
+    for g in grupos:
+        D = _indicadores(g)
+        contagem = np.asarray(D.sum(axis=0)).ravel()
+        projecoes.append((D, 1.0 / np.maximum(contagem, 1)))
+
+    for iteracao in range(1, max_iter + 1):
+        mudanca = 0.0
+        for D, inv_contagem in projecoes:
+            medias = (D.T @ M) * inv_contagem[:, None]
+            M -= D @ medias
+            mudanca = max(mudanca, (np.abs(medias).max(axis=0) / escala).max())
+        if mudanca < tol or len(projecoes) == 1:
+            break
+    return M, iteracao
+
+
+def tirar_singletons(df, efeitos=EFEITOS):
+    """Remove (repetidamente) observações sozinhas no seu grupo: o efeito
+    fixo as ajusta perfeitamente e só inflariam o n."""
+    while True:
+        sozinhas = np.zeros(len(df), dtype=bool)
+        for col in efeitos:
+            sozinhas |= df.groupby(col, observed=True)[col].transform("size").to_numpy() == 1
+        if not sozinhas.any():
+            return df
+        df = df[~sozinhas]
+
+
+def ajustar_painel(df, y, endog, instrumentos, exog=(), efeitos=EFEITOS, cluster="Codigo IBGE"):
+    """2SLS com efeitos fixos absorvidos; devolve o resultado de estimacao.estimar."""
+    variaveis = [y, *exog, *endog, *instrumentos]
+    df = tirar_singletons(df.dropna(subset=variaveis + list(efeitos)), efeitos)
+    grupos = [pd.factorize(df[col])[0] for col in efeitos]
+
+    with etapa("painel/centrar", linhas_in=len(df)) as e:
+        M, iteracoes = centrar(df[variaveis].to_numpy(dtype=float), grupos)
+        e.linhas_out = len(df)
+    # variável constante dentro do município (ou do ano) some com os efeitos fixos
+    original = df[variaveis].to_numpy(dtype=float).std(axis=0)
+    sem_variacao = [v for v, dp, dp0 in zip(variaveis, M.std(axis=0), original) if dp <= 1e-9 * max(dp0, 1e-300)]
+    if sem_variacao:
+        raise ValueError(f"Sem variação depois dos efeitos fixos: {', '.join(sem_variacao)}")
+    centrado = pd.DataFrame(M, columns=variaveis, index=df.index).assign(_cluster=df[cluster].to_numpy())
+
+    esp = Especificacao("painel_fe", y, tuple(exog), tuple(endog), tuple(instrumentos),
+                        constante=False, cov="cluster")
+    with etapa("painel/2sls", linhas_in=len(df)):
+        resultado = estimar(centrado, [esp], cluster="_cluster")[esp.nome]
+    resultado["iteracoes"] = iteracoes
+    resultado["grupos"] = {col: int(g.max() + 1) for col, g in zip(efeitos, grupos)}
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IV em painel com efeitos fixos de município e ano.")
+    parser.add_argument("--ufs", default=apis.UF_PADRAO, help="ex.: GO,SP ou all")
+    parser.add_argument("--anos", default=f"2015-{apis.ANO_PADRAO}", help="ex.: 2015-2023")
+    parser.add_argument("--log", action="store_true", help="variáveis em log")
+    args = parser.parse_args()
+
+    ufs = list(apis.UFS) if args.ufs == "all" else args.ufs.upper().split(",")
+    painel, pulados = montar_painel(ufs, lote._anos(args.anos))
+    for uf, ano, erro in pulados:
+        print(f"{uf} {ano}: fora do painel ({erro})")
+
+    anos_painel = sorted(painel["Ano"].unique()) if len(painel) else []
+    if len(anos_painel) < 2:
+        print(f"Painel com {len(anos_painel)} ano(s): efeitos fixos de município e ano precisam "
+              f"de pelo menos dois anos com FINBRA (data/{apis.TAB_SEG}_<ano>.xlsx e "
+              f"data/{apis.TAB_ICMS}_<ano>.xlsx).")
+        raise SystemExit(1)
+
+    if args.log:
+        from variavel_instrumental import adicionar_logs
+        painel = adicionar_logs(painel)
+        r = ajustar_painel(painel, "ln_homicidios", ["ln_gasto_seg"], ["ln_valor_icms"], ["ln_pop", "ln_pibpc"])
+    else:
+        r = ajustar_painel(painel, "Qtd_Homicidios", ["Gasto_Seguranca"], ["valor_icms"],
+                           ["População", "PIB_per_capita"])
+    print(f"{r['n']} observações, grupos {r['grupos']}, {r['iteracoes']} iterações")
+    print(tabela({"painel_fe": r}).to_string(index=False))
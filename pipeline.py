@@ -0,0 +1,346 @@
+import ast
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+import instrumentacao
+from comum import dir_cache, gravando, iniciar_worker
+from instrumentacao import etapa
+
+# ==============================
+# Pipeline em etapas (DAG)
+# Cada etapa declara de quem depende, os módulos por onde entra (o código
+# dela é esse módulo mais tudo do projeto que ele importa, direta ou
+# indiretamente), os arquivos externos que lê e os que escreve. A impressão de uma etapa é
+# o hash de: parâmetros, código, entradas externas e das saídas das etapas
+# de que depende. Está em dia se a impressão é a mesma da última execução
+# e as saídas continuam lá, intactas; senão roda de novo. Como a impressão
+# usa o conteúdo das saídas de cima, uma etapa que roda e produz
+# exatamente o mesmo arquivo não força as de baixo. Etapas independentes
+# (as três depois de build) rodam em paralelo num pool de processos.
+# Tabela final, modelos e figuras são por recorte (uf, ano): rodar outra
+# UF não sobrescreve as saídas de GO, e o estado de cada etapa que usa
+# uf/ano é guardado por recorte. O estado fica em .cache/pipeline.json.
+# ==============================
+ARQ_ESTADO = dir_cache("pipeline.json")
+VERSAO = 1
+
+Etapa = namedtuple("Etapa", ["nome", "funcao", "depende", "parametros", "codigo", "entradas", "saidas",
+                             "sempre"], defaults=((), (), (), None, None, False))
+Etapa.__doc__ = """Uma etapa do pipeline.
+
+funcao(params, jobs) faz o trabalho; parametros são as chaves de params
+que entram na impressão; codigo são os módulos de entrada (os que eles
+importam do projeto entram sozinhos, ver modulos_usados); entradas(params) e saidas(params) devolvem
+listas de caminhos. sempre=True roda toda vez (ex.: fetch, que confere o
+cache HTTP), mas as de baixo só rodam se as saídas mudarem."""
+
+
+# ===== funções das etapas (nível de módulo, para irem ao pool) =====
+def rodar_fetch(params, jobs):
+    import apis
+    apis.buscar_fontes(ufs=(params["uf"],))
+
+
+def rodar_build(params, jobs):
+    import apis
+    import armazem
+    # recorte sem dados para (ex.: UF fora das planilhas) levanta SemDadosUF
+    # aqui, antes de gravar qualquer coisa
+    df = apis.carregar_df_final(params["uf"], params["ano"])
+    with etapa("saida/dados_completos_final", linhas_in=len(df)):
+        armazem.salvar(df, apis.tabela_saida(params["uf"], params["ano"]), excel=params["excel"])
+
+
+def rodar_estimar(params, jobs):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    import variavel_instrumental as vi
+    arquivo, pasta = _saidas_estimar(params)[0], _pasta(params)
+    resultados = vi.relatorio(vi.carregar_dados(params["uf"], params["ano"]))
+    vi.tabela(resultados).to_excel(arquivo, index=False)
+    vi.graficos_diagnostico(resultados, pasta=pasta)
+    plt.close("all")
+
+
+def rodar_especificacoes(params, jobs):
+    import curva_especificacao
+    from variavel_instrumental import carregar_dados
+    tabela, _ = curva_especificacao.rodar(carregar_dados(params["uf"], params["ano"]),
+                                          paralelo=jobs > 1, max_workers=jobs)
+    curva_especificacao.salvar(tabela, _saidas_especificacoes(params)[0], _pasta(params))
+
+
+def rodar_graficos(params, jobs):
+    import graficos
+    graficos.gerar(params["uf"], params["ano"], paralelo=jobs > 1, max_workers=jobs)
+
+
+# ===== arquivos de cada etapa =====
+def _arquivos_fetch(params):
+    # o que as etapas de baixo leem: o corpo em cache de cada API e,
+    # offline sem cache, os snapshots de data/
+    import apis
+    import cache_http
+    urls = [url for url, _ in apis.FONTES.values()] + apis.urls_pib((params["uf"],))
+    corpos = [cache_http._caminhos(url)[0] for url in urls]
+    return [c for c in corpos if os.path.exists(c)] + [apis.SNAP_UF, apis.SNAP_MUN, apis.SNAP_FINAL]
+
+
+def _planilhas(params):
+    import apis
+    import armazem
+    return [armazem._caminho_xlsx(apis.tabela_do_ano(t, params["ano"])) for t in (apis.TAB_SEG, apis.TAB_ICMS)]
+
+
+def _tabela_final(params):
+    import apis
+    import armazem
+    return [armazem._caminho_arrow(apis.tabela_saida(params["uf"], params["ano"]))]
+
+
+def _pasta(params):
+    import apis
+    return apis.pasta_figuras(params["uf"], params["ano"])
+
+
+def _com_sufixo(arquivo, params):
+    # resultado_modelos.xlsx -> resultado_modelos_sp_2023.xlsx fora do recorte padrão
+    import apis
+    raiz, ext = os.path.splitext(arquivo)
+    return f"{raiz}{apis.sufixo_saida(params['uf'], params['ano'])}{ext}"
+
+
+def _saidas_estimar(params):
+    from variavel_instrumental import ARQ_MODELOS, FIGURAS_DIAGNOSTICO
+    return [_com_sufixo(ARQ_MODELOS, params)] + [os.path.join(_pasta(params), f) for f in FIGURAS_DIAGNOSTICO]
+
+
+def _saidas_especificacoes(params):
+    from curva_especificacao import ARQ_SAIDA, TRANSFORMACOES
+    return ([_com_sufixo(ARQ_SAIDA, params)]
+            + [os.path.join(_pasta(params), f"curva_especificacao_{t}.png") for t in TRANSFORMACOES])
+
+
+def _saidas_graficos(params):
+    import graficos
+    pasta = _pasta(params)
+    return ([os.path.join(pasta, f"{nome}.png") for nome, *_ in graficos.GRAFICOS]
+            + [os.path.join(pasta, f"graficos_seguranca_{params['uf'].lower()}.pdf")])
+
+
+ETAPAS = {e.nome: e for e in [
+    Etapa("fetch", rodar_fetch, (), ("uf",), ("apis.py", "cache_http.py"), None, _arquivos_fetch, sempre=True),
+    Etapa("build", rodar_build, ("fetch",), ("uf", "ano", "excel"), ("apis.py", "armazem.py"),
+          _planilhas, _tabela_final),
+    Etapa("estimar", rodar_estimar, ("build",), ("uf", "ano"), ("variavel_instrumental.py",), None, _saidas_estimar),
+    Etapa("especificacoes", rodar_especificacoes, ("build",), ("uf", "ano"),
+          ("curva_especificacao.py", "variavel_instrumental.py"), None, _saidas_especificacoes),
+    Etapa("graficos", rodar_graficos, ("fetch", "build"), ("uf", "ano"), ("graficos.py",),
+          _planilhas, _saidas_graficos),
+]}
+
+# subcomandos de main.py -> etapas-alvo (as dependências entram sozinhas)
+ALVOS = {
+    "fetch": ["fetch"],
+    "build": ["build"],
+    "estimate": ["estimar", "especificacoes"],
+    "plot": ["graficos"],
+    "all": list(ETAPAS),
+}
+
+
+# ===== impressões =====
+def _importados(caminho):
+    """Módulos do projeto (arquivos .py ao lado deste) importados em caminho,
+    inclusive os imports locais dentro de funções."""
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), caminho)
+    nomes = set()
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Import):
+            nomes.update(a.name.split(".")[0] for a in no.names)
+        elif isinstance(no, ast.ImportFrom) and no.level == 0 and no.module:
+            nomes.add(no.module.split(".")[0])
+    pasta = os.path.dirname(caminho)
+    return {os.path.join(pasta, f"{n}.py") for n in nomes if os.path.exists(os.path.join(pasta, f"{n}.py"))}
+
+
+@lru_cache(maxsize=None)
+def modulos_usados(entradas):
+    """Os arquivos de entradas mais tudo do projeto que eles importam (fecho)."""
+    vistos, pilha = set(), list(entradas)
+    while pilha:
+        caminho = pilha.pop()
+        if caminho not in vistos:
+            vistos.add(caminho)
+            pilha.extend(_importados(caminho) - vistos)
+    return sorted(vistos)
+
+
+def _hash_arquivo(caminho, conhecidos):
+    """sha256 do arquivo; se tamanho e mtime batem com o último, reaproveita."""
+    st = os.stat(caminho)
+    anterior = conhecidos.get(caminho)
+    if anterior and anterior["tamanho"] == st.st_size and anterior["mtime_ns"] == st.st_mtime_ns:
+        return anterior["sha256"]
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    conhecidos[caminho] = {"tamanho": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+    return h.hexdigest()
+
+
+def _hash_arquivos(caminhos, conhecidos):
+    """{caminho: sha256}; arquivo que não existe vale None."""
+    return {c: _hash_arquivo(c, conhecidos) if os.path.exists(c) else None for c in caminhos}
+
+
+def impressao(e, params, saidas_acima, conhecidos):
+    usados = {k: params[k] for k in e.parametros}
+    # os caminhos das saídas também entram: mudar onde a etapa grava a refaz
+    h = hashlib.sha256(f"{VERSAO}|{e.nome}|{json.dumps(usados, sort_keys=True)}|{e.saidas(params)}".encode())
+    arquivos = modulos_usados(e.codigo) + (e.entradas(params) if e.entradas else [])
+    for caminho, sha in sorted(_hash_arquivos(arquivos, conhecidos).items()):
+        h.update(f"{caminho}={sha}".encode())
+    for nome in e.depende:
+        h.update(f"{nome}:{json.dumps(saidas_acima[nome], sort_keys=True)}".encode())
+    return h.hexdigest()
+
+
+def _ler_estado():
+    try:
+        with open(ARQ_ESTADO, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"etapas": {}, "arquivos": {}}
+
+
+def _gravar_estado(estado):
+    with gravando(ARQ_ESTADO) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+
+
+# ===== execução =====
+def fechamento(alvos):
+    """Etapas necessárias para os alvos, em ordem topológica (a de ETAPAS)."""
+    necessarias, pilha = set(), list(alvos)
+    while pilha:
+        nome = pilha.pop()
+        if nome not in necessarias:
+            necessarias.add(nome)
+            pilha.extend(ETAPAS[nome].depende)
+    return [nome for nome in ETAPAS if nome in necessarias]
+
+
+def _executar(nome, params, jobs):
+    inicio = time.perf_counter()
+    with etapa(f"pipeline/{nome}"):
+        ETAPAS[nome].funcao(params, jobs)
+    return time.perf_counter() - inicio
+
+
+def _executar_no_worker(nome, params, jobs):
+    return _executar(nome, params, jobs), instrumentacao.extrair()
+
+
+def _chave_estado(nome, params):
+    """Onde a etapa fica em estado["etapas"]: uma entrada por recorte (uf, ano)
+    nas que dependem dele, para GO e SP não se invalidarem um ao outro."""
+    recorte = [str(params[k]) for k in ("uf", "ano") if k in ETAPAS[nome].parametros]
+    return "/".join([nome] + recorte)
+
+
+def _decidir(nome, params, estado, saidas, forcar):
+    """(impressão, motivo para rodar ou None se está em dia)."""
+    e = ETAPAS[nome]
+    chave = impressao(e, params, saidas, estado["arquivos"])
+    anterior = estado["etapas"].get(_chave_estado(nome, params))
+    if forcar or e.sempre:
+        return chave, "forçada" if forcar else "sempre roda"
+    if anterior is None:
+        return chave, "nunca rodou"
+    if anterior["impressao"] != chave:
+        return chave, "entradas mudaram"
+    atuais = _hash_arquivos(anterior["saidas"], estado["arquivos"])
+    if atuais != anterior["saidas"]:
+        return chave, "saídas ausentes ou alteradas"
+    return chave, None
+
+
+def rodar(alvos, params, jobs=1, forcar=(), so_mostrar=False, avisar=print):
+    """Roda as etapas vencidas para chegar aos alvos; devolve {etapa: situação}.
+
+    forcar: nomes de etapas a rodar mesmo em dia. so_mostrar=True só diz o
+    que rodaria (supondo que as etapas vencidas mudem as saídas).
+    """
+    estado = _ler_estado()
+    ordem = fechamento(alvos)
+    saidas, situacao = {}, {}
+    pendentes, rodando = list(ordem), {}
+    pool = (ProcessPoolExecutor(max_workers=jobs, initializer=iniciar_worker,
+                                initargs=(instrumentacao.estado(),)) if jobs > 1 and not so_mostrar else None)
+
+    def concluir(nome, chave, segundos):
+        e = ETAPAS[nome]
+        saidas[nome] = _hash_arquivos(e.saidas(params), estado["arquivos"])
+        faltando = [c for c, sha in saidas[nome].items() if sha is None and not e.sempre]
+        if faltando:
+            raise RuntimeError(f"Etapa {nome} não gerou: {', '.join(faltando)}")
+        estado["etapas"][_chave_estado(nome, params)] = {
+            "impressao": chave, "saidas": saidas[nome], "segundos": segundos,
+            "quando": time.strftime("%Y-%m-%d %H:%M:%S")}
+        _gravar_estado(estado)
+        situacao[nome] = f"rodou ({segundos:.1f}s)"
+        avisar(f"[{nome}] {situacao[nome]}")
+
+    try:
+        while pendentes or rodando:
+            # dispara tudo cujas dependências já terminaram
+            a_rodar = []
+            for nome in [n for n in pendentes if all(d in saidas for d in ETAPAS[n].depende)]:
+                pendentes.remove(nome)
+                chave, motivo = _decidir(nome, params, estado, saidas, nome in forcar)
+                if motivo is None:
+                    saidas[nome] = estado["etapas"][_chave_estado(nome, params)]["saidas"]
+                    situacao[nome] = "em dia"
+                    avisar(f"[{nome}] em dia")
+                elif so_mostrar:
+                    # sem rodar não dá para saber as saídas novas: as de quem
+                    # sempre roda ficam como estão agora, as outras contam como mudadas
+                    e = ETAPAS[nome]
+                    saidas[nome] = (_hash_arquivos(e.saidas(params), estado["arquivos"]) if e.sempre
+                                    else {"vencida": chave})
+                    situacao[nome] = f"rodaria ({motivo})"
+                    avisar(f"[{nome}] rodaria ({motivo})")
+                elif pool is None:
+                    avisar(f"[{nome}] rodando ({motivo})")
+                    concluir(nome, chave, _executar(nome, params, jobs))
+                else:
+                    avisar(f"[{nome}] rodando ({motivo})")
+                    a_rodar.append((nome, chave))
+            # cada etapa no pool recebe uma parte dos jobs para o pool interno
+            # dela (graficos, especificacoes): os processos livres são
+            # divididos entre as que começam agora, sem passar de jobs no total
+            livres = max(1, jobs - sum(n for _, _, n in rodando.values()))
+            for i, (nome, chave) in enumerate(a_rodar):
+                parte = max(1, livres // len(a_rodar) + (i < livres % len(a_rodar)))
+                rodando[pool.submit(_executar_no_worker, nome, params, parte)] = (nome, chave, parte)
+            if rodando:
+                prontos, _ = wait(rodando, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    nome, chave, _ = rodando.pop(futuro)
+                    segundos, registros = futuro.result()
+                    instrumentacao.adicionar(registros)
+                    concluir(nome, chave, segundos)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return situacao
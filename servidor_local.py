@@ -0,0 +1,273 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import pandas as pd
+
+# ==============================
+# Servidor local no lugar das APIs (IPEA, IBGE e SIDRA)
+# Responde nos mesmos caminhos das três APIs usadas em apis.py, com os
+# dados de data/ (snapshots) ou sintéticos em escala nacional
+# (sintetico.py), e injeta latência, limite de banda e erros (503/429)
+# de forma reprodutível (semente). Para apontar o projeto para ele:
+#   python servidor_local.py --porta 8765 --latencia 0.3 --erro 0.1 &
+#   AP2_API_BASE=http://127.0.0.1:8765 python apis.py
+# Cada API fica num prefixo (/ipea, /ibge, /sidra), então o cache HTTP
+# (chave = URL) não se mistura com o das APIs reais. Respostas têm ETag e
+# Last-Modified (GET condicional -> 304) e o SIDRA respeita n6/n3, p/ e o
+# limite de valores por consulta, como o real. --medir sobe o servidor,
+# roda apis.buscar_fontes() com cache frio, quente e revalidando e
+# imprime as latências.
+# ==============================
+PORTA = 8765
+LIMITE_SIDRA = 100000  # valores por consulta, como o SIDRA
+TAMANHO_PEDACO = 1 << 14
+
+Config = namedtuple("Config", ["latencia", "jitter", "banda", "erro", "status_erro", "seed", "limite_sidra"],
+                    defaults=(0.0, 0.0, None, 0.0, 503, 0, LIMITE_SIDRA))
+Config.__doc__ = """latencia/jitter em s (antes da resposta); banda em bytes/s (None =
+sem limite); erro = fração das requisições que recebem status_erro."""
+
+
+# ===== dados servidos =====
+Dados = namedtuple("Dados", ["uf", "municipios", "codigos", "pib"])
+Dados.__doc__ = """uf e municipios: registros do Atlas (listas de dicts); codigos:
+registros do IBGE ({id, nome}); pib: DataFrame (cod, nome, ano, valor em mil R$)."""
+
+
+def dados_locais():
+    """Os snapshots de data/ (só GO nos municípios), como no modo offline."""
+    import apis
+
+    final = pd.read_csv(apis.SNAP_FINAL)
+    pib = pd.DataFrame({"cod": final["Codigo IBGE"], "nome": final["Municipio"], "ano": final["Ano_PIB"],
+                        "valor": final["PIB"] / 1000})
+    return Dados(apis._snapshot_uf(), apis._snapshot_mun(), apis._snapshot_cod(), pib)
+
+
+def dados_sinteticos(escala=1.0, anos=35, anos_pib=12):
+    """Brasil inteiro (sintetico.py); PIB com `anos_pib` anos até 2021."""
+    import sintetico
+
+    mun = sintetico.municipios(escala)
+    serie = sintetico.serie_municipal(mun, anos)
+    registros = lambda df: df[["cod", "sigla", "valor", "periodo"]].astype(str).to_dict("records")
+    pibs = [sintetico.pib(mun, ano, seed=ano).assign(nome=mun["nome"].to_numpy(), ano=ano)
+            for ano in range(2021 - anos_pib + 1, 2022)]
+    pib = pd.concat(pibs).rename(columns={"codigo_municipio": "cod"})
+    pib = pib.assign(valor=pib["valor_pib"] / 1000)[["cod", "nome", "ano", "valor"]]
+    return Dados(registros(sintetico.serie_uf(anos)), registros(serie),
+                 [{"id": int(c), "nome": n} for c, n in zip(mun["cod"], mun["nome"])], pib)
+
+
+# ===== SIDRA: /values/t/5938/n6/<all | in n3 52,35>/v/37/p/<last | all | 2019-2021 | 2019,2020> =====
+class ErroSidra(ValueError):
+    pass
+
+
+def _anos_sidra(periodo, disponiveis):
+    if periodo == "all":
+        return disponiveis
+    if periodo.startswith("last"):
+        n = int(periodo.split()[1]) if " " in periodo else 1
+        return disponiveis[-n:]
+    anos = set()
+    for parte in periodo.split(","):
+        inicio, _, fim = parte.partition("-")
+        anos.update(range(int(inicio), int(fim or inicio) + 1))
+    return [a for a in disponiveis if a in anos]
+
+
+def consulta_sidra(pib, caminho, limite=LIMITE_SIDRA):
+    """Linhas do SIDRA (cabeçalho + valores) para o caminho depois de /values."""
+    partes = unquote(caminho).strip("/").split("/")
+    params = dict(zip(partes[::2], partes[1::2]))
+    if "n6" not in params or "p" not in params:
+        raise ErroSidra("Parâmetros n6 e p são obrigatórios")
+    df = pib
+    if params["n6"] != "all":
+        m = re.fullmatch(r"in n3 ([\d,]+)", params["n6"])
+        if m is None:
+            raise ErroSidra(f"Nível territorial não suportado: {params['n6']}")
+        df = df[(df["cod"] // 100000).isin([int(u) for u in m.group(1).split(",")])]
+    anos = _anos_sidra(params["p"], sorted(pib["ano"].unique().tolist()))
+    df = df[df["ano"].isin(anos)]
+    if len(df) > limite:
+        raise ErroSidra(f"Consulta excede o limite de {limite} valores ({len(df)} pedidos)")
+    cabecalho = {"D1C": "Município (Código)", "D1N": "Município", "D3N": "Ano", "V": "Valor"}
+    df = df.sort_values(["ano", "cod"])
+    return [cabecalho] + [{"D1C": str(c), "D1N": n, "D3N": str(a), "V": str(v)}
+                          for c, n, a, v in zip(df["cod"], df["nome"], df["ano"], df["valor"])]
+
+
+# ===== servidor =====
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como as APIs reais
+
+    def log_message(self, *args):
+        pass
+
+    def _corpo(self, chave, gerar):
+        # gera e codifica fora da trava (pode levar segundos com dados
+        # nacionais) e só publica dentro dela; se duas threads gerarem a
+        # mesma chave ao mesmo tempo, fica a primeira
+        app = self.server
+        with app.trava:
+            pronto = app.corpos.get(chave)
+        if pronto is not None:
+            return pronto
+        corpo = json.dumps(gerar(), ensure_ascii=False).encode("utf-8")
+        pronto = (corpo, f'"{hashlib.sha1(corpo).hexdigest()}"')
+        with app.trava:
+            return app.corpos.setdefault(chave, pronto)
+
+    def _rota(self, caminho):
+        d = self.server.dados
+        if m := re.fullmatch(r"/ipea/atlasviolencia/api/v1/valores-series/\d+/([34])", caminho):
+            return ("uf" if m.group(1) == "3" else "municipios"), lambda: d.uf if m.group(1) == "3" else d.municipios
+        if caminho == "/ibge/api/v1/localidades/municipios":
+            return "codigos", lambda: d.codigos
+        if caminho.startswith("/sidra/values/"):
+            return "sidra", lambda: consulta_sidra(d.pib, caminho[len("/sidra/values"):],
+                                                   self.server.config.limite_sidra)
+        return None, None
+
+    def _enviar(self, status, corpo=b"", cabecalhos=()):
+        self.send_response(status)
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        banda = self.server.config.banda
+        for i in range(0, len(corpo), TAMANHO_PEDACO):
+            pedaco = corpo[i:i + TAMANHO_PEDACO]
+            self.wfile.write(pedaco)
+            if banda:
+                time.sleep(len(pedaco) / banda)
+        self.server.contar(status, len(corpo))
+
+    def do_GET(self):
+        app, cfg = self.server, self.server.config
+        caminho = urlsplit(self.path).path
+        if caminho == "/_estatisticas":
+            return self._enviar(200, json.dumps(app.estatisticas()).encode("utf-8"),
+                                [("Content-Type", "application/json")])
+        nome, gerar = self._rota(caminho)
+        if nome is None:
+            return self._enviar(404, b'{"erro": "rota desconhecida"}')
+        with app.trava:
+            atraso = cfg.latencia + app.rng.uniform(0, cfg.jitter)
+            falhar = app.rng.random() < cfg.erro
+        time.sleep(atraso)
+        if falhar:
+            return self._enviar(cfg.status_erro, b'{"erro": "falha injetada"}',
+                                [("Retry-After", "1")] if cfg.status_erro == 429 else [])
+        try:
+            corpo, etag = self._corpo(caminho, gerar)
+        except ErroSidra as e:
+            return self._enviar(400, json.dumps(str(e), ensure_ascii=False).encode("utf-8"))
+        cabecalhos = [("ETag", etag), ("Last-Modified", app.modificado)]
+        if self.headers.get("If-None-Match") == etag:
+            return self._enviar(304, b"", cabecalhos)
+        self._enviar(200, corpo, [("Content-Type", "application/json; charset=utf-8")] + cabecalhos)
+
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco, dados, config=Config()):
+        super().__init__(endereco, _Handler)
+        self.dados, self.config = dados, config
+        self.rng = random.Random(config.seed)
+        self.trava = threading.Lock()
+        self.corpos = {}
+        self.modificado = formatdate(time.time(), usegmt=True)
+        self._status, self._bytes = Counter(), 0
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def contar(self, status, n):
+        with self.trava:
+            self._status[status] += 1
+            self._bytes += n
+
+    def estatisticas(self):
+        with self.trava:
+            return {"requisicoes": sum(self._status.values()), "por_status": dict(self._status),
+                    "bytes": self._bytes}
+
+
+def iniciar(dados, config=Config(), host="127.0.0.1", porta=0):
+    """Sobe o servidor numa thread; porta=0 escolhe uma livre. Devolve o Servidor."""
+    servidor = Servidor((host, porta), dados, config)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# ===== medição do fetch de apis.py contra o servidor =====
+_BUSCAR = "import json, apis; print(json.dumps(apis.buscar_fontes()))"
+
+
+def medir(servidor, rodadas=(("frio", None), ("quente", None), ("revalidando", "0"))):
+    """Roda apis.buscar_fontes() num processo novo por rodada, todas com o
+    mesmo cache; ttl=None usa o padrão. Devolve {rodada: latências}."""
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="ap2_cache_") as cache:
+        for nome, ttl in rodadas:
+            env = dict(os.environ, AP2_API_BASE=servidor.url, AP2_CACHE_DIR=cache, AP2_OFFLINE="0")
+            if ttl is not None:
+                env["AP2_CACHE_TTL"] = ttl
+            inicio = time.perf_counter()
+            saida = subprocess.run([sys.executable, "-c", _BUSCAR], env=env, capture_output=True,
+                                   text=True, check=True).stdout
+            latencias = json.loads(saida.strip().splitlines()[-1])
+            resultados[nome] = {**latencias, "processo": time.perf_counter() - inicio}
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local no lugar das APIs do IPEA, IBGE e SIDRA.")
+    parser.add_argument("--porta", type=int, default=PORTA)
+    parser.add_argument("--sintetico", action="store_true", help="Brasil inteiro sintético em vez de data/")
+    parser.add_argument("--escala", type=float, default=1.0, help="com --sintetico: 1 = 5.570 municípios")
+    parser.add_argument("--anos", type=int, default=35, help="com --sintetico: anos da série")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos antes de cada resposta")
+    parser.add_argument("--jitter", type=float, default=0.0, help="até tantos segundos a mais, aleatório")
+    parser.add_argument("--banda", type=float, default=None, help="bytes/s por resposta")
+    parser.add_argument("--erro", type=float, default=0.0, help="fração de respostas com erro")
+    parser.add_argument("--status-erro", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--limite-sidra", type=int, default=LIMITE_SIDRA)
+    parser.add_argument("--medir", action="store_true", help="mede o fetch de apis.py e sai")
+    args = parser.parse_args()
+
+    dados = dados_sinteticos(args.escala, args.anos) if args.sintetico else dados_locais()
+    config = Config(args.latencia, args.jitter, args.banda, args.erro, args.status_erro, args.seed,
+                    args.limite_sidra)
+    servidor = iniciar(dados, config, porta=0 if args.medir else args.porta)
+    if args.medir:
+        for rodada, latencias in medir(servidor).items():
+            print(f"{rodada:<12} " + "  ".join(f"{k} {v:6.2f}s" for k, v in latencias.items()))
+        print(json.dumps(servidor.estatisticas()))
+        servidor.shutdown()
+    else:
+        print(f"Servindo em {servidor.url} (AP2_API_BASE={servidor.url}); Ctrl+C para parar")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            servidor.shutdown()
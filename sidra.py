@@ -0,0 +1,148 @@
+import argparse
+from collections import namedtuple
+
+import pandas as pd
+import requests
+
+from cache_http import SemDadosOffline, em_cache, executar_varios, get_json
+from esquema import codigo_ibge
+
+# ==============================
+# Consultas ao SIDRA em pedaços
+# Uma consulta só (n6/all, todos os anos) passa do limite de valores por
+# consulta do SIDRA e, se cair no meio, recomeça do zero. Aqui ela é
+# dividida por UF (n6/in n3 <uf>) e, quando a UF tem municípios demais
+# para todos os anos de uma vez, por faixas de anos. Os pedaços são
+# baixados em paralelo e cada um vai para o cache HTTP assim que chega
+# (cache_http.py, escrita atômica), então uma execução interrompida só
+# baixa os pedaços que faltam. Se o SIDRA recusar um pedaço por tamanho
+# (HTTP 400), ele é partido ao meio e pedido de novo. No fim tudo vira uma
+# tabela tipada (cod, ano, valor), ordenada e sem chave repetida.
+# ==============================
+# o SIDRA aceita até 100 mil valores por consulta; planejamos com folga
+LIMITE_VALORES = 50000
+
+# municípios por UF (código IBGE da UF), para estimar o tamanho de cada pedaço
+MUNICIPIOS_POR_UF = {
+    11: 52, 12: 22, 13: 62, 14: 15, 15: 144, 16: 16, 17: 139,
+    21: 217, 22: 224, 23: 184, 24: 167, 25: 223, 26: 185, 27: 102,
+    28: 75, 29: 417, 31: 853, 32: 78, 33: 92, 35: 645, 41: 399,
+    42: 295, 43: 497, 50: 79, 51: 142, 52: 246, 53: 1,
+}
+
+Pedaco = namedtuple("Pedaco", ["uf", "inicio", "fim"])
+Pedaco.__doc__ = "Municípios da UF (código IBGE) de inicio a fim (anos, inclusive)."
+
+
+def planejar(ufs, inicio, fim, limite=LIMITE_VALORES, municipios=None):
+    """Pedaços que cobrem ufs x [inicio, fim] com no máximo ~limite valores cada."""
+    municipios = municipios or MUNICIPIOS_POR_UF
+    pedacos = []
+    for uf in ufs:
+        n = municipios.get(uf, max(municipios.values()))
+        passo = max(1, limite // max(n, 1))
+        for ano in range(inicio, fim + 1, passo):
+            pedacos.append(Pedaco(uf, ano, min(ano + passo - 1, fim)))
+    return pedacos
+
+
+def url(host, tabela, variavel, pedaco):
+    return (f"{host}/values/t/{tabela}/n6/in%20n3%20{pedaco.uf}/v/{variavel}"
+            f"/p/{pedaco.inicio}-{pedaco.fim}?formato=json")
+
+
+def _vazio():
+    return pd.DataFrame({"cod": pd.Series(dtype="int32"), "ano": pd.Series(dtype="int16"),
+                         "valor": pd.Series(dtype="float64")})
+
+
+def _tipar(linhas):
+    """JSON do SIDRA (1ª linha = cabeçalho) -> (cod, ano, valor); '-' e '...' viram NaN."""
+    if len(linhas) <= 1:
+        return _vazio()
+    df = pd.DataFrame(linhas[1:], columns=["D1C", "D3N", "V"])
+    return pd.DataFrame({"cod": codigo_ibge(df["D1C"]),
+                         "ano": df["D3N"].astype("int16"),
+                         "valor": pd.to_numeric(df["V"], errors="coerce")})
+
+
+def _partir(pedaco):
+    meio = (pedaco.inicio + pedaco.fim) // 2
+    return Pedaco(pedaco.uf, pedaco.inicio, meio), Pedaco(pedaco.uf, meio + 1, pedaco.fim)
+
+
+def _coberto(pedaco, montar_url):
+    """O pedaço está no cache, inteiro ou já partido em metades guardadas."""
+    if em_cache(montar_url(pedaco)):
+        return True
+    return pedaco.inicio < pedaco.fim and all(_coberto(p, montar_url) for p in _partir(pedaco))
+
+
+def baixar_pedaco(pedaco, montar_url, snapshot=None):
+    """Um pedaço já tipado; partido ao meio se o SIDRA recusar pelo tamanho.
+
+    snapshot(pedaco) monta as mesmas linhas a partir de data/ e só é usado
+    no modo offline, quando o pedaço não está no cache. Online, qualquer
+    falha de rede sobe: o snapshot não passa por dado recém-baixado.
+    """
+    # numa retomada, um pedaço que já foi recusado e partido não volta a ser pedido
+    if not em_cache(montar_url(pedaco)) and _coberto(pedaco, montar_url):
+        return pd.concat([baixar_pedaco(p, montar_url, snapshot) for p in _partir(pedaco)],
+                         ignore_index=True)
+    try:
+        linhas = get_json(montar_url(pedaco), timeout=60)
+    except requests.HTTPError as erro:
+        if erro.response is None or erro.response.status_code != 400 or pedaco.inicio == pedaco.fim:
+            raise
+        return pd.concat([baixar_pedaco(p, montar_url, snapshot) for p in _partir(pedaco)],
+                         ignore_index=True)
+    except SemDadosOffline:
+        # só acontece com cache_http.OFFLINE ligado
+        if snapshot is None:
+            raise
+        linhas = snapshot(pedaco)
+    return _tipar(linhas)
+
+
+def juntar(partes):
+    """Concatena os pedaços numa tabela única por (cod, ano)."""
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return _vazio()
+    df = pd.concat(partes, ignore_index=True)
+    return (df.drop_duplicates(["cod", "ano"], keep="last")
+              .sort_values(["cod", "ano"], kind="stable").reset_index(drop=True))
+
+
+def baixar(pedacos, montar_url, snapshot=None, max_workers=4):
+    """Baixa os pedaços em paralelo (os que já estão no cache não vão à rede)."""
+    tarefas = {p: (lambda p=p: baixar_pedaco(p, montar_url, snapshot)) for p in pedacos}
+    resultados, _ = executar_varios(tarefas, max_workers=max_workers)
+    return juntar([resultados[p] for p in pedacos])
+
+
+def faltando(pedacos, montar_url):
+    """Pedaços que ainda não estão no cache (o que uma retomada vai baixar)."""
+    return [p for p in pedacos if not _coberto(p, montar_url)]
+
+
+if __name__ == "__main__":
+    import time
+
+    import apis
+
+    parser = argparse.ArgumentParser(description="Baixa o PIB municipal do SIDRA em pedaços (retomável).")
+    parser.add_argument("--ufs", nargs="*", default=list(apis.UFS), help="siglas (padrão: todas)")
+    parser.add_argument("--inicio", type=int, default=apis.ANO_PIB_INICIAL)
+    parser.add_argument("--fim", type=int, default=apis.ANO_PIB_FINAL)
+    parser.add_argument("--limite", type=int, default=LIMITE_VALORES, help="valores por pedaço")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    pedacos = planejar([apis.UFS[uf.upper()] for uf in args.ufs], args.inicio, args.fim, args.limite)
+    pendentes = faltando(pedacos, apis.url_pib)
+    print(f"{len(pedacos)} pedaços, {len(pedacos) - len(pendentes)} já no cache")
+    t0 = time.perf_counter()
+    df = baixar(pedacos, apis.url_pib, apis._snapshot_pib, max_workers=args.workers)
+    print(f"{len(df)} linhas ({df['cod'].nunique()} municípios, anos {df['ano'].min()}-{df['ano'].max()}) "
+          f"em {time.perf_counter() - t0:.2f}s")
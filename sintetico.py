@@ -0,0 +1,159 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from apis import UFS
+from esquema import compactar
+
+# ==============================
+# Dados sintéticos em escala nacional
+# Geram frames com o mesmo formato das fontes reais (Atlas, FINBRA, SIDRA
+# e a tabela final), com distribuições parecidas: população log-normal,
+# homicídios Poisson proporcionais à população, gasto e ICMS correlacionados.
+# escala=1 -> 5.570 municípios; escala=2 -> 11.140, e assim por diante.
+# ==============================
+N_MUNICIPIOS = 5570
+ANO_FINAL = 2023
+
+
+def municipios(escala=1.0, seed=0):
+    """Cadastro: cod (7 dígitos), nome, UF e população."""
+    rng = np.random.default_rng(seed)
+    n = int(N_MUNICIPIOS * escala)
+    siglas = np.array(list(UFS))
+    uf = siglas[rng.integers(0, len(siglas), n)]
+    # código = UF (2 dígitos) + sequência (5 dígitos), único por UF
+    seq = pd.Series(uf).groupby(uf).cumcount().to_numpy()
+    cod = np.array([UFS[u] for u in uf]) * 100000 + seq
+    pop = np.maximum(800, rng.lognormal(mean=9.4, sigma=1.2, size=n)).astype(np.int64)
+    return pd.DataFrame({
+        "cod": cod.astype(np.int64),
+        "nome": [f"Município {i}" for i in range(n)],
+        "UF": uf,
+        "populacao": pop,
+    })
+
+
+def serie_municipal(mun, anos=35, seed=1):
+    """Série longa (cod, sigla, valor, periodo, ano) como a do Atlas."""
+    rng = np.random.default_rng(seed)
+    lista_anos = np.arange(ANO_FINAL - anos + 1, ANO_FINAL + 1)
+    n = len(mun)
+    taxa = rng.gamma(2.0, 0.00012, size=n)  # homicídios por habitante
+    valores = rng.poisson(np.tile(mun["populacao"].to_numpy() * taxa, (len(lista_anos), 1)))
+    return pd.DataFrame({
+        "cod": np.tile(mun["cod"].to_numpy(), len(lista_anos)),
+        "sigla": np.tile(mun["nome"].to_numpy(), len(lista_anos)),
+        "valor": valores.ravel(),
+        "periodo": np.repeat([f"{a}-01-15" for a in lista_anos], n),
+        "ano": np.repeat(lista_anos, n),
+    })
+
+
+def serie_uf(anos=35, seed=2):
+    rng = np.random.default_rng(seed)
+    lista_anos = np.arange(ANO_FINAL - anos + 1, ANO_FINAL + 1)
+    linhas = [(cod, sigla, int(rng.integers(100, 8000)), f"{a}-01-15")
+              for a in lista_anos for sigla, cod in UFS.items()]
+    return pd.DataFrame(linhas, columns=["cod", "sigla", "valor", "periodo"])
+
+
+def json_serie(df_serie):
+    """Corpo JSON igual ao da API do Atlas (tudo como string)."""
+    df = df_serie[["cod", "sigla", "valor", "periodo"]].astype(str)
+    return json.dumps(df.to_dict("records"), ensure_ascii=False).encode("utf-8")
+
+
+def finbra(mun, media, seed=3):
+    """Planilha no formato do FINBRA (despesa com segurança ou ICMS)."""
+    rng = np.random.default_rng(seed)
+    valor = mun["populacao"].to_numpy() * media * rng.lognormal(0, 0.6, len(mun))
+    return pd.DataFrame({
+        "Instituição": "Prefeitura Municipal de " + mun["nome"] + " - " + mun["UF"],
+        "Cod.IBGE": mun["cod"].to_numpy(),
+        "UF": mun["UF"].to_numpy(),
+        "População": mun["populacao"].to_numpy(),
+        "Coluna": "Despesas Pagas",
+        "Conta": "06 - Segurança Pública",
+        "Identificador da Conta": "siconfi-cor_TotalDespesas",
+        "Valor": valor.round(2),
+    })
+
+
+def pib(mun, ano=2021, seed=4):
+    """PIB municipal no formato de apis.carregar_df_pib (R$)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "codigo_municipio": mun["cod"].astype("int32"),
+        "valor_pib": (mun["populacao"].to_numpy() * rng.lognormal(10.5, 0.5, len(mun))).round(0) * 1000,
+        "Ano_PIB": ano,
+    })
+
+
+def fontes(escala=1.0, anos=35):
+    """Todas as entradas de apis.juntar_fontes para o Brasil inteiro, já com
+    os tipos compactos da ingestão (esquema.compactar)."""
+    mun = municipios(escala)
+    df_mun = compactar(serie_municipal(mun, anos))
+    df_mun_ano = (df_mun[df_mun["ano"] == ANO_FINAL]
+                  .rename(columns={"valor": "Qtd_Homicidios", "sigla": "Municipio"})
+                  .assign(Qtd_Homicidios=lambda d: d["Qtd_Homicidios"].astype(float)))
+    return {"mun": mun, "df_mun": df_mun, "df_mun_ano": df_mun_ano,
+            "df_seg": compactar(finbra(mun, 60.0)), "df_icms": compactar(finbra(mun, 900.0, seed=5)),
+            "df_pib": compactar(pib(mun))}
+
+
+def dados_modelo(n=N_MUNICIPIOS, seed=6):
+    """Tabela no formato de dados_completos_final, com instrumento relevante."""
+    rng = np.random.default_rng(seed)
+    pop = np.maximum(800, rng.lognormal(9.4, 1.2, n))
+    pibpc = rng.lognormal(10.4, 0.5, n)
+    icms = pop * rng.lognormal(6.8, 0.6, n)
+    gasto = 0.05 * icms * rng.lognormal(0, 0.5, n)
+    homicidios = rng.poisson(pop * 0.0002 * np.exp(-0.1 * np.log1p(gasto / pop)))
+    return pd.DataFrame({
+        "Codigo IBGE": np.arange(n) + 1100000,
+        "Municipio": [f"Município {i}" for i in range(n)],
+        "População": pop.round(0),
+        "Gasto_Seguranca": gasto.round(2),
+        "valor_icms": icms.round(2),
+        "Qtd_Homicidios": homicidios,
+        "taxa/1000hab": homicidios / pop * 1000,
+        "PIB": (pibpc * pop).round(0),
+        "PIB_per_capita": pibpc.round(2),
+        "Ano": ANO_FINAL,
+        "Ano_PIB": 2021,
+    })
+
+
+def painel(escala=1.0, anos=10, seed=7):
+    """Painel município x ano no formato da tabela final, com efeitos fixos
+    de município e de ano e gasto endógeno (choque comum com homicídios)."""
+    rng = np.random.default_rng(seed)
+    mun = municipios(escala)
+    n, t = len(mun), anos
+    lista_anos = np.arange(ANO_FINAL - anos + 1, ANO_FINAL + 1)
+    pop = np.repeat(mun["populacao"].to_numpy(), t) * np.tile(1.01 ** np.arange(t), n)
+    efeito_mun = np.repeat(rng.normal(0, 1, n), t)
+    efeito_ano = np.tile(rng.normal(0, 0.3, t), n)
+    icms = pop * np.exp(6.8 + 0.5 * efeito_mun + rng.normal(0, 0.3, n * t))
+    choque = rng.normal(0, 1, n * t)
+    gasto = 0.05 * icms * np.exp(0.3 * choque + 0.2 * efeito_mun)
+    taxa = np.exp(-8.5 + 0.4 * efeito_mun + efeito_ano - 0.1 * np.log1p(gasto / pop) + 0.2 * choque)
+    homicidios = rng.poisson(pop * taxa)
+    pibpc = np.repeat(rng.lognormal(10.4, 0.5, n), t) * np.exp(rng.normal(0, 0.05, n * t))
+    return pd.DataFrame({
+        "Codigo IBGE": np.repeat(mun["cod"].to_numpy(), t),
+        "Municipio": np.repeat(mun["nome"].to_numpy(), t),
+        "População": pop.round(0),
+        "Gasto_Seguranca": gasto.round(2),
+        "valor_icms": icms.round(2),
+        "Qtd_Homicidios": homicidios,
+        "taxa/1000hab": homicidios / pop * 1000,
+        "PIB": (pibpc * pop).round(0),
+        "PIB_per_capita": pibpc.round(2),
+        "Ano": np.tile(lista_anos, n),
+        "Ano_PIB": np.tile(lista_anos, n) - 2,
+        "UF": np.repeat(mun["UF"].to_numpy(), t),
+    })
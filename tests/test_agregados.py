@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import agregados
+
+# Cubo das UFs com população parcial: em 2023 só GO tem população (como o
+# FINBRA em data/), em 2022 todas as UFs têm.
+HOMICIDIOS = {("GO", 2022): 100, ("SP", 2022): 400, ("RJ", 2022): 300,
+              ("GO", 2023): 120, ("SP", 2023): 380, ("RJ", 2023): 310}
+POPULACAO = {("GO", 2022): 1000, ("SP", 2022): 40000, ("RJ", 2022): 6000, ("GO", 2023): 1000}
+
+
+@pytest.fixture
+def cubo(monkeypatch):
+    df_uf = pd.DataFrame([{"sigla": uf, "ano": ano, "valor": v} for (uf, ano), v in HOMICIDIOS.items()])
+    pop_mun = pd.DataFrame([{"cod": i, "uf": uf, "ano": ano, "populacao": p}
+                            for i, ((uf, ano), p) in enumerate(POPULACAO.items())])
+    cubo = agregados.calcular_uf(df_uf, pop_mun)
+    monkeypatch.setattr(agregados, "cubo_uf", lambda: cubo)
+    return cubo
+
+
+def test_taxa_so_e_ranqueada_com_populacao_do_grupo_todo(cubo):
+    # 2022: GO tem a maior taxa (100/1000) entre as três
+    assert agregados.posicao("GO", 2022, "taxa_1000hab") == 1
+    assert agregados.posicao("SP", 2022, "taxa_1000hab") == 3
+    # 2023: só GO tem taxa; não dá para dizer que é a 1ª
+    assert cubo.at[("GO", 2023), "taxa_1000hab"] == pytest.approx(120.0)
+    assert agregados.posicao("GO", 2023, "taxa_1000hab") is None
+    assert cubo.xs(2023, level="ano")["rank_taxa"].isna().all()
+
+
+def test_ranking_do_valor_nao_depende_da_populacao(cubo):
+    assert agregados.posicao("SP", 2023) == 1
+    assert agregados.posicao("GO", 2023) == 3
+    assert agregados.ranking_ufs(2023)["sigla"].tolist() == ["SP", "RJ", "GO"]
+
+
+def test_ranking_municipal_no_brasil_exige_populacao_de_todos():
+    df_mun = pd.DataFrame({"cod": [5200001, 5200002, 3500001], "sigla": ["A", "B", "C"],
+                           "ano": 2023, "valor": [10, 30, 50]})
+    pop_mun = pd.DataFrame({"cod": [5200001, 5200002], "uf": "GO", "ano": 2023, "populacao": [100.0, 1000.0]})
+    cubo = agregados.calcular_municipios(df_mun, pop_mun, siglas={52: "GO", 35: "SP"})
+    # dentro de GO todos têm população: A (100/1000 hab) passa B (30/1000)
+    assert cubo.loc[(5200001, 2023), "rank_taxa_uf"] == 1
+    assert cubo.loc[(5200002, 2023), "rank_taxa_uf"] == 2
+    # no Brasil falta a população de SP: sem ranking da taxa
+    assert cubo["rank_taxa_brasil"].isna().all()
+    assert cubo.loc[(3500001, 2023), "rank_brasil"] == 1
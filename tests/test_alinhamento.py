@@ -0,0 +1,31 @@
+import pandas as pd
+
+from alinhamento import Fonte, alinhar
+
+
+def _fontes():
+    base = Fonte("base", pd.DataFrame({"cod": [1, 2, 3], "nome": ["a", "b", "c"]}), "cod", {"nome": "nome"})
+    censo = Fonte("censo", pd.DataFrame({"cod": [1, 2], "pop": [10.0, None]}), "cod", {"pop": "populacao"},
+                  obrigatoria=False)
+    estimativa = Fonte("estimativa", pd.DataFrame({"cod": [2, 3, 1], "pop": [22.0, 33.0, 11.0]}), "cod",
+                       {"pop": "populacao"}, obrigatoria=False)
+    return [base, censo, estimativa]
+
+
+def test_colunas_por_posicao_na_ordem_da_base():
+    df = alinhar(_fontes())
+    assert df["nome"].tolist() == ["a", "b", "c"]
+    # sem precedência vale a ordem das fontes: censo, depois estimativa
+    assert df["populacao"].tolist() == [10.0, 22.0, 33.0]
+
+
+def test_precedencia_explicita():
+    df = alinhar(_fontes(), precedencia={"populacao": ["estimativa", "censo"]})
+    assert df["populacao"].tolist() == [11.0, 22.0, 33.0]
+
+
+def test_fonte_fora_da_precedencia_vale_menos():
+    df = alinhar(_fontes(), precedencia={"populacao": ["estimativa"]})
+    assert df["populacao"].tolist() == [11.0, 22.0, 33.0]
+    df = alinhar(_fontes(), precedencia={"populacao": ["outra"]})
+    assert df["populacao"].tolist() == [10.0, 22.0, 33.0]
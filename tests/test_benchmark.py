@@ -0,0 +1,19 @@
+import benchmark
+
+BASELINE = {"rapida": {"segundos": 0.01}, "lenta": {"segundos": 0.4},
+            benchmark.CHAVE_REFERENCIA: {"segundos": 0.2}}
+
+
+def test_regressao_precisa_passar_da_tolerancia_e_do_piso():
+    # 0.01 -> 0.03 triplica, mas são 20 ms: abaixo do piso
+    assert benchmark.comparar({"rapida": {"segundos": 0.03}, "lenta": {"segundos": 0.45}}, BASELINE) == []
+    assert benchmark.comparar({"lenta": {"segundos": 0.9}}, BASELINE) == [("lenta", 0.4, 0.9)]
+
+
+def test_maquina_mais_lenta_escala_o_baseline():
+    fator = benchmark.fator_maquina(0.4, BASELINE)
+    assert fator == 2.0
+    assert benchmark.comparar({"lenta": {"segundos": 0.9}}, BASELINE, fator=fator) == []
+    # referência mais rápida não aperta o baseline; sem referência, segundos
+    assert benchmark.fator_maquina(0.1, BASELINE) == 1.0
+    assert benchmark.fator_maquina(0.4, {"lenta": {"segundos": 0.4}}) == 1.0
@@ -0,0 +1,26 @@
+import pandas as pd
+
+import esquema
+
+
+def test_texto_repetido_vira_category_com_qualquer_dtype_de_texto():
+    valores = ["Receita", "Despesa"] * 50
+    for dtype in (object, "string", "str"):
+        df = pd.DataFrame({"conta_livre": pd.Series(valores, dtype=dtype), "valor": range(100)})
+        compacto = esquema.compactar(df)
+        assert isinstance(compacto["conta_livre"].dtype, pd.CategoricalDtype), dtype
+        assert compacto["conta_livre"].astype(str).tolist() == valores
+
+
+def test_texto_quase_unico_fica_como_esta():
+    df = pd.DataFrame({"descricao": [f"item {i}" for i in range(100)]})
+    compacto = esquema.compactar(df)
+    assert not isinstance(compacto["descricao"].dtype, pd.CategoricalDtype)
+
+
+def test_codigo_ibge_e_numeros_compactados():
+    df = pd.DataFrame({"cod": ["5200050", "5200100"], "valor": [1.5, 2.0], "n": [1, 2]})
+    compacto = esquema.compactar(df)
+    assert compacto["cod"].dtype == "int32"
+    assert compacto["valor"].dtype == "float32"
+    assert compacto["n"].dtype == "int8"
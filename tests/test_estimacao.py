@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sintetico
+from estimacao import CONSTANTE, estimar
+from variavel_instrumental import ESPECIFICACOES, adicionar_logs
+
+sm = pytest.importorskip("statsmodels.api")
+IV2SLS = pytest.importorskip("linearmodels.iv").IV2SLS
+
+# estimar() x statsmodels/linearmodels, para cada tipo de covariância, nas
+# especificações do relatório. Tolerância relativa: as diferenças medidas
+# ficam na casa de 1e-11; a absoluta cobre resíduos perto de zero.
+TOLERANCIA = 1e-8
+TOLERANCIA_ABS = 1e-10
+N = 600
+# argumentos do linearmodels equivalentes a cada cov de estimar()
+COV_LINEARMODELS = {
+    "robusto": {"cov_type": "robust"},
+    "hc1": {"cov_type": "robust", "debiased": True},
+    "classico": {"cov_type": "unadjusted", "debiased": True},
+    "cluster": {"cov_type": "clustered"},
+}
+COV_STATSMODELS = {"robusto": "HC0", "hc1": "HC1", "classico": "nonrobust"}
+
+
+@pytest.fixture(scope="module")
+def df():
+    df = adicionar_logs(sintetico.dados_modelo(N))
+    df["grupo"] = np.arange(N) % 27  # 27 clusters, como as UFs
+    return df
+
+
+def _referencia(df, esp, cov):
+    """Ajuste de referência (linearmodels; OLS sem endógenas)."""
+    exog = sm.add_constant(df[list(esp.exog)], has_constant="add").rename(columns={"const": CONSTANTE})
+    kwargs = dict(COV_LINEARMODELS[cov])
+    if cov == "cluster":
+        kwargs["clusters"] = df["grupo"]
+    endog = df[list(esp.endog)] if esp.endog else None
+    instrumentos = df[list(esp.instrumentos)] if esp.instrumentos else None
+    return IV2SLS(df[esp.y], exog, endog, instrumentos).fit(**kwargs)
+
+
+def _comparar(obtido, esperado):
+    esperado = esperado.reindex(obtido.index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado.to_numpy(), rtol=TOLERANCIA, atol=TOLERANCIA_ABS)
+
+
+@pytest.mark.parametrize("cov", list(COV_LINEARMODELS))
+def test_bate_com_linearmodels(df, cov):
+    # sem a cov fixa de cada especificação: todas passam pelo tipo testado
+    especificacoes = [esp._replace(cov=None) for esp in ESPECIFICACOES]
+    resultados = estimar(df, especificacoes, cov=cov, cluster="grupo" if cov == "cluster" else None)
+    for esp in especificacoes:
+        r = resultados[esp.nome]
+        ref = _referencia(df, esp, cov)
+        _comparar(r["params"], ref.params)
+        _comparar(r["erros_padrao"], ref.std_errors)
+        pd.testing.assert_index_equal(r["cov"].index, r["params"].index)
+        _comparar(r["residuos"], ref.resids)
+        assert r["n"] == ref.nobs
+        if esp.endog:
+            f_ref = ref.first_stage.diagnostics["f.stat"]
+            _comparar(pd.Series(r["f_primeiro_estagio"]), f_ref)
+
+
+@pytest.mark.parametrize("cov", list(COV_STATSMODELS))
+def test_mqo_bate_com_statsmodels(df, cov):
+    ols = [esp for esp in ESPECIFICACOES if not esp.endog]
+    resultados = estimar(df, [esp._replace(cov=None) for esp in ols], cov=cov)
+    for esp in ols:
+        r = resultados[esp.nome]
+        X = sm.add_constant(df[list(esp.exog)]).rename(columns={"const": CONSTANTE})
+        ref = sm.OLS(df[esp.y], X).fit(cov_type=COV_STATSMODELS[cov])
+        _comparar(r["params"], ref.params)
+        _comparar(r["erros_padrao"], ref.bse)
+        assert r["r2"] == pytest.approx(ref.rsquared, rel=TOLERANCIA)
+        assert r["gl_resid"] == ref.df_resid
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+import pytest
+import requests
+
+import cache_http
+import incremental
+import servidor_local
+
+# incremental.py contra o servidor local servindo os snapshots de data/:
+# o histórico começa sem o último ano, que a atualização tem de trazer.
+URL = "/ipea/atlasviolencia/api/v1/valores-series/328/3"
+
+
+@pytest.fixture(scope="module")
+def dados():
+    return servidor_local.dados_locais()
+
+
+@pytest.fixture(scope="module")
+def completo():
+    return pd.read_csv(incremental.SERIES["uf"]["csv"], dtype=str)
+
+
+@pytest.fixture
+def servidor(dados, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_http, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(cache_http, "OFFLINE", False)
+    monkeypatch.setattr(cache_http, "TENTATIVAS", 0)
+    monkeypatch.setattr(cache_http, "_sessao", None)
+    srv = servidor_local.iniciar(dados)
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+    cache_http._sessao = None
+
+
+@pytest.fixture
+def historico(completo, servidor, tmp_path, monkeypatch):
+    """CSV do histórico sem o último ano, apontando a série para o servidor."""
+    ultimo = completo["periodo"].max()
+    caminho = tmp_path / "homicidios_uf.csv"
+    completo[completo["periodo"] != ultimo].to_csv(caminho, index=False)
+    serie = dict(incremental.SERIES["uf"], csv=str(caminho), url=servidor.url + URL)
+    monkeypatch.setitem(incremental.SERIES, "uf", serie)
+    return caminho
+
+
+def _linhas(caminho):
+    df = pd.read_csv(caminho, dtype=str)
+    return sorted(map(tuple, df.to_numpy().tolist()))
+
+
+def test_retoma_do_ultimo_ano_guardado(historico, completo):
+    novos = incremental.atualizar("uf")
+    assert sorted(novos["ano"].unique()) == [int(completo["periodo"].max()[:4])]
+    assert _linhas(historico) == sorted(map(tuple, completo.to_numpy().tolist()))
+    # em dia: nada a acrescentar, arquivo igual
+    antes = historico.read_bytes()
+    assert incremental.atualizar("uf").empty
+    assert historico.read_bytes() == antes
+
+
+def test_falha_na_leitura_nao_mexe_no_csv(historico, servidor):
+    antes = historico.read_bytes()
+    servidor.shutdown()
+    servidor.server_close()
+    with pytest.raises(requests.ConnectionError):
+        incremental.atualizar("uf")
+    assert historico.read_bytes() == antes
+
+
+def test_falha_na_escrita_nao_deixa_csv_pela_metade(historico, completo, monkeypatch):
+    antes = historico.read_bytes()
+    to_csv = pd.DataFrame.to_csv
+
+    def quebrar(df, caminho, **kwargs):
+        to_csv(df.head(3), caminho, **kwargs)  # parte do acréscimo chega ao disco
+        raise OSError("disco cheio")
+
+    with monkeypatch.context() as m:
+        m.setattr(pd.DataFrame, "to_csv", quebrar)
+        with pytest.raises(OSError, match="disco cheio"):
+            incremental.atualizar("uf")
+    assert historico.read_bytes() == antes
+    assert sorted(os.listdir(historico.parent)) == ["cache", historico.name]  # sem temporário
+
+    # a próxima execução retoma do mesmo ponto
+    assert not incremental.atualizar("uf").empty
+    assert _linhas(historico) == sorted(map(tuple, completo.to_numpy().tolist()))
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+import pipeline
+
+# DAG do pipeline com duas etapas de brinquedo numa pasta temporária:
+# "base" lê entrada.txt e escreve base.txt; "topo" depende de base e
+# escreve topo.txt. O código de topo é topo.py, que importa util.py.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def dag(tmp_path, monkeypatch):
+    (tmp_path / "entrada.txt").write_text("1")
+    (tmp_path / "base.py").write_text("X = 1\n")
+    (tmp_path / "util.py").write_text("Y = 1\n")
+    (tmp_path / "topo.py").write_text("import util\n")
+    rodadas = []
+
+    def base(params, jobs):
+        rodadas.append("base")
+        (tmp_path / "base.txt").write_text((tmp_path / "entrada.txt").read_text())
+
+    def topo(params, jobs):
+        rodadas.append("topo")
+        (tmp_path / "topo.txt").write_text((tmp_path / "base.txt").read_text() * 2)
+
+    etapas = [
+        pipeline.Etapa("base", base, (), ("uf",), (str(tmp_path / "base.py"),),
+                       lambda p: [str(tmp_path / "entrada.txt")], lambda p: [str(tmp_path / "base.txt")]),
+        pipeline.Etapa("topo", topo, ("base",), ("uf",), (str(tmp_path / "topo.py"),),
+                       None, lambda p: [str(tmp_path / "topo.txt")]),
+    ]
+    monkeypatch.setattr(pipeline, "ETAPAS", {e.nome: e for e in etapas})
+    monkeypatch.setattr(pipeline, "ARQ_ESTADO", str(tmp_path / "pipeline.json"))
+    pipeline.modulos_usados.cache_clear()
+    yield tmp_path, rodadas
+    pipeline.modulos_usados.cache_clear()
+
+
+def _rodar(dag, **kwargs):
+    _, rodadas = dag
+    rodadas.clear()
+    return pipeline.rodar(["topo"], {"uf": "GO"}, avisar=lambda *_: None, **kwargs), rodadas
+
+
+def test_segunda_execucao_fica_em_dia(dag):
+    _, rodadas = _rodar(dag)
+    assert rodadas == ["base", "topo"]
+    situacao, rodadas = _rodar(dag)
+    assert situacao == {"base": "em dia", "topo": "em dia"}
+    assert rodadas == []
+
+
+def test_mudar_modulo_importado_refaz_so_a_etapa_de_baixo(dag):
+    pasta, _ = dag
+    _rodar(dag)
+    (pasta / "util.py").write_text("Y = 2\n")
+    situacao, rodadas = _rodar(dag, so_mostrar=True)
+    assert situacao == {"base": "em dia", "topo": "rodaria (entradas mudaram)"}
+    assert rodadas == []
+    _, rodadas = _rodar(dag)
+    assert rodadas == ["topo"]
+
+
+def test_saida_igual_em_cima_nao_refaz_quem_esta_embaixo(dag):
+    pasta, _ = dag
+    _rodar(dag)
+    (pasta / "base.py").write_text("X = 2\n")  # código novo, mesma saída
+    situacao, rodadas = _rodar(dag)
+    assert rodadas == ["base"]
+    assert situacao["topo"] == "em dia"
+    (pasta / "entrada.txt").write_text("2")  # entrada nova, saída nova
+    _, rodadas = _rodar(dag)
+    assert rodadas == ["base", "topo"]
+
+
+def test_saida_apagada_refaz_a_etapa(dag):
+    pasta, _ = dag
+    _rodar(dag)
+    os.remove(pasta / "topo.txt")
+    situacao, rodadas = _rodar(dag)
+    assert situacao["topo"].startswith("rodou")
+    assert rodadas == ["topo"]
+
+
+def test_codigo_da_etapa_inclui_o_que_ela_importa():
+    usados = pipeline.modulos_usados((os.path.join(RAIZ, "apis.py"), os.path.join(RAIZ, "armazem.py")))
+    nomes = {os.path.basename(c) for c in usados}
+    assert {"apis.py", "armazem.py", "sidra.py", "ingestao.py", "cache_http.py", "comum.py"} <= nomes
@@ -0,0 +1,93 @@
+import pytest
+import requests
+
+import cache_http
+import servidor_local
+import sidra
+
+# sidra.py contra o servidor local (servidor_local.py) com dados
+# sintéticos: o limite de valores do servidor é menor que um pedaço com
+# todos os anos de uma UF, então o pedaço tem de ser partido.
+UF = 52
+INICIO, FIM = 2016, 2021  # os 6 anos de PIB de dados_sinteticos(anos_pib=6)
+
+
+@pytest.fixture(scope="module")
+def dados():
+    return servidor_local.dados_sinteticos(escala=0.2, anos=2, anos_pib=6)
+
+
+@pytest.fixture(scope="module")
+def esperado(dados):
+    pib = dados.pib[dados.pib["cod"] // 100000 == UF]
+    return pib.sort_values(["cod", "ano"])
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_http, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache_http, "OFFLINE", False)
+    monkeypatch.setattr(cache_http, "TENTATIVAS", 0)  # sem retry: falha de rede sobe na hora
+    monkeypatch.setattr(cache_http, "_sessao", None)
+    yield tmp_path
+    cache_http._sessao = None  # conexões keep-alive não sobrevivem ao servidor
+
+
+@pytest.fixture
+def servidor(dados, esperado):
+    # cabem 2 anos da UF por consulta; os 6 de uma vez passam do limite
+    limite = 2 * esperado["cod"].nunique()
+    srv = servidor_local.iniciar(dados, servidor_local.Config(limite_sidra=limite))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _montar_url(srv):
+    return lambda pedaco: sidra.url(f"{srv.url}/sidra", 5938, 37, pedaco)
+
+
+def _snapshot(pedaco):
+    # linhas que não vêm do servidor: não podem aparecer no resultado online
+    return [{"D1C": "Código", "D3N": "Ano", "V": "Valor"}, {"D1C": "5200000", "D3N": "2021", "V": "1"}]
+
+
+def test_pedaco_grande_e_partido(cache, servidor, esperado):
+    pedacos = sidra.planejar([UF], INICIO, FIM, limite=10 ** 6)
+    assert pedacos == [sidra.Pedaco(UF, INICIO, FIM)]  # um pedaço só, grande demais
+    df = sidra.baixar(pedacos, _montar_url(servidor))
+    assert servidor.estatisticas()["por_status"].get(400, 0) >= 1
+    assert df["cod"].tolist() == esperado["cod"].tolist()
+    assert df["ano"].tolist() == esperado["ano"].tolist()
+    assert df["valor"].tolist() == pytest.approx(esperado["valor"].tolist())
+    assert sidra.faltando(pedacos, _montar_url(servidor)) == []
+
+
+def test_segunda_execucao_nao_vai_a_rede(cache, servidor):
+    pedacos = sidra.planejar([UF], INICIO, FIM, limite=10 ** 6)
+    primeira = sidra.baixar(pedacos, _montar_url(servidor))
+    antes = servidor.estatisticas()["requisicoes"]
+    segunda = sidra.baixar(pedacos, _montar_url(servidor))
+    assert servidor.estatisticas()["requisicoes"] == antes
+    assert segunda.equals(primeira)
+
+
+def test_falha_de_rede_sobe_em_vez_do_snapshot(cache, servidor):
+    montar_url = _montar_url(servidor)
+    servidor.shutdown()
+    servidor.server_close()
+    pedacos = sidra.planejar([UF], INICIO, FIM, limite=10 ** 6)
+    with pytest.raises(requests.ConnectionError):
+        sidra.baixar(pedacos, montar_url, _snapshot)
+
+
+def test_pedacos_do_pib_so_das_ufs_pedidas_ate_o_fim_da_tabela():
+    import apis
+
+    pedacos = apis.pedacos_pib()
+    assert {p.uf for p in pedacos} == {apis.UFS[apis.UF_PADRAO]}
+    assert max(p.fim for p in pedacos) == apis.ANO_PIB_FINAL
+    assert min(p.inicio for p in pedacos) == apis.ANO_PIB_INICIAL
+    pedacos = apis.pedacos_pib(("GO", "SP"), ano_final=2030)
+    assert {p.uf for p in pedacos} == {52, 35}
+    assert max(p.fim for p in pedacos) == apis.ANO_PIB_FINAL
@@ -1,200 +1,299 @@
-import pandas as pd
-import seaborn as sns
-import statsmodels.api as sm 
-import pandas as pd
-import matplotlib.pyplot as plt
-from linearmodels.iv import IV2SLS
-import numpy as np
-import matplotlib.pyplot as plt
-from statsmodels.graphics.gofplots import qqplot
+import os
 
-### Testes 
-
-df= pd.read_excel(r'data\dados_completos_final.xlsx')
-df
-
-#Primeira analise dos dados
-df.shape
-df.columns
-
-# Variável independente (X)
-X = df["Gasto_Seguranca"]
+import numpy as np
+import pandas as pd
 
-# Variável dependente (y)
-y = df["Qtd_Homicidios"]
-
-# Adicionar constante (intercepto)
-X = sm.add_constant(X)
-
-# Estimar o modelo MQO (OLS)
-modelo = sm.OLS(y, X).fit()
-
-# Exibir o resumo dos resultados
-print(modelo.summary())
-
-# Primeira etapa: regredir Gasto_Seguranca no instrumento e controles
-X_first = sm.add_constant(df[['valor_icms', 'População', 'PIB_per_capita']])
-y_first = df['Gasto_Seguranca']
-
-first_stage = sm.OLS(y_first, X_first).fit()
-print(first_stage.summary())
-
-# Variáveis
-y = df['Qtd_Homicidios']            # dependente
-endog = df['Gasto_Seguranca']       # endógena
-instr = df['valor_icms']        # instrumental
-controls = df[['População', 'PIB_per_capita']]
-
-# Adiciona constante
-exog = sm.add_constant(controls)
-
-
-# Modelo 2SLS
-iv_model = IV2SLS(
-    dependent=y,
-    exog=exog,
-    endog=endog,
-    instruments=instr
-).fit(cov_type='robust')
-
-print(iv_model.summary)
-
-#Correlação
-df2 = df[["Gasto_Seguranca","PIB_per_capita","Qtd_Homicidios","População"]]
-df_numerico = df2.select_dtypes(include = "number")
-df_corr = df_numerico.corr()
-sns.heatmap(df_corr, annot=True)
-
-
-# --- 1) Calcular MDE aproximado a partir do SE do coeficiente IV ---
-coef = -4.851e-07   # seu coef IV
-se = 5.135e-07      # seu SE do coef (do output)
-alpha = 0.05
-z = 1.96            # z para 95% CI
-MDE = z * se
-print(f"MDE (95% CI) ≈ {MDE:.3e}")
-print(f"Coef estimado = {coef:.3e} (|coef| < MDE? -> {abs(coef) < MDE})")
-
-# --- 2) Rodar IV com LOGs (ajuda escala/heterocedasticidade) ---
-df['ln_homicidios'] = np.log(df['Qtd_Homicidios'] + 1)
-df['ln_gasto_seg'] = np.log(df['Gasto_Seguranca'] + 1)
-df['ln_pop'] = np.log(df['População'])
-df['ln_pibpc'] = np.log(df['PIB_per_capita'] + 1)
-
-# instrumento (pode usar log também se fizer sentido)
-df['ln_valor_icms'] = np.log(df['valor_icms'] + 1)
-
-y = df['ln_homicidios']
-endog = df['ln_gasto_seg']
-instr = df['ln_valor_icms']            # ou lista de instrumentos
-controls = df[['ln_pop','ln_pibpc']]
-exog = sm.add_constant(controls)
-
-iv_log = IV2SLS(dependent=y, exog=exog, endog=endog, instruments=instr).fit(cov_type='robust')
-print(iv_log.summary)
-
-# Criar variáveis ao quadrado
-df["ln_gasto_seg_quadrado"] = df["ln_gasto_seg"] ** 2
-df["ln_valor_icms_quadrado"] = df["ln_valor_icms"] ** 2
-
-# Variáveis
-y = df["ln_homicidios"]
-endog = df[["ln_gasto_seg", "ln_gasto_seg_quadrado"]]   # duas endógenas
-instr = df[["ln_valor_icms", "ln_valor_icms_quadrado"]] # dois instrumentos
-controls = df[["ln_pop", "ln_pibpc"]]
-exog = sm.add_constant(controls)
-
-# Modelo IV com termos quadráticos
-iv_quad = IV2SLS(
-    dependent=y,
-    exog=exog,
-    endog=endog,
-    instruments=instr
-).fit(cov_type="robust")
-
-print(iv_quad.summary)
-
-# Criar variáveis ao quadrado
-df["ln_gasto_seg_quadrado"] = df["ln_gasto_seg"] ** 2
-df["ln_valor_icms_quadrado"] = df["ln_valor_icms"] ** 2
-
-# Variáveis
-y = df["ln_homicidios"]
-endog = df[["ln_gasto_seg", "ln_gasto_seg_quadrado"]]   # duas endógenas
-instr = df[["ln_valor_icms", "ln_valor_icms_quadrado"]] # dois instrumentos
-controls = df[["ln_pop"]]
-exog = sm.add_constant(controls)
-
-# Modelo IV com termos quadráticos
-iv_quad = IV2SLS(
-    dependent=y,
-    exog=exog,
-    endog=endog,
-    instruments=instr
-).fit(cov_type="robust")
-
-iv_quad.summary
-
-# ---------------------------------------------------------
-# GRÁFICOS 
-# ---------------------------------------------------------
-
-# 1) Resíduos x valores ajustados – OLS
-ols_fitted = modelo.fittedvalues
-ols_resid = modelo.resid
-
-plt.figure(figsize=(6,4))
-plt.scatter(ols_fitted, ols_resid, alpha=0.7)
-plt.axhline(0, color='red', linestyle='--', linewidth=1)
-plt.xlabel('Valores ajustados (OLS)')
-plt.ylabel('Resíduos')
-plt.title('Resíduos vs. valores ajustados – OLS')
-plt.tight_layout()
-plt.savefig(r'figs\ols_residuos_vs_ajustados.png', dpi=300)
-plt.show()
-
-# 2) Resíduos x valores ajustados – IV (2SLS)
-# o objeto do linearmodels tem fitted_values e resids
-iv_fitted = iv_model.fitted_values
-iv_resid = iv_model.resids
-
-plt.figure(figsize=(6,4))
-plt.scatter(iv_fitted, iv_resid, alpha=0.7)
-plt.axhline(0, color='red', linestyle='--', linewidth=1)
-plt.xlabel('Valores ajustados (IV-2SLS)')
-plt.ylabel('Resíduos')
-plt.title('Resíduos vs. valores ajustados – IV-2SLS')
-plt.tight_layout()
-plt.savefig(r'figs\iv_residuos_vs_ajustados.png', dpi=300)
-plt.show()
-
-# 3) QQ-plot dos resíduos – OLS
-plt.figure(figsize=(5,5))
-qqplot(ols_resid, line='s')
-plt.title('QQ-plot dos resíduos – OLS')
-plt.tight_layout()
-plt.savefig(r'figs\ols_qqplot.png', dpi=300)
-plt.show()
-
-# 4) QQ-plot dos resíduos – IV
-plt.figure(figsize=(5,5))
-qqplot(iv_resid, line='s')
-plt.title('QQ-plot dos resíduos – IV-2SLS')
-plt.tight_layout()
-plt.savefig(r'figs\iv_qqplot.png', dpi=300)
-plt.show()
-
-# 5) Comparação visual dos coeficientes OLS x IV
-# do OLS simples você estimou só gasto, então pegamos esse coef.
-coef_ols = modelo.params['Gasto_Seguranca']
-
-# do IV pegamos o coeficiente da variável endógena
-coef_iv = iv_model.params['Gasto_Seguranca']
-
-plt.figure(figsize=(5,4))
-plt.bar(['OLS', 'IV-2SLS'], [coef_ols, coef_iv])
-plt.title('Coeficiente de Gasto_Seguranca – OLS vs IV')
-plt.ylabel('Coeficiente')
-plt.tight_layout()
-plt.savefig(r'figs\coef_ols_vs_iv.png', dpi=300)
-plt.show()
+import armazem
+import cache_ajustes
+import inferencia
+from estimacao import Especificacao, estimar, tabela
+from instrumentacao import instrumentado
+
+# ==============================
+# Modelos
+# Cada especificação é uma função que recebe o df e devolve o ajuste, para
+# poder ser reutilizada (benchmark, outros scripts) sem rodar o resto.
+# statsmodels, linearmodels, matplotlib e seaborn só são importados dentro
+# das funções que os usam: quem só roda ajustar_todos (estimacao.py) não
+# paga os segundos de importação deles.
+# ==============================
+@instrumentado("leitura/dados_completos_final")
+def carregar_dados(uf=None, ano=None):
+    """Tabela final do recorte (sem argumentos: o padrão, GO 2023)."""
+    import apis
+    return armazem.ler(apis.tabela_saida(uf or apis.UF_PADRAO, ano or apis.ANO_PADRAO))
+
+
+@instrumentado("modelo/ols")
+def ajustar_ols(df):
+    import statsmodels.api as sm
+
+    # Variável independente (X) e dependente (y), com constante (intercepto)
+    X = sm.add_constant(df["Gasto_Seguranca"])
+    y = df["Qtd_Homicidios"]
+
+    # Estimar o modelo MQO (OLS)
+    return sm.OLS(y, X).fit()
+
+
+@instrumentado("modelo/primeiro_estagio")
+def ajustar_primeiro_estagio(df):
+    import statsmodels.api as sm
+
+    # Primeira etapa: regredir Gasto_Seguranca no instrumento e controles
+    X_first = sm.add_constant(df[['valor_icms', 'População', 'PIB_per_capita']])
+    y_first = df['Gasto_Seguranca']
+    return sm.OLS(y_first, X_first).fit()
+
+
+@instrumentado("modelo/iv")
+def ajustar_iv(df):
+    import statsmodels.api as sm
+    from linearmodels.iv import IV2SLS
+
+    # Variáveis
+    y = df['Qtd_Homicidios']            # dependente
+    endog = df['Gasto_Seguranca']       # endógena
+    instr = df['valor_icms']        # instrumental
+    controls = df[['População', 'PIB_per_capita']]
+
+    # Adiciona constante
+    exog = sm.add_constant(controls)
+
+    # Modelo 2SLS
+    return IV2SLS(
+        dependent=y,
+        exog=exog,
+        endog=endog,
+        instruments=instr
+    ).fit(cov_type='robust')
+
+
+def adicionar_logs(df):
+    # LOGs (ajuda escala/heterocedasticidade)
+    df = df.copy()
+    df['ln_homicidios'] = np.log(df['Qtd_Homicidios'] + 1)
+    df['ln_gasto_seg'] = np.log(df['Gasto_Seguranca'] + 1)
+    df['ln_pop'] = np.log(df['População'])
+    df['ln_pibpc'] = np.log(df['PIB_per_capita'] + 1)
+
+    # instrumento (pode usar log também se fizer sentido)
+    df['ln_valor_icms'] = np.log(df['valor_icms'] + 1)
+
+    # Criar variáveis ao quadrado
+    df["ln_gasto_seg_quadrado"] = df["ln_gasto_seg"] ** 2
+    df["ln_valor_icms_quadrado"] = df["ln_valor_icms"] ** 2
+    return df
+
+
+@instrumentado("modelo/iv_log")
+def ajustar_iv_log(df):
+    import statsmodels.api as sm
+    from linearmodels.iv import IV2SLS
+
+    y = df['ln_homicidios']
+    endog = df['ln_gasto_seg']
+    instr = df['ln_valor_icms']            # ou lista de instrumentos
+    controls = df[['ln_pop','ln_pibpc']]
+    exog = sm.add_constant(controls)
+
+    return IV2SLS(dependent=y, exog=exog, endog=endog, instruments=instr).fit(cov_type='robust')
+
+
+@instrumentado("modelo/iv_quad")
+def ajustar_iv_quad(df, controles=("ln_pop", "ln_pibpc")):
+    import statsmodels.api as sm
+    from linearmodels.iv import IV2SLS
+
+    # Variáveis
+    y = df["ln_homicidios"]
+    endog = df[["ln_gasto_seg", "ln_gasto_seg_quadrado"]]   # duas endógenas
+    instr = df[["ln_valor_icms", "ln_valor_icms_quadrado"]] # dois instrumentos
+    controls = df[list(controles)]
+    exog = sm.add_constant(controls)
+
+    # Modelo IV com termos quadráticos
+    return IV2SLS(
+        dependent=y,
+        exog=exog,
+        endog=endog,
+        instruments=instr
+    ).fit(cov_type="robust")
+
+
+# ==============================
+# Todas as especificações acima, para ajustar em lote (estimacao.py)
+# MQO com erros clássicos (como o statsmodels), IV com erros robustos.
+# Precisa do df com adicionar_logs().
+# ==============================
+ESPECIFICACOES = [
+    Especificacao("ols", "Qtd_Homicidios", ("Gasto_Seguranca",), cov="classico"),
+    Especificacao("primeiro_estagio", "Gasto_Seguranca",
+                  ("valor_icms", "População", "PIB_per_capita"), cov="classico"),
+    Especificacao("iv", "Qtd_Homicidios", ("População", "PIB_per_capita"),
+                  ("Gasto_Seguranca",), ("valor_icms",)),
+    Especificacao("iv_log", "ln_homicidios", ("ln_pop", "ln_pibpc"),
+                  ("ln_gasto_seg",), ("ln_valor_icms",)),
+    Especificacao("iv_quad", "ln_homicidios", ("ln_pop", "ln_pibpc"),
+                  ("ln_gasto_seg", "ln_gasto_seg_quadrado"),
+                  ("ln_valor_icms", "ln_valor_icms_quadrado")),
+    Especificacao("iv_quad_sem_pib", "ln_homicidios", ("ln_pop",),
+                  ("ln_gasto_seg", "ln_gasto_seg_quadrado"),
+                  ("ln_valor_icms", "ln_valor_icms_quadrado")),
+]
+
+
+@instrumentado("modelo/lote")
+def ajustar_todos(df, especificacoes=ESPECIFICACOES):
+    """Ajusta todas as especificações de uma vez; df já com os logs."""
+    return estimar(df, especificacoes, cov="robusto")
+
+
+# ==============================
+# Relatório e gráficos de diagnóstico
+# Separados do __main__ para o pipeline (main.py estimate) rodar sem
+# janelas: relatorio() imprime as tabelas e devolve os ajustes,
+# graficos_diagnostico() só salva as figuras em figs/. Os dois partem dos
+# ajustes guardados em cache_ajustes.py: refazer uma figura ou a planilha
+# com os mesmos dados não reajusta nenhum modelo.
+# ==============================
+ARQ_MODELOS = "resultado_modelos.xlsx"
+FIGURAS_DIAGNOSTICO = ["ols_residuos_vs_ajustados.png", "iv_residuos_vs_ajustados.png",
+                       "ols_qqplot.png", "iv_qqplot.png", "coef_ols_vs_iv.png"]
+
+
+def ajustes(df=None, forcar=False):
+    """Ajustes de ESPECIFICACOES (do cache se os dados não mudaram); df sem os logs."""
+    df = adicionar_logs(carregar_dados() if df is None else df)
+    return cache_ajustes.ajustar(df, ESPECIFICACOES, cov="robusto", forcar=forcar)
+
+
+def relatorio(df, forcar=False):
+    """Ajusta todos os modelos, imprime a tabela e a inferência; devolve os ajustes."""
+    # Todos os modelos (MQO, primeiro estágio, IV, IV log, IV quadrático
+    # com e sem ln_pibpc) de uma vez, numa tabela só
+    df = adicionar_logs(df)
+    resultados = cache_ajustes.ajustar(df, ESPECIFICACOES, cov="robusto", forcar=forcar)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(tabela(resultados).to_string(index=False))
+    iv_model = resultados["iv"]
+
+    # --- MDE e inferência por reamostragem a partir do IV ajustado ---
+    esp_iv = next(e for e in ESPECIFICACOES if e.nome == "iv")
+    coef = iv_model["params"]["Gasto_Seguranca"]
+    se = iv_model["erros_padrao"]["Gasto_Seguranca"]
+    inf = inferencia.inferir(df, esp_iv, erro_padrao=se)
+    MDE = inf["mde"]
+    print(f"MDE (95% CI) ≈ {MDE:.3e}  |  com poder de 80% ≈ {inf['mde_poder_0.8']:.3e}")
+    print(f"Coef estimado = {coef:.3e} (|coef| < MDE? -> {abs(coef) < MDE})")
+    print(f"IC 95% bootstrap de pares ({inf['replicacoes']} réplicas): "
+          f"[{inf['ic_pares'][0]:.3e}, {inf['ic_pares'][1]:.3e}]")
+    print(f"IC 95% bootstrap selvagem: [{inf['ic_selvagem'][0]:.3e}, {inf['ic_selvagem'][1]:.3e}]")
+    print(f"p-valor de permutação do instrumento: {inf['p_permutacao']:.4f}")
+    return resultados
+
+
+def graficos_diagnostico(resultados, pasta="figs"):
+    """Resíduos, QQ-plots e OLS x IV; devolve as figuras (abertas) e os caminhos."""
+    import matplotlib.pyplot as plt
+    from statsmodels.graphics.gofplots import qqplot
+
+    modelo = resultados["ols"]
+    iv_model = resultados["iv"]
+    os.makedirs(pasta, exist_ok=True)
+    figuras = []
+
+    # 1) Resíduos x valores ajustados – OLS
+    ols_fitted = modelo["ajustados"]
+    ols_resid = modelo["residuos"]
+
+    figuras.append(plt.figure(figsize=(6,4)))
+    plt.scatter(ols_fitted, ols_resid, alpha=0.7)
+    plt.axhline(0, color='red', linestyle='--', linewidth=1)
+    plt.xlabel('Valores ajustados (OLS)')
+    plt.ylabel('Resíduos')
+    plt.title('Resíduos vs. valores ajustados – OLS')
+
+    # 2) Resíduos x valores ajustados – IV (2SLS)
+    iv_fitted = iv_model["ajustados"]
+    iv_resid = iv_model["residuos"]
+
+    figuras.append(plt.figure(figsize=(6,4)))
+    plt.scatter(iv_fitted, iv_resid, alpha=0.7)
+    plt.axhline(0, color='red', linestyle='--', linewidth=1)
+    plt.xlabel('Valores ajustados (IV-2SLS)')
+    plt.ylabel('Resíduos')
+    plt.title('Resíduos vs. valores ajustados – IV-2SLS')
+
+    # 3) QQ-plot dos resíduos – OLS
+    figuras.append(plt.figure(figsize=(5,5)))
+    qqplot(ols_resid, line='s', ax=plt.gca())
+    plt.title('QQ-plot dos resíduos – OLS')
+
+    # 4) QQ-plot dos resíduos – IV
+    figuras.append(plt.figure(figsize=(5,5)))
+    qqplot(iv_resid, line='s', ax=plt.gca())
+    plt.title('QQ-plot dos resíduos – IV-2SLS')
+
+    # 5) Comparação visual dos coeficientes OLS x IV
+    # do OLS simples você estimou só gasto, então pegamos esse coef.
+    coef_ols = modelo["params"]['Gasto_Seguranca']
+
+    # do IV pegamos o coeficiente da variável endógena
+    coef_iv = iv_model["params"]['Gasto_Seguranca']
+
+    figuras.append(plt.figure(figsize=(5,4)))
+    plt.bar(['OLS', 'IV-2SLS'], [coef_ols, coef_iv])
+    plt.title('Coeficiente de Gasto_Seguranca – OLS vs IV')
+    plt.ylabel('Coeficiente')
+
+    caminhos = [os.path.join(pasta, nome) for nome in FIGURAS_DIAGNOSTICO]
+    for fig, caminho in zip(figuras, caminhos):
+        fig.tight_layout()
+        fig.savefig(caminho, dpi=300)
+    return figuras, caminhos
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Modelos MQO/IV, inferência e diagnósticos.")
+    parser.add_argument("--diagnostico", action="store_true",
+                        help="só refaz a planilha e as figuras de diagnóstico (sem inferência nem janelas)")
+    parser.add_argument("--forcar", action="store_true", help="reajusta os modelos mesmo com cache")
+    args = parser.parse_args()
+
+    if args.diagnostico:
+        df = carregar_dados()
+        novas = cache_ajustes.faltando(adicionar_logs(df), ESPECIFICACOES)
+        resultados = ajustes(df, forcar=args.forcar)
+        tabela(resultados).to_excel(ARQ_MODELOS, index=False)
+        _, caminhos = graficos_diagnostico(resultados)
+        ajustadas = len(ESPECIFICACOES) if args.forcar else len(novas)
+        print(f"{ajustadas}/{len(ESPECIFICACOES)} modelos ajustados (resto do cache); "
+              f"{ARQ_MODELOS} e {len(caminhos)} figuras salvas")
+    else:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        ### Testes
+
+        df = carregar_dados()
+
+        #Primeira analise dos dados
+        print(df.shape)
+        print(df.columns)
+
+        resultados = relatorio(df, forcar=args.forcar)
+
+        #Correlação
+        df2 = df[["Gasto_Seguranca","PIB_per_capita","Qtd_Homicidios","População"]]
+        df_numerico = df2.select_dtypes(include = "number")
+        df_corr = df_numerico.corr()
+        sns.heatmap(df_corr, annot=True)
+
+        # ---------------------------------------------------------
+        # GRÁFICOS
+        # ---------------------------------------------------------
+        graficos_diagnostico(resultados)
+        plt.show()